@@ -3,10 +3,10 @@ import React, { useState } from "react";
 export default function InputBar({ onSend, disabled }) {
     const [text, setText] = useState("");
 
-    const submit = () => {
-        if (!text.trim()) return;
-        onSend(text);
-        setText("");
+    const submit = async () => {
+        if (disabled || !text.trim()) return;
+        // Kept on failure, so sending again retries the same turn
+        if (await onSend(text)) setText("");
     };
 
     return (
@@ -16,7 +16,7 @@ export default function InputBar({ onSend, disabled }) {
                 value={text}
                 onChange={(e) => setText(e.target.value)}
                 placeholder="Type your response..."
-                onKeyDown={(e) => e.key === "Enter" && submit()}
+                onKeyDown={(e) => e.key === "Enter" && !disabled && submit()}
             />
             <button
                 onClick={submit}
@@ -1,10 +1,14 @@
-import { useState } from "react";
+import { useRef, useState } from "react";
 
 export default function useMonicaChat() {
     const [session, setSession] = useState(null);
     const [messages, setMessages] = useState([]);
     const [stage, setStage] = useState("SETUP");
     const [loading, setLoading] = useState(false);
+    // Set synchronously, so a second click before the re-render is ignored too
+    const busyRef = useRef(false);
+    // The input awaiting a completed reply and the idempotency key it was sent with
+    const pendingRef = useRef(null);
 
     const startSession = async () => {
         const res = await fetch("http://localhost:8000/monica/session", {
@@ -17,29 +21,96 @@ export default function useMonicaChat() {
     };
 
     const sendMessage = async (text) => {
-        if (!session) return;
+        if (!session || loading || busyRef.current) return false;
+        busyRef.current = true;
         setLoading(true);
 
-        setMessages((m) => [...m, { role: "user", content: text }]);
+        // One key per pending input: resending the same text after a failed
+        // attempt reuses it, so the server replays that turn rather than
+        // running it a second time
+        const pending = pendingRef.current;
+        const retry = pending && pending.sessionId === session.id && pending.text === text;
+        if (!retry) {
+            pendingRef.current = { sessionId: session.id, text, key: crypto.randomUUID() };
+            setMessages((m) => [...m, { role: "user", content: text }]);
+        }
+        const idempotencyKey = pendingRef.current.key;
 
-        const res = await fetch("http://localhost:8000/monica/chat", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-                session_id: session.id,
-                text,
-            }),
-        });
+        // The assistant bubble for this attempt, once the stream has started
+        let bubble = false;
+        const setReply = (update) =>
+            setMessages((m) => {
+                const last = m[m.length - 1];
+                return [...m.slice(0, -1), { ...last, content: update(last.content) }];
+            });
 
-        const data = await res.json();
+        try {
+            const res = await fetch("http://localhost:8000/monica/chat/stream", {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({
+                    session_id: session.id,
+                    text,
+                    idempotency_key: idempotencyKey,
+                }),
+            });
+            if (!res.ok) {
+                const body = await res.json().catch(() => ({}));
+                throw new Error(body.detail || `HTTP ${res.status}`);
+            }
+
+            // Append an empty assistant bubble and grow it as tokens arrive
+            setMessages((m) => [...m, { role: "assistant", content: "" }]);
+            bubble = true;
+
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                const events = buffer.split("\n\n");
+                buffer = events.pop();
+
+                for (const raw of events) {
+                    const event = raw.match(/^event: (.*)$/m)?.[1];
+                    const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || "{}");
 
-        setMessages((m) => [...m, { role: "assistant", content: data.reply }]);
+                    if (event === "token") {
+                        setReply((content) => content + data.text);
+                    } else if (event === "bridge") {
+                        setReply((content) => content + "\n\n" + data.text);
+                    } else if (event === "stage") {
+                        setStage(data.stage);
+                    } else if (event === "done") {
+                        pendingRef.current = null;
+                    } else if (event === "error") {
+                        throw new Error(data.detail || "The reply failed");
+                    }
+                }
+            }
 
-        if (data.advance_stage) {
-            setStage((prev) => prev); // backend controls real stage; indicator updates on refresh
+            if (pendingRef.current !== null) {
+                throw new Error("The connection closed before the reply finished");
+            }
+        } catch (err) {
+            console.error("Chat failed:", err);
+            // The input stays pending: sending it again retries with the same key
+            const notice = "Sorry, that reply didn't come through. Please send your message again.";
+            if (bubble) {
+                setReply(() => notice);
+            } else {
+                setMessages((m) => [...m, { role: "assistant", content: notice }]);
+            }
+        } finally {
+            busyRef.current = false;
+            setLoading(false);
         }
 
-        setLoading(false);
+        return pendingRef.current === null;
     };
 
     return {
@@ -1,6 +1,7 @@
-from google import genai
 from agents.base import StageResult
-import os
+from llm_gateway import LLMGateway, get_gateway
+from model_routing import MODEL_ROUTING
+from intents import INTENTS
 
 PROMPT = """
 You are Agent Monica acting as a DOCTOR.
@@ -18,34 +19,21 @@ Rules:
 """
 
 class DoctorAgent:
-    def __init__(self):
-        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-        self.model = "gemini-2.0-flash-exp"
+    def __init__(self, gateway: LLMGateway = None):
+        self.gateway = gateway or get_gateway()
+        self.routing = MODEL_ROUTING
 
     async def handle(self, session, user_text):
-        prompt = PROMPT + f"\nUser: {user_text}"
-        resp = self.client.models.generate_content(model=self.model, contents=prompt)
-        reply = (resp.text or "").strip()
-
-        u = user_text.lower()
-        close_signals = [
-            "thank you doctor",
-            "that covers",
-            "i believe i've addressed",
-            "that's all",
-            "i think i've covered",
-        ]
-
-        feedback_markers = [
-            "you could improve",
-            "you did well",
-            "next time",
-            "overall",
-            "good job",
-        ]
-
-        done = any(sig in u for sig in close_signals) or any(
-            m in reply.lower() for m in feedback_markers
+        route = self.routing.choose("DOCTOR", "DOCTOR", f"User: {user_text}", PROMPT)
+        reply = (await self.gateway.generate(
+            model=route.model,
+            contents=f"User: {user_text}",
+            system_instruction=PROMPT,
+            config=route.config,
+        )).strip()
+
+        done = INTENTS.has("DOCTOR", user_text, "close") or INTENTS.has(
+            "DOCTOR_FEEDBACK", reply, "feedback"
         )
 
         return StageResult(reply=reply, completed=done)
@@ -7,21 +7,18 @@ QUESTIONS = [
 ]
 
 class KnowledgeAgent:
-    def __init__(self):
-        self.index = 0
-        self.waiting_for_answer = False
+    # Progress lives in session.state_delta; the agent is shared by all sessions
 
     async def handle(self, session, user_text):
-        # If we were waiting for an answer, consume it and move forward
-        if self.waiting_for_answer:
-            self.waiting_for_answer = False
+        index = session.state_delta.get("knowledge_index", 0)
 
         # Ask next question
-        if self.index < len(QUESTIONS):
-            q = QUESTIONS[self.index]
-            self.index += 1
-            self.waiting_for_answer = True
-            return StageResult(reply=q, completed=False)
+        if index < len(QUESTIONS):
+            return StageResult(
+                reply=QUESTIONS[index],
+                completed=False,
+                state_delta={"knowledge_index": index + 1},
+            )
 
         # All questions done
         return StageResult(
@@ -1,8 +1,8 @@
 # agents/objection_agent.py
 
-import os
-from google import genai
 from agents.base import StageResult
+from llm_gateway import LLMGateway, get_gateway
+from model_routing import MODEL_ROUTING
 
 PROMPT = """
 You are Agent Monica acting as a practicing DOCTOR.
@@ -19,53 +19,51 @@ After the BM responds:
 - Close this stage.
 """
 
-class ObjectionAgent:
-    def __init__(self):
-        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-        self.model = "gemini-2.0-flash-exp"
-        self.raised = False
-
-    async def handle(self, session, user_text: str) -> StageResult:
-        # First turn: raise a natural objection
-        if not self.raised:
-            self.raised = True
-
-            prompt = """
+RAISE_PROMPT = """
 You are a doctor seeing a medical representative for Vitamin D products.
 Raise ONE realistic objection about switching from your current practice.
 Do not mention brand placeholders.
 Be concise and natural.
 """
 
-            resp = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-            )
+class ObjectionAgent:
+    def __init__(self, gateway: LLMGateway = None):
+        self.gateway = gateway or get_gateway()
+        self.routing = MODEL_ROUTING
 
-            objection = (resp.text or "").strip()
+    async def handle(self, session, user_text: str) -> StageResult:
+        # First turn: raise a natural objection
+        if not session.state_delta.get("objection_raised"):
+            route = self.routing.choose("OBJECTION", "DOCTOR", "Raise your objection now.", RAISE_PROMPT)
+            objection = (await self.gateway.generate(
+                model=route.model,
+                contents="Raise your objection now.",
+                system_instruction=RAISE_PROMPT,
+                config=route.config,
+            )).strip()
             if not objection:
                 objection = "My current Vitamin D brand works well and is affordable. Why should I change it?"
 
             return StageResult(
                 reply=objection,
                 completed=False,
+                state_delta={"objection_raised": True},
             )
 
         # Second turn: evaluate BM's handling
-        prompt = f"""{PROMPT}
-
-BM's response:
+        prompt = f"""BM's response:
 {user_text}
 
 Now evaluate briefly and close.
 """
 
-        resp = self.client.models.generate_content(
-            model=self.model,
+        route = self.routing.choose("OBJECTION", "DOCTOR", prompt, PROMPT)
+        reply = (await self.gateway.generate(
+            model=route.model,
             contents=prompt,
-        )
-
-        reply = (resp.text or "").strip()
+            system_instruction=PROMPT,
+            config=route.config,
+        )).strip()
         if not reply:
             reply = "You handled the objection well, but you could be more specific about patient outcomes."
 
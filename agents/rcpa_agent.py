@@ -1,8 +1,9 @@
 # agents/rcpa_agent.py
 
-import os
-from google import genai
 from agents.base import StageResult
+from llm_gateway import LLMGateway, get_gateway
+from model_routing import MODEL_ROUTING
+from intents import INTENTS
 
 PROMPT = """
 You are Agent Monica acting as a RETAIL CHEMIST.
@@ -26,27 +27,13 @@ Then you must:
 """
 
 class RCPAAgent:
-    def __init__(self):
-        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-        self.model = "gemini-2.0-flash-exp"
+    def __init__(self, gateway: LLMGateway = None):
+        self.gateway = gateway or get_gateway()
+        self.routing = MODEL_ROUTING
 
     async def handle(self, session, user_text: str) -> StageResult:
-        user_lower = user_text.lower()
-
         # Hard stop detection
-        done_triggers = [
-            "thank you",
-            "thanks",
-            "that's it",
-            "that’s it",
-            "done",
-            "no more",
-            "that's all",
-            "that’s all",
-            "all i needed",
-        ]
-
-        is_done = any(t in user_lower for t in done_triggers)
+        is_done = INTENTS.has("RCPA", user_text, "end")
 
         if is_done:
             # Chemist-style close, no coaching, no transition language
@@ -55,17 +42,16 @@ class RCPAAgent:
                 completed=True,
             )
 
-        prompt = f"""{PROMPT}
-
-User: {user_text}
+        prompt = f"""User: {user_text}
 Chemist:"""
 
-        resp = self.client.models.generate_content(
-            model=self.model,
+        route = self.routing.choose("RCPA", "CHEMIST", prompt, PROMPT)
+        reply = (await self.gateway.generate(
+            model=route.model,
             contents=prompt,
-        )
-
-        reply = (resp.text or "").strip()
+            system_instruction=PROMPT,
+            config=route.config,
+        )).strip()
 
         # Safety fallback – never allow empty output
         if not reply:
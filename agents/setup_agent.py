@@ -1,8 +1,9 @@
 # agents/setup_agent.py
 
-import os
-from google import genai
 from agents.base import StageResult
+from llm_gateway import LLMGateway, get_gateway
+from model_routing import MODEL_ROUTING
+from intents import INTENTS
 
 PROMPT = """
 You are Agent Monica (Coach).
@@ -24,22 +25,19 @@ Be concise and conversational.
 """
 
 class SetupAgent:
-    def __init__(self):
-        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-        self.model = "gemini-2.0-flash-exp"
+    def __init__(self, gateway: LLMGateway = None):
+        self.gateway = gateway or get_gateway()
+        self.routing = MODEL_ROUTING
 
     async def handle(self, session, user_text: str) -> StageResult:
         # If user confirms, we finish setup
-        u = user_text.lower()
-        if any(x in u for x in ["yes", "yeah", "correct", "that's right"]):
+        if INTENTS.has("SETUP", user_text, "confirm"):
             return StageResult(
                 reply="Perfect. Your session is now set up. Let’s begin.",
                 completed=True,
             )
 
-        prompt = f"""{PROMPT}
-
-Known so far:
+        prompt = f"""Known so far:
 - Name: {session.user_name or "unknown"}
 - Role: {session.user_role or "unknown"}
 - HQ: {session.headquarter or "unknown"}
@@ -50,12 +48,13 @@ User said: {user_text}
 Respond as Monica.
 """
 
-        resp = self.client.models.generate_content(
-            model=self.model,
+        route = self.routing.choose("SETUP", "COACH", prompt, PROMPT)
+        reply = (await self.gateway.generate(
+            model=route.model,
             contents=prompt,
-        )
-
-        reply = (resp.text or "").strip()
+            system_instruction=PROMPT,
+            config=route.config,
+        )).strip()
         if not reply:
             reply = "Could you please share your name, role, HQ, and division?"
 
@@ -1,9 +1,33 @@
+# ai_services.py
+"""
+Text-generation providers and the router MonicaAgent and the stage agents
+call through (via `llm_gateway.get_gateway()`).
+
+Every provider exposes the LLMGateway surface, `generate(...)` and
+`stream(...)`, with async clients only. ProviderRouter tries them in
+order behind per-provider circuit breakers, falls back to the next one
+when a call fails, and hedges a slow call with a second request to the
+next provider once the first has run past its observed p95 latency.
+"""
 import os
-from typing import Dict, Any
-import openai
-from openai import OpenAI
+import json
+import time
+import asyncio
+from collections import deque
+
 from pydantic import BaseModel
-from google import genai
+
+from llm_gateway import LLMGateway
+from perf_stats import percentile
+from quota import QuotaExceeded
+
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "gemini,openai,perplexity")
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1") == "1"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_MS = float(os.getenv("LLM_HEDGE_MIN_MS", "50"))
+
 
 class AIRequest(BaseModel):
     text: str
@@ -14,10 +38,50 @@ class AIResponse(BaseModel):
     model_used: str
     tokens: int = 0
 
+
+class ProviderUnavailable(Exception):
+    """No provider could answer: every breaker is open or every call failed."""
+
+
+def _chat_messages(contents, system_instruction: str = None) -> list:
+    messages = []
+    if system_instruction:
+        messages.append({"role": "system", "content": system_instruction})
+    messages.append({"role": "user", "content": str(contents)})
+    return messages
+
+
+def _chat_options(config: dict) -> dict:
+    """Gemini-style generation config mapped onto chat-completions fields."""
+    config = config or {}
+    options = {}
+    if config.get("max_output_tokens"):
+        options["max_tokens"] = config["max_output_tokens"]
+    if config.get("temperature") is not None:
+        options["temperature"] = config["temperature"]
+    return options
+
+
 class OpenAIService:
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
-    
+    name = "openai"
+    model_prefixes = ("gpt-", "o1", "o3", "o4")
+
+    def __init__(self, api_key: str = None, client=None, model: str = "gpt-4o-mini", timeout: float = None):
+        self._api_key = api_key
+        self._client = client
+        self.model = model
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self._api_key, timeout=self.timeout)
+        return self._client
+
+    def _model(self, model: str) -> str:
+        return model if model and model.startswith(self.model_prefixes) else self.model
+
     async def analyze(self, text: str, model: str = "gpt-4o-mini") -> AIResponse:
         response = await self.client.chat.completions.create(
             model=model,
@@ -29,29 +93,359 @@ class OpenAIService:
             tokens=response.usage.total_tokens if response.usage else 0
         )
 
+    async def generate(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None) -> str:
+        response = await asyncio.wait_for(
+            self.client.chat.completions.create(
+                model=self._model(model),
+                messages=_chat_messages(contents, system_instruction),
+                **_chat_options(config),
+            ),
+            timeout=timeout or self.timeout,
+        )
+        return response.choices[0].message.content or ""
+
+    async def stream(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None):
+        timeout = timeout or self.timeout
+        stream = await asyncio.wait_for(
+            self.client.chat.completions.create(
+                model=self._model(model),
+                messages=_chat_messages(contents, system_instruction),
+                stream=True,
+                **_chat_options(config),
+            ),
+            timeout=timeout,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
 class GeminiService:
-    def __init__(self, api_key: str):
-        self.client = genai.Client(api_key=api_key)
-    
+    """Gemini through LLMGateway, which adds prompt caching and the concurrency cap."""
+
+    name = "gemini"
+    model_prefixes = ("gemini", "models/gemini")
+
+    def __init__(self, gateway: LLMGateway = None, model: str = "gemini-2.5-flash"):
+        self.gateway = gateway or LLMGateway()
+        self.model = model
+
+    def _model(self, model: str) -> str:
+        return model if model and model.startswith(self.model_prefixes) else self.model
+
     async def analyze(self, text: str, model: str = "gemini-1.5-flash") -> AIResponse:
-        response = await self.client.aio.models.generate_content(
-            model=model,
-            contents=text
-        )
         return AIResponse(
-            response=response.text,
+            response=await self.generate(model, text),
             model_used=model
         )
 
+    async def generate(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None) -> str:
+        return await self.gateway.generate(self._model(model), contents, system_instruction, config, timeout)
+
+    async def stream(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None):
+        async for chunk in self.gateway.stream(self._model(model), contents, system_instruction, config, timeout):
+            yield chunk
+
+
 class PerplexityService:
-    def __init__(self, api_key: str):
+    """Perplexity's OpenAI-compatible chat completions API over httpx."""
+
+    name = "perplexity"
+    model_prefixes = ("sonar", "llama-")
+
+    def __init__(self, api_key: str, client=None, model: str = "sonar", timeout: float = None):
         self.api_key = api_key
         self.base_url = "https://api.perplexity.ai"
-    
-    async def analyze(self, text: str, model: str = "llama-3.1-sonar-small-128k-online") -> AIResponse:
-        # Perplexity API implementation would go here
-        # Using mock response for now
+        self._client = client
+        self.model = model
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+            )
+        return self._client
+
+    def _model(self, model: str) -> str:
+        return model if model and model.startswith(self.model_prefixes) else self.model
+
+    def _body(self, model: str, contents, system_instruction: str, config: dict, stream: bool = False) -> dict:
+        return {
+            "model": self._model(model),
+            "messages": _chat_messages(contents, system_instruction),
+            "stream": stream,
+            **_chat_options(config),
+        }
+
+    async def analyze(self, text: str, model: str = "sonar") -> AIResponse:
         return AIResponse(
-            response=f"Perplexity analyzed: {text}",
-            model_used=model
+            response=await self.generate(model, text),
+            model_used=self._model(model)
         )
+
+    async def generate(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None) -> str:
+        response = await self.client.post(
+            "/chat/completions",
+            json=self._body(model, contents, system_instruction, config),
+            timeout=timeout or self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"] or ""
+
+    async def stream(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None):
+        async with self.client.stream(
+            "POST",
+            "/chat/completions",
+            json=self._body(model, contents, system_instruction, config, stream=True),
+            timeout=timeout or self.timeout,
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                text = choices[0].get("delta", {}).get("content")
+                if text:
+                    yield text
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive errors; once `reset_seconds` have
+    passed it lets one probe call through (half-open) and closes again if
+    that call succeeds.
+    """
+
+    def __init__(self, failures: int = None, reset_seconds: float = None):
+        self.max_failures = failures or LLM_BREAKER_FAILURES
+        self.reset_seconds = LLM_BREAKER_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def ready(self) -> bool:
+        if self.state == "closed":
+            return True
+        # Half-open means the probe is already in flight
+        return self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds
+
+    def begin(self):
+        if self.state == "open":
+            self.state = "half_open"
+
+    def release(self):
+        """A call was cancelled without an outcome; let the next one probe instead."""
+        if self.state == "half_open":
+            self.state = "open"
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.max_failures:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class _Route:
+    """A provider with its breaker and recent latencies."""
+
+    def __init__(self, provider, breaker: CircuitBreaker, window: int = 200):
+        self.provider = provider
+        self.name = getattr(provider, "name", type(provider).__name__)
+        self.breaker = breaker
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None until enough samples exist."""
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(percentile(self.latencies, 95), LLM_HEDGE_MIN_MS / 1000)
+
+
+class ProviderRouter:
+    """Drop-in for LLMGateway that spreads calls over ordered providers."""
+
+    def __init__(self, providers: list, hedge: bool = None, breaker_factory=CircuitBreaker):
+        if not providers:
+            raise ValueError("ProviderRouter needs at least one provider")
+        self.routes = [_Route(p, breaker_factory()) for p in providers]
+        self.hedge = LLM_HEDGE_ENABLED if hedge is None else hedge
+
+        self.fallbacks = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _available(self) -> list:
+        return [r for r in self.routes if r.breaker.ready()]
+
+    async def _call(self, route: _Route, model: str, contents, system_instruction: str, config: dict, timeout: float) -> str:
+        route.calls += 1
+        route.breaker.begin()
+        start = time.perf_counter()
+        try:
+            text = await route.provider.generate(model, contents, system_instruction, config, timeout)
+        except asyncio.CancelledError:
+            # A lost hedge still ran at least this long; keep it so p95 is not skewed low
+            route.latencies.append(time.perf_counter() - start)
+            route.breaker.release()
+            raise
+        except QuotaExceeded:
+            # Our own load shedding, not a provider fault: fall back without tripping
+            route.breaker.release()
+            raise
+        except Exception:
+            route.errors += 1
+            route.breaker.record_failure()
+            raise
+        route.latencies.append(time.perf_counter() - start)
+        route.breaker.record_success()
+        return text
+
+    async def generate(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None) -> str:
+        queue = self._available()
+        if not queue:
+            raise ProviderUnavailable("All LLM providers are unavailable")
+
+        pending = {}
+        errors = []
+
+        def launch():
+            route = queue.pop(0)
+            task = asyncio.ensure_future(self._call(route, model, contents, system_instruction, config, timeout))
+            pending[task] = route
+            return route
+
+        lead = launch()
+        hedged = False
+        try:
+            while pending:
+                delay = lead.hedge_delay() if self.hedge and not hedged and queue else None
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The lead call has outlived its provider's p95: race the next provider
+                    hedged = True
+                    self.hedges += 1
+                    launch()
+                    continue
+
+                winner = None
+                for task in done:
+                    route = pending.pop(task)
+                    if task.exception() is not None:
+                        errors.append(f"{route.name}: {task.exception()!r}")
+                    elif winner is None:
+                        winner = route, task.result()
+                if winner is not None:
+                    if hedged and winner[0] is not lead:
+                        self.hedge_wins += 1
+                    return winner[1]
+
+                if not pending and queue:
+                    self.fallbacks += 1
+                    lead = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise ProviderUnavailable("All LLM providers failed: " + "; ".join(errors))
+
+    async def stream(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None):
+        """
+        Streams from the first healthy provider. A provider that fails
+        before its first chunk is skipped; once text has been sent the
+        error propagates, since the reply cannot be restarted.
+        """
+        routes = self._available()
+        if not routes:
+            raise ProviderUnavailable("All LLM providers are unavailable")
+
+        errors = []
+        for i, route in enumerate(routes):
+            if i:
+                self.fallbacks += 1
+            route.calls += 1
+            route.breaker.begin()
+            started = False
+            try:
+                async for chunk in route.provider.stream(model, contents, system_instruction, config, timeout):
+                    started = True
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                route.breaker.release()
+                raise
+            except QuotaExceeded as e:
+                route.breaker.release()
+                errors.append(f"{route.name}: {e!r}")
+                continue
+            except Exception as e:
+                route.errors += 1
+                route.breaker.record_failure()
+                if started:
+                    raise
+                errors.append(f"{route.name}: {e!r}")
+                continue
+            route.breaker.record_success()
+            return
+
+        raise ProviderUnavailable("All LLM providers failed: " + "; ".join(errors))
+
+    def snapshot(self) -> dict:
+        return {
+            "providers": {
+                r.name: {
+                    "state": r.breaker.state,
+                    "calls": r.calls,
+                    "errors": r.errors,
+                    "trips": r.breaker.trips,
+                    "p95_ms": round(percentile(r.latencies, 95) * 1000, 1),
+                }
+                for r in self.routes
+            },
+            "fallbacks": self.fallbacks,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+def build_providers(names: str = None) -> list:
+    """
+    Providers in LLM_PROVIDERS order. Fallbacks without an API key are
+    skipped; `fake` adds a local FakeProvider (FAKE_PROVIDER_LATENCY_MS,
+    FAKE_PROVIDER_FAILURE_RATE).
+    """
+    providers = []
+    for name in (names or LLM_PROVIDERS).split(","):
+        name = name.strip().lower()
+        if name == "gemini":
+            providers.append(GeminiService())
+        elif name == "openai" and os.getenv("OPENAI_API_KEY"):
+            providers.append(OpenAIService(api_key=os.getenv("OPENAI_API_KEY")))
+        elif name == "perplexity" and os.getenv("PERPLEXITY_API_KEY"):
+            providers.append(PerplexityService(api_key=os.getenv("PERPLEXITY_API_KEY")))
+        elif name == "fake":
+            from fake_genai import FakeProvider
+            providers.append(FakeProvider(
+                latency=float(os.getenv("FAKE_PROVIDER_LATENCY_MS", "0")) / 1000,
+                failure_rate=float(os.getenv("FAKE_PROVIDER_FAILURE_RATE", "0")),
+            ))
+    return providers
+
+
+def build_router() -> ProviderRouter:
+    return ProviderRouter(build_providers())
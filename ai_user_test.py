@@ -1,22 +1,47 @@
 #!/usr/bin/env python3
+"""
+Simulated-trainee load generator for Agent Monica 007.
+
+Runs N concurrent trainees through /monica/session and /monica/chat over
+one shared httpx connection pool, with Poisson arrivals and think time,
+and reports throughput, per-stage latency percentiles, error rates and
+the saturation point when ramping concurrency.
+
+    # one LLM-backed trainee against a running server (the old behaviour)
+    python ai_user_test.py --users 1 --trainee llm --verbose
+
+    # 50 scripted trainees against the app in-process with a stub LLM
+    python ai_user_test.py --in-process --users 50 --arrival-rate 5 --stub-latency-ms 800
+
+    # find the saturation point
+    python ai_user_test.py --in-process --ramp 1,2,4,8,16,32,64
+"""
 import os
+import sys
 import time
-import requests
-from google import genai
-from typing import List, Dict
+import random
+import asyncio
+import argparse
+from collections import Counter, defaultdict
 from dotenv import load_dotenv
 
+from perf_stats import percentile, print_table
+from quota import priority as quota_priority
+from bench_sessions import SCRIPTED_SESSION
+
 # Load environment variables
 load_dotenv()
 
 # Configuration
 BASE_URL = "http://localhost:8000"
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GREETING = (
+    "Welcome to the pitching module. Please tell me your name, your role (BM or PL), "
+    "your headquarter base, and your division."
+)
+
 
 class BMUserAgent:
-    def __init__(self):
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
-        self.persona = """
+    persona = """
 You are **Pavan**, a professional Business Manager (BM) from HQ India, Stimulus division.
 You are participating in a sales coaching session with **Agent Monica 007**.
 Your goal is to practice pitching **Dexel & Dexel ND** products.
@@ -33,83 +58,217 @@ BEHAVIOR RULES:
 9. To end the RCPA or DOCTOR conversation, say something like "Thank you, that's all for now" or "Thank you for your time, doctor."
 """
 
-    def generate_response(self, monica_reply: str, current_stage: str) -> str:
-        prompt = f"""
-{self.persona}
+    def __init__(self, gateway):
+        self.gateway = gateway
 
+    async def next_message(self, monica_reply: str, current_stage: str) -> str:
+        prompt = f"""
 CURRENT STAGE: {current_stage}
 MONICA'S LAST MESSAGE: "{monica_reply}"
 
 Based on the stage and Monica's message, what is your next response as Pavan?
 Respond ONLY with the text of your message.
 """
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=prompt
-        )
-        return response.text.strip()
+        # Simulated trainees queue behind real interactive and voice traffic
+        with quota_priority("batch"):
+            text = await self.gateway.generate(
+                model="gemini-2.0-flash-exp",
+                contents=prompt,
+                system_instruction=self.persona,
+            )
+        return text.strip()
 
-def run_ai_test():
-    print("=" * 80)
-    print("        AGENT MONICA 007 - AI-DRIVEN INTERACTIVE TESTING        ")
-    print("=" * 80)
 
-    user_agent = BMUserAgent()
-    
-    # Create Session
-    resp = requests.post(f"{BASE_URL}/monica/session")
-    session = resp.json()
-    session_id = session["id"]
-    current_stage = session["current_stage"]
-    
-    # Initial Monica Message
-    monica_reply = "Welcome to the pitching module. Please tell me your name, your role (BM or PL), your headquarter base, and your division."
-    print(f"\n🤖 MONICA (SETUP): {monica_reply}")
-
-    max_turns = 30
-    turn = 0
-    
-    while turn < max_turns:
-        turn += 1
-        
-        # 1. User Agent generates response
-        user_text = user_agent.generate_response(monica_reply, current_stage)
-        print(f"\n👤 PAVAN (BM): {user_text}")
-        
-        # Rate limit cooldown for Gemini
-        time.sleep(6)
-        
-        # 2. Submit to Monica
+class ScriptedTrainee:
+    def __init__(self):
+        self.turns = iter(SCRIPTED_SESSION)
+
+    async def next_message(self, monica_reply: str, current_stage: str) -> str:
+        return next(self.turns, "Thank you.")
+
+
+class LoadStats:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.errors = Counter()
+        self.turns = 0
+        self.sessions_started = 0
+        self.sessions_completed = 0
+
+    def error_rate(self) -> float:
+        attempts = self.turns + sum(self.errors.values())
+        return sum(self.errors.values()) / attempts if attempts else 0.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--in-process", action="store_true", help="serve the app in-process with a stub LLM")
+    parser.add_argument("--stub-latency-ms", type=float, default=800.0)
+    parser.add_argument("--users", type=int, default=10, help="trainees per run")
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="trainees/second (0 = all at once)")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds between turns")
+    parser.add_argument("--trainee", choices=["scripted", "llm"], default="scripted")
+    parser.add_argument("--max-turns", type=int, default=30)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--ramp", help="comma-separated concurrency steps, e.g. 1,2,4,8,16")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args()
+
+
+def make_client(args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(args.users, 10), max_keepalive_connections=max(args.users, 10))
+    if args.in_process:
+        import main as app_module
+        transport = httpx.ASGITransport(app=app_module.app)
+        return httpx.AsyncClient(transport=transport, base_url="http://loadgen", timeout=args.timeout, limits=limits)
+    return httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits)
+
+
+async def run_trainee(client, args, stats: LoadStats, trainee_factory, name: str):
+    try:
+        resp = await client.post("/monica/session")
+        resp.raise_for_status()
+    except Exception as e:
+        stats.errors[f"session: {type(e).__name__}"] += 1
+        return
+
+    session_id = resp.json()["id"]
+    current_stage = "SETUP"
+    monica_reply = GREETING
+    trainee = trainee_factory()
+    stats.sessions_started += 1
+
+    for _ in range(args.max_turns):
+        user_text = await trainee.next_message(monica_reply, current_stage)
+        if args.verbose:
+            print(f"\n👤 {name} ({current_stage}): {user_text}")
+
+        start = time.perf_counter()
         try:
-            resp = requests.post(
-                f"{BASE_URL}/monica/chat",
-                json={"session_id": session_id, "text": user_text}
-            )
+            resp = await client.post("/monica/chat", json={"session_id": session_id, "text": user_text})
             resp.raise_for_status()
-            data = resp.json()
-            
-            monica_reply = data["reply"]
-            new_stage = data.get("current_stage", current_stage) # We might need to fetch session again to be sure of stage
-            
-            # Fetch latest session state to track stage properly
-            s_resp = requests.get(f"{BASE_URL}/monica/session/{session_id}")
-            if s_resp.status_code == 200:
-                stage_info = s_resp.json()
-                current_stage = stage_info["current_stage"]
-            
-            print(f"\n🤖 MONICA ({current_stage}): {monica_reply}")
-            
-            if current_stage == "END":
-                print("\n✅ Session completed successfully!")
-                break
-                
         except Exception as e:
-            print(f"\n❌ Error: {e}")
-            break
+            stats.errors[f"chat: {type(e).__name__}"] += 1
+            return
+        stats.latency[current_stage].append(time.perf_counter() - start)
+        stats.turns += 1
+
+        data = resp.json()
+        monica_reply = data["reply"]
+        current_stage = data.get("current_stage") or current_stage
+        if args.verbose:
+            print(f"\n🤖 MONICA ({current_stage}): {monica_reply}")
+
+        if current_stage == "END":
+            stats.sessions_completed += 1
+            return
+
+        if args.think_time:
+            await asyncio.sleep(random.expovariate(1 / args.think_time))
+
+
+async def run_load(client, args, users: int, trainee_factory) -> tuple:
+    stats = LoadStats()
+    tasks = []
+    started = time.perf_counter()
+
+    for i in range(users):
+        tasks.append(asyncio.create_task(run_trainee(client, args, stats, trainee_factory, f"BM-{i + 1}")))
+        if args.arrival_rate:
+            await asyncio.sleep(random.expovariate(args.arrival_rate))
+
+    await asyncio.gather(*tasks)
+    return stats, time.perf_counter() - started
+
+
+def report(stats: LoadStats, wall: float, users: int):
+    all_turns = [v for values in stats.latency.values() for v in values]
+    print(f"\ntrainees: {users}  sessions completed: {stats.sessions_completed}/{stats.sessions_started}  "
+          f"turns: {stats.turns}  wall: {wall:.1f}s")
+    print(f"throughput: {stats.turns / wall:.2f} turns/s  error rate: {stats.error_rate():.2%}")
+    for kind, count in stats.errors.most_common():
+        print(f"  {kind}: {count}")
+    print_table("Turn latency by stage", {"all turns": all_turns, **stats.latency})
+
+
+def find_saturation(steps: list) -> int:
+    """
+    First concurrency step where adding trainees stops paying off:
+    throughput grows < 10%, p95 more than doubles, or errors exceed 1%.
+    """
+    for previous, current in zip(steps, steps[1:]):
+        if current["error_rate"] > 0.01:
+            return current["users"]
+        if current["throughput"] < previous["throughput"] * 1.10:
+            return current["users"]
+        if previous["p95"] and current["p95"] > previous["p95"] * 2:
+            return current["users"]
+    return None
+
+
+async def main():
+    args = parse_args()
+
+    if args.in_process:
+        # Serve with the local stub LLM and a throwaway database
+        import tempfile
+        db_dir = tempfile.mkdtemp(prefix="monica-loadgen-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'loadgen.db')}"
+        os.environ["MONICA_LLM_BACKEND"] = "fake"
+        os.environ["MONICA_LLM_LATENCY_MS"] = str(args.stub_latency_ms)
+        os.environ.setdefault("GEMINI_API_KEY", "offline-loadgen")
+
+    if args.trainee == "llm":
+        from llm_gateway import get_gateway
+        gateway = get_gateway()
+        trainee_factory = lambda: BMUserAgent(gateway)
+    else:
+        trainee_factory = ScriptedTrainee
+
+    print("=" * 80)
+    print("        AGENT MONICA 007 - SIMULATED TRAINEE LOAD TEST        ")
+    print("=" * 80)
+
+    if args.in_process:
+        # ASGITransport does not run the app lifespan
+        from database import create_schema
+        await create_schema()
+
+    async with make_client(args) as client:
+        if not args.ramp:
+            stats, wall = await run_load(client, args, args.users, trainee_factory)
+            report(stats, wall, args.users)
+        else:
+            steps = []
+            for users in [int(x) for x in args.ramp.split(",")]:
+                stats, wall = await run_load(client, args, users, trainee_factory)
+                all_turns = [v for values in stats.latency.values() for v in values]
+                steps.append({
+                    "users": users,
+                    "throughput": stats.turns / wall,
+                    "p50": percentile(all_turns, 50),
+                    "p95": percentile(all_turns, 95),
+                    "error_rate": stats.error_rate(),
+                })
+
+            print(f"\n  {'users':>6}{'turns/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>9}")
+            for step in steps:
+                print(f"  {step['users']:>6}{step['throughput']:>10.2f}{step['p50'] * 1000:>10.1f}"
+                      f"{step['p95'] * 1000:>10.1f}{step['error_rate']:>9.2%}")
+
+            saturation = find_saturation(steps)
+            if saturation:
+                print(f"\nsaturation point: ~{saturation} concurrent trainees")
+            else:
+                print("\nno saturation within the tested range")
 
     print("\n" + "=" * 80)
     print("                             TEST OVER                             ")
     print("=" * 80)
 
+
 if __name__ == "__main__":
-    run_ai_test()
+    sys.exit(asyncio.run(main()))
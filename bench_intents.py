@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: compiled IntentEngine vs the old per-call
+`any(sig in u for sig in [...])` substring scans.
+
+    python bench_intents.py [iterations]
+"""
+import sys
+import timeit
+
+from intents import INTENTS
+
+SAMPLES = [
+    ("SETUP", "this is pavan iam working in hq india and in stimulus division and my role is bm"),
+    ("SETUP", "yeah that's right, let's begin"),
+    ("SETUP", "I will submit the form later"),
+    ("RCPA", "Which brands of Vitamin D does Dr. Sharma prescribe most often?"),
+    ("RCPA", "Thank you, that's all I needed."),
+    ("RCPA", "The earlier launch was abandoned, right?"),
+    ("DOCTOR", "Doctor, what outcomes matter most for your osteoporosis patients?"),
+    ("DOCTOR", "Thank you for your time, doctor. That covers everything."),
+]
+
+# (scope, text, intent, expected) cases where substring matching misfires
+ACCURACY_CASES = [
+    ("SETUP", "I will submit the form later", "role_bm", False),
+    ("SETUP", "Please explain the plan", "role_pl", False),
+    ("SETUP", "my role is BM", "role_bm", True),
+    ("RCPA", "The earlier launch was abandoned, right?", "end", False),
+    ("RCPA", "ok, done", "end", True),
+    ("SETUP", "look at the numbers", "ready", False),
+    ("SETUP", "ok, go ahead", "ready", True),
+]
+
+
+def legacy_match(scope: str, text: str) -> set:
+    """The pre-IntentEngine checks, lists rebuilt on every call."""
+    t = text.lower()
+    found = set()
+    if scope == "SETUP":
+        if any(c in t for c in ["yes", "correct", "yeah", "that's right"]):
+            found.add("confirm")
+        if any(c in t for c in ["yup", "ok", "proceed", "sure", "start", "ready", "begin"]):
+            found.add("ready")
+        if "bm" in t or "business manager" in t:
+            found.add("role_bm")
+        if "pl" in t or "product leader" in t:
+            found.add("role_pl")
+        if "india" in t:
+            found.add("hq_india")
+        if "nucleus" in t:
+            found.add("division_nucleus")
+        if "stimulus" in t:
+            found.add("division_stimulus")
+    elif scope == "RCPA":
+        end_signals = [
+            "thank you", "thanks", "that's all", "that's it", "done",
+            "no more questions", "that's all i needed", "move to doctor",
+            "pitch to the doctor", "call the doctor",
+        ]
+        if any(signal in t for signal in end_signals):
+            found.add("end")
+    elif scope == "DOCTOR":
+        end_signals = [
+            "thank you doctor", "thanks doctor", "that's all", "appreciate your time",
+            "thank you for your time", "that covers everything",
+        ]
+        if any(signal in t for signal in end_signals):
+            found.add("close")
+    return found
+
+
+def legacy_setup_turn(text: str) -> bool:
+    """Old SETUP turn: field extraction, then a separate confirmation scan."""
+    found = legacy_match("SETUP", text)
+    t = text.lower()
+    confirmations = ["yes", "correct", "yeah", "that's right", "yup", "ok", "proceed", "sure", "start", "ready", "begin"]
+    return bool(found) and any(c in t for c in confirmations)
+
+
+def engine_setup_turn(text: str) -> bool:
+    found = INTENTS.match("SETUP", text)
+    return bool(found) and bool(INTENTS.match("SETUP", text) & {"confirm", "ready"})
+
+
+def best_of(fn, iterations: int, repeat: int = 5) -> float:
+    return min(timeit.repeat(fn, number=iterations, repeat=repeat))
+
+
+def report(title: str, legacy: float, engine: float, calls: int):
+    print(title)
+    print(f"  {'legacy scans':<16}{legacy / calls * 1e6:>10.2f} us")
+    print(f"  {'IntentEngine':<16}{engine / calls * 1e6:>10.2f} us")
+    print(f"  speedup: {legacy / engine:.2f}x")
+
+
+def run(iterations: int):
+    calls = iterations * len(SAMPLES)
+    report(
+        "single match, all scopes:",
+        best_of(lambda: [legacy_match(scope, text) for scope, text in SAMPLES], iterations),
+        best_of(lambda: [INTENTS.match(scope, text) for scope, text in SAMPLES], iterations),
+        calls,
+    )
+
+    setup_texts = [text for scope, text in SAMPLES if scope == "SETUP"]
+    report(
+        "SETUP turn (extraction + advance check):",
+        best_of(lambda: [legacy_setup_turn(text) for text in setup_texts], iterations),
+        best_of(lambda: [engine_setup_turn(text) for text in setup_texts], iterations),
+        iterations * len(setup_texts),
+    )
+
+    print("\naccuracy (expected / legacy / engine):")
+    for scope, text, intent, expected in ACCURACY_CASES:
+        old = intent in legacy_match(scope, text)
+        new = INTENTS.has(scope, text, intent)
+        flag = "" if new == expected else "  <-- engine wrong"
+        print(f"  {intent:<10} {expected!s:<6}{old!s:<6}{new!s:<6} {text!r}{flag}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
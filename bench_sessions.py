@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Offline session benchmark: drives complete SETUP -> END sessions through
+the FastAPI app in-process and reports per-turn latency, DB time and
+allocations.
+
+The LLM is never called over the network: by default the local fake
+client answers, or a recorded cassette is replayed:
+
+    python bench_sessions.py --sessions 20 --latency-ms 300
+    MONICA_LLM_BACKEND=record MONICA_LLM_CASSETTE=monica.json python ai_user_test.py ...
+    python bench_sessions.py --backend replay --cassette monica.json
+
+`--varied` gives each session its own trainee: names and the cacheable
+RCPA/DOCTOR questions are drawn from paraphrases, so the response-cache
+hit rate reflects real traffic rather than one script replayed.
+"""
+import os
+import sys
+import time
+import json
+import random
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from collections import defaultdict
+
+from perf_stats import print_table
+
+# A deterministic trainee that walks every stage with keyword exits
+SCRIPTED_SESSION = [
+    "Hi, I'm Pavan, BM from HQ India, Stimulus division",
+    "yes",
+    "Which Vitamin D brands does Dr. Sharma prescribe?",
+    "How many strips do you sell in a week?",
+    "Thank you, that's all I needed.",
+    "Doctor, what outcomes matter most for your patients with low Vitamin D?",
+    "Dexel ND gives a steady daily dose with better compliance.",
+    "Thank you for your time, doctor.",
+    "Dexel is priced competitively and patients stay on therapy longer.",
+    "IL-6 is a pro-inflammatory cytokine.",
+    "IL-6 sensitises nociceptors, so higher IL-6 means more pain.",
+    "TNF-alpha and IL-1 beta.",
+]
+
+# What different trainees say at the same point; --varied picks one per turn
+TRAINEE_VARIANTS = {
+    "Hi, I'm Pavan, BM from HQ India, Stimulus division": [
+        "Hi, I'm Pavan, BM from HQ India, Stimulus division",
+        "Hi, I'm Asha, PL from HQ Mumbai, Stimulus division",
+        "Hello, I'm Ravi, BM from HQ Delhi, Stimulus division",
+    ],
+    "Which Vitamin D brands does Dr. Sharma prescribe?": [
+        "Which Vitamin D brands does Dr. Sharma prescribe?",
+        "Which vitamin D brands does Dr Sharma prescribe?",
+        "What Vitamin D brands is Dr. Sharma prescribing?",
+        "Does Dr. Sharma write any Vitamin D brand?",
+    ],
+    "How many strips do you sell in a week?": [
+        "How many strips do you sell in a week?",
+        "How many strips do you sell in a week",
+        "How many strips a week do you sell?",
+        "How many strips do you sell in a month?",
+    ],
+    "Doctor, what outcomes matter most for your patients with low Vitamin D?": [
+        "Doctor, what outcomes matter most for your patients with low Vitamin D?",
+        "Doctor, what outcomes matter most for your patients with low vitamin D",
+        "Doctor, which outcomes matter most to your low Vitamin D patients?",
+        "Doctor, how do you usually treat Vitamin D deficiency?",
+    ],
+    "Dexel ND gives a steady daily dose with better compliance.": [
+        "Dexel ND gives a steady daily dose with better compliance.",
+        "Dexel ND gives a steady daily dose with better compliance",
+        "With Dexel ND patients get a steady weekly dose and stay compliant.",
+    ],
+}
+
+
+def session_script(rng: random.Random = None) -> list:
+    """SCRIPTED_SESSION, or one trainee's variant of it when `rng` is given."""
+    if rng is None:
+        return SCRIPTED_SESSION
+    return [rng.choice(TRAINEE_VARIANTS.get(text, [text])) for text in SCRIPTED_SESSION]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--backend", choices=["fake", "replay"], default="fake")
+    parser.add_argument("--cassette", default="monica_cassette.json")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="synthetic LLM latency per call")
+    parser.add_argument("--stream", action="store_true", help="use /monica/chat/stream")
+    parser.add_argument("--allocs", action="store_true", help="trace allocations (slower)")
+    parser.add_argument("--varied", action="store_true", help="vary the trainee's wording per session")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for --varied")
+    parser.add_argument("--json", action="store_true", help="print the raw summary as JSON")
+    return parser.parse_args()
+
+
+def configure(args):
+    # database.py and llm_gateway.py read these at import, so set them first
+    db_dir = tempfile.mkdtemp(prefix="monica-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ["MONICA_LLM_BACKEND"] = args.backend
+    os.environ["MONICA_LLM_CASSETTE"] = args.cassette
+    os.environ["MONICA_LLM_LATENCY_MS"] = str(args.latency_ms)
+    # Replayed sessions can drift from the recording; answer rather than fail
+    os.environ.setdefault("MONICA_LLM_MISS_TEXT", "Noted. What else would you like to know?")
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+
+class DBTimer:
+    """Accumulates time spent inside DBAPI cursor executions."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.seconds = 0.0
+        self.queries = 0
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bench_start", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self.seconds += time.perf_counter() - conn.info["bench_start"].pop()
+        self.queries += 1
+
+    def take(self):
+        seconds, queries = self.seconds, self.queries
+        self.seconds, self.queries = 0.0, 0
+        return seconds, queries
+
+
+def read_stream(body: str) -> dict:
+    for block in body.split("\n\n"):
+        if block.startswith("event: done"):
+            return json.loads(block.split("data: ", 1)[1])
+    return {}
+
+
+async def run_session(client, timer: DBTimer, results: dict, stream: bool, allocs: bool, script: list):
+    resp = await client.post("/monica/session")
+    resp.raise_for_status()
+    session_id = resp.json()["id"]
+    stage = "SETUP"
+
+    for text in script:
+        payload = {"session_id": session_id, "text": text}
+        timer.take()
+        if allocs:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+
+        start = time.perf_counter()
+        if stream:
+            resp = await client.post("/monica/chat/stream", json=payload)
+            data = read_stream(resp.text)
+        else:
+            resp = await client.post("/monica/chat", json=payload)
+            data = resp.json()
+        elapsed = time.perf_counter() - start
+
+        if resp.status_code != 200:
+            results["errors"] += 1
+            continue
+
+        db_seconds, queries = timer.take()
+        results["latency"]["all turns"].append(elapsed)
+        results["latency"][stage].append(elapsed)
+        results["db"]["db time / turn"].append(db_seconds)
+        results["queries"].append(queries)
+        if allocs:
+            _, peak = tracemalloc.get_traced_memory()
+            results["allocs"]["peak KiB / turn"].append((peak - before) / 1024)
+
+        stage = data.get("current_stage") or stage
+        if stage == "END":
+            results["completed"] += 1
+            break
+
+
+async def main():
+    args = parse_args()
+    configure(args)
+
+    import httpx
+    import main as app_module
+    from database import async_engine, create_schema
+    from llm_gateway import CLIENTS
+
+    # ASGITransport does not run the app lifespan
+    await create_schema()
+
+    timer = DBTimer(async_engine.sync_engine)
+    results = {
+        "latency": defaultdict(list),
+        "db": defaultdict(list),
+        "allocs": defaultdict(list),
+        "queries": [],
+        "errors": 0,
+        "completed": 0,
+    }
+
+    if args.allocs:
+        tracemalloc.start()
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        rng = random.Random(args.seed) if args.varied else None
+        for _ in range(args.sessions):
+            await run_session(client, timer, results, args.stream, args.allocs, session_script(rng))
+        wall = time.perf_counter() - started
+
+    turns = len(results["latency"]["all turns"])
+    print(f"sessions: {args.sessions}  completed: {results['completed']}  "
+          f"turns: {turns}  errors: {results['errors']}  wall: {wall:.2f}s")
+    print(f"backend: {args.backend}  synthetic latency: {args.latency_ms:.0f} ms  "
+          f"queries / turn: {sum(results['queries']) / max(turns, 1):.1f}")
+
+    print_table("Turn latency", results["latency"])
+    print_table("DB time", results["db"])
+    if args.allocs:
+        print_table("Allocations", results["allocs"], unit="KiB", scale=1.0)
+
+    cache = app_module.monica_agent.responses.snapshot()
+    if cache["stages"]:
+        trainees = "varied trainees" if args.varied else "scripted trainee"
+        print(f"\nresponse cache ({trainees}): hit rate {cache['hit_rate']:.0%} "
+              f"({cache['hits']}/{cache['hits'] + cache['misses']})  "
+              f"lookup p50 {cache['lookup_p50_ms']:.3f} ms  p95 {cache['lookup_p95_ms']:.3f} ms")
+
+    misses = getattr(CLIENTS.get("text"), "misses", None)
+    if misses:
+        print(f"\ncassette misses: {misses}")
+
+    if args.json:
+        from perf_stats import summarize
+        print(json.dumps({
+            "latency": {k: summarize(v) for k, v in results["latency"].items()},
+            "db": summarize(results["db"]["db time / turn"]),
+            "errors": results["errors"],
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how long a fresh worker takes to import the app,
+run its lifespan and serve a first session + chat turn, measured in new
+interpreter processes the way an autoscaler respawns workers.
+
+    python bench_startup.py --runs 5
+    python bench_startup.py --runs 5 --importtime 15   # slowest imports too
+
+Chat turns are answered by the local fake LLM; the separate "genai client"
+row is the deferred google-genai import and client construction that the
+lifespan moves off the request path.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+from perf_stats import print_table
+
+PROBE = r"""
+import os, sys, json, time, asyncio
+t0 = time.perf_counter()
+import main
+t_import = time.perf_counter()
+
+async def probe():
+    import httpx
+    timings = {"import main": t_import - t0}
+
+    start = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        timings["lifespan startup"] = time.perf_counter() - start
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            start = time.perf_counter()
+            sid = (await client.post("/monica/session")).json()["id"]
+            resp = await client.post("/monica/chat", json={"session_id": sid, "text": "Hi, I'm Pavan"})
+            resp.raise_for_status()
+            timings["first session + turn"] = time.perf_counter() - start
+
+    timings["ready to serve"] = timings["import main"] + timings["lifespan startup"]
+    print(json.dumps(timings))
+
+asyncio.run(probe())
+"""
+
+GENAI_PROBE = r"""
+import os, json, time
+start = time.perf_counter()
+from llm_gateway import CLIENTS
+CLIENTS.get("text")
+print(json.dumps({"genai client": time.perf_counter() - start}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", type=int, default=0, help="show the N slowest imports of main")
+    return parser.parse_args()
+
+
+def probe_env() -> dict:
+    db_dir = tempfile.mkdtemp(prefix="monica-startup-")
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(db_dir, 'startup.db')}",
+        "MONICA_LLM_BACKEND": "fake",
+        "CLIENT_WARMUP": "0",
+    })
+    env.setdefault("GEMINI_API_KEY", "offline-startup-bench")
+    return env
+
+
+def run_probe(code: str, env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(env: dict, count: int):
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Direct imports of main only; deeper ones are indented further
+        if len(name) - len(name.lstrip()) == 3:
+            rows.append((int(cumulative), name.strip()))
+    print("\nSlowest direct imports of main")
+    for micros, name in sorted(rows, reverse=True)[:count]:
+        print(f"  {name:<32}{micros / 1000:>10.1f} ms")
+
+
+def main():
+    args = parse_args()
+    env = probe_env()
+
+    # One throwaway run so bytecode caches are warm, as on a real host
+    run_probe(PROBE, env)
+
+    results = {}
+    for _ in range(args.runs):
+        for name, seconds in run_probe(PROBE, env).items():
+            results.setdefault(name, []).append(seconds)
+        try:
+            genai_env = dict(env, MONICA_LLM_BACKEND="genai")
+            for name, seconds in run_probe(GENAI_PROBE, genai_env).items():
+                results.setdefault(name, []).append(seconds)
+        except subprocess.CalledProcessError:
+            pass  # google-genai not installed here
+
+    print(f"runs: {args.runs}  python: {sys.version.split()[0]}")
+    print_table("Worker cold start", results)
+
+    if args.importtime:
+        slowest_imports(env, args.importtime)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# conversation_history.py
+import os
+from collections import OrderedDict, deque
+from sqlalchemy import select
+
+from models import MonicaMessage
+
+# Token budget for verbatim history, per stage. Override with
+# HISTORY_TOKENS_<STAGE>, e.g. HISTORY_TOKENS_DOCTOR=2000.
+DEFAULT_STAGE_BUDGETS = {
+    "SETUP": 300,
+    "RCPA": 1200,
+    "INTELLIGENCE": 600,
+    "DOCTOR": 1500,
+    "OBJECTION": 1200,
+    "KNOWLEDGE": 400,
+    "END": 300,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; close enough for budgeting
+    return max(1, (len(text) + 3) // 4)
+
+
+def stage_budget(stage: str) -> int:
+    override = os.getenv(f"HISTORY_TOKENS_{stage}")
+    if override:
+        return int(override)
+    return DEFAULT_STAGE_BUDGETS.get(stage, int(os.getenv("HISTORY_TOKENS_DEFAULT", "800")))
+
+
+def _speaker(role: str) -> str:
+    return "User" if role == "user" else "Monica"
+
+
+class HistoryTurn:
+    __slots__ = ("role", "content", "stage", "line", "tokens")
+
+    def __init__(self, role: str, content: str, stage: str):
+        self.role = role
+        self.content = content
+        self.stage = stage
+        self.line = f"{_speaker(role)}: {content}"
+        self.tokens = estimate_tokens(self.line)
+
+
+class SessionHistory:
+    """
+    Ring buffer of recent turns with cached token counts. Turns that fall
+    out of the window are rolled into a short extractive summary, which is
+    itself capped, so the assembled history never exceeds
+    `stage budget + summary budget` tokens.
+    """
+
+    def __init__(self, max_turns: int, summary_budget: int):
+        self.max_turns = max_turns
+        self.summary_budget = summary_budget
+        self.turns = deque()
+        self.summary_lines = deque()
+        self.summary_tokens = 0
+        self._summary = None
+
+    def append(self, role: str, content: str, stage: str):
+        self.turns.append(HistoryTurn(role, content, stage))
+        while len(self.turns) > self.max_turns:
+            self._roll(self.turns.popleft())
+
+    def _roll(self, turn: HistoryTurn):
+        snippet = turn.content.strip().split("\n")[0]
+        if len(snippet) > 160:
+            snippet = snippet[:157].rstrip() + "..."
+        line = f"[{turn.stage}] {_speaker(turn.role)}: {snippet}"
+        tokens = estimate_tokens(line)
+
+        self.summary_lines.append((line, tokens))
+        self.summary_tokens += tokens
+        while self.summary_tokens > self.summary_budget and self.summary_lines:
+            _, dropped = self.summary_lines.popleft()
+            self.summary_tokens -= dropped
+
+        self._summary = None
+
+    @property
+    def summary(self) -> str:
+        if self._summary is None:
+            self._summary = "\n".join(line for line, _ in self.summary_lines)
+        return self._summary
+
+    def window(self, budget: int) -> list:
+        """Newest turns that fit in `budget`; older ones go to the summary."""
+        used = 0
+        keep = 0
+        for turn in reversed(self.turns):
+            if used + turn.tokens > budget:
+                break
+            used += turn.tokens
+            keep += 1
+
+        while len(self.turns) > keep:
+            self._roll(self.turns.popleft())
+
+        return list(self.turns)
+
+
+class HistoryAssembler:
+    """
+    Per-session conversation memory for prompt assembly, kept in an LRU so
+    only active sessions stay resident. A session's history is seeded from
+    its most recent messages the first time it is needed.
+    """
+
+    def __init__(self, max_sessions: int = None, max_turns: int = None, summary_budget: int = None):
+        self.max_sessions = max_sessions or int(os.getenv("HISTORY_MAX_SESSIONS", "1000"))
+        self.max_turns = max_turns or int(os.getenv("HISTORY_MAX_TURNS", "40"))
+        self.summary_budget = summary_budget or int(os.getenv("HISTORY_SUMMARY_TOKENS", "250"))
+        self._sessions = OrderedDict()
+
+    def _new_history(self) -> SessionHistory:
+        return SessionHistory(self.max_turns, self.summary_budget)
+
+    async def history(self, uow, session_id: int) -> SessionHistory:
+        """`uow` is the turn's TurnUnitOfWork, used for the seeding read."""
+        history = self._sessions.get(session_id)
+        if history is not None:
+            self._sessions.move_to_end(session_id)
+            return history
+
+        recent = await uow.scalars(
+            select(MonicaMessage)
+            .where(MonicaMessage.session_id == session_id)
+            .order_by(MonicaMessage.id.desc())
+            .limit(self.max_turns)
+        )
+        # Another turn may have seeded it while this one was reading
+        history = self._sessions.get(session_id)
+        if history is not None:
+            return history
+
+        history = self._new_history()
+        for m in reversed(recent):
+            history.append(m.role, m.content, m.stage)
+
+        self._sessions[session_id] = history
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return history
+
+    def record(self, session_id: int, rows: list):
+        """Append committed message rows to a resident session's history."""
+        history = self._sessions.get(session_id)
+        if history is None:
+            return
+        for row in rows:
+            history.append(row["role"], row["content"], row["stage"])
+
+    async def build(self, uow, text: str) -> str:
+        session = uow.session
+        history = await self.history(uow, session.id)
+        turns = history.window(stage_budget(session.current_stage))
+
+        parts = []
+        if history.summary:
+            parts.append("Summary of earlier conversation:\n" + history.summary)
+        if turns:
+            parts.append("Conversation so far:\n" + "\n".join(t.line for t in turns))
+        parts.append(f"User: {text}\n")
+        return "\n\n".join(parts)
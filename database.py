@@ -1,5 +1,7 @@
 # Database (database.py)
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 import os
@@ -8,9 +10,44 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 
+# Pool sizing for the async engine used by the chat and voice paths
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def async_url(url: str) -> str:
+    """The async-driver form of a sync DATABASE_URL (aiosqlite / asyncpg)."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend == "postgresql":
+        return url.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    return url.render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(
+    # Heroku-style postgres:// URLs are not accepted by SQLAlchemy
+    DATABASE_URL.replace("postgres://", "postgresql://", 1)
+)
+
+# Sync engine: schema creation and the sample item routes
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+# Objects stay readable after commit, so sessions can be closed early
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -19,3 +56,26 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def create_schema():
+    """
+    Create missing tables and indexes. Run by the app lifespan or
+    `python migrate.py`.
+
+    create_all only adds indexes along with a table it creates, so the
+    ones added to existing tables later (models.LATE_INDEXES) are issued
+    separately as CREATE INDEX IF NOT EXISTS.
+    """
+    from sqlalchemy.schema import CreateIndex
+    import models  # imported here: models registers its tables on Base
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        for index in models.LATE_INDEXES:
+            await conn.execute(CreateIndex(index, if_not_exists=True))
@@ -28,8 +28,11 @@ class AIResponse(BaseModel):
 class MonicaChatRequest(BaseModel):
     session_id: int
     text: str
+    # Same key on a retry returns the original turn instead of running it again
+    idempotency_key: Optional[str] = None
 
 class MonicaMessageResponse(BaseModel):
+    id: int
     role: str
     content: str
     stage: str
@@ -54,7 +57,23 @@ class MonicaSessionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class MonicaSessionHeader(BaseModel):
+    id: int
+    current_stage: str
+    current_persona: str
+
+    class Config:
+        from_attributes = True
+
+class MonicaMessageSync(BaseModel):
+    session: MonicaSessionHeader
+    messages: List[MonicaMessageResponse]
+    next_cursor: int
+    has_more: bool
+
 class MonicaReply(BaseModel):
     reply: str
     advance_stage: bool
     state_delta: Dict[str, Any]
+    current_stage: Optional[str] = None
+    current_persona: Optional[str] = None
@@ -0,0 +1,297 @@
+# fake_genai.py
+"""
+In-process stand-in for `google.genai.Client`, covering the small surface
+Monica uses. Lets the service, prompt cache and benchmarks run locally
+without a Gemini key or network.
+"""
+import random
+import asyncio
+import itertools
+import contextlib
+from types import SimpleNamespace
+
+
+class FakeAPIError(Exception):
+    """Shaped like google.genai.errors.APIError: `code`, `status` and `message`."""
+
+    def __init__(self, code: int, status: str, message: str):
+        super().__init__(f"{code} {status}. {message}")
+        self.code = code
+        self.status = status
+        self.message = message
+
+
+def default_reply(model: str, contents, config: dict) -> str:
+    return "Noted. What else would you like to know?"
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeCachedContent:
+    def __init__(self, name: str, model: str, config: dict):
+        self.name = name
+        self.model = model
+        self.config = config
+
+
+class FakeAsyncModels:
+    def __init__(self, client: "FakeGenaiClient"):
+        self.client = client
+
+    async def generate_content(self, model: str, contents, config: dict = None):
+        return FakeResponse(await self.client._reply(model, contents, config))
+
+    async def generate_content_stream(self, model: str, contents, config: dict = None):
+        text = await self.client._reply(model, contents, config)
+
+        async def chunks():
+            for word in text.split(" "):
+                await asyncio.sleep(self.client.chunk_latency)
+                yield FakeResponse(word + " ")
+
+        return chunks()
+
+
+class FakeAsyncCaches:
+    def __init__(self, client: "FakeGenaiClient"):
+        self.client = client
+        self._ids = itertools.count(1)
+
+    async def create(self, model: str, config: dict):
+        text = config.get("system_instruction") or ""
+        if len(text) // 4 < self.client.min_cache_tokens:
+            raise FakeAPIError(400, "INVALID_ARGUMENT", "Cached content is too small")
+        cached = FakeCachedContent(f"cachedContents/fake-{next(self._ids)}", model, config)
+        self.client.caches[cached.name] = cached
+        return cached
+
+    async def update(self, name: str, config: dict):
+        if name not in self.client.caches:
+            raise FakeAPIError(403, "PERMISSION_DENIED", "CachedContent not found (or permission denied)")
+        self.client.caches[name].config.update(config)
+        return self.client.caches[name]
+
+    async def delete(self, name: str):
+        self.client.caches.pop(name, None)
+
+
+class FakeSyncModels:
+    def __init__(self, client: "FakeGenaiClient"):
+        self.client = client
+
+    def generate_content(self, model: str, contents, config: dict = None):
+        self.client.calls.append((model, contents, config))
+        return FakeResponse(self.client.reply_fn(model, contents, config))
+
+
+class FakeLiveSession:
+    """
+    One Live API session. A finished user turn is answered with `reply_ms`
+    of silent 24 kHz audio followed by turn_complete; receive() ends after
+    each turn like the real client.
+
+    Turns end the way the real API ends them: `activity_end` when the
+    config disables automatic activity detection (audio outside
+    activity_start/activity_end is rejected), `audio_stream_end` otherwise,
+    or a `send_client_content` with turn_complete. The deprecated
+    `send(input, end_of_turn)` is rejected: the real SDK ignores
+    `end_of_turn` for audio, so a turn sent that way never ends.
+    """
+
+    def __init__(self, client: "FakeGenaiClient", model: str, config: dict):
+        self.client = client
+        self.model = model
+        self.config = config
+        self.sent = []
+        self.closed = False
+        self.in_activity = False
+        self._tool_calls = set()
+        self._call_ids = itertools.count(1)
+        self._responses = asyncio.Queue()
+
+    @property
+    def manual_activity(self) -> bool:
+        detection = (self.config.get("realtime_input_config") or {}).get("automatic_activity_detection") or {}
+        return bool(detection.get("disabled"))
+
+    def _check_open(self):
+        if self.closed:
+            raise RuntimeError("live session is closed")
+
+    async def send(self, input=None, end_of_turn: bool = False):
+        raise TypeError("send() is deprecated; use send_realtime_input() or send_client_content()")
+
+    async def send_realtime_input(self, **fields):
+        self._check_open()
+        fields = {k: v for k, v in fields.items() if v is not None}
+        if len(fields) != 1:
+            raise ValueError(f"send_realtime_input takes exactly one field, got {sorted(fields)}")
+        (kind, value), = fields.items()
+
+        if kind == "audio":
+            if not isinstance(value, dict) or not value.get("data") or "mime_type" not in value:
+                raise ValueError("audio must be a blob with data and mime_type")
+            if self.manual_activity and not self.in_activity:
+                raise RuntimeError("audio sent outside activity_start/activity_end")
+        elif kind == "activity_start":
+            if not self.manual_activity:
+                raise RuntimeError("activity_start requires automatic activity detection to be disabled")
+            self.in_activity = True
+        elif kind == "activity_end":
+            if not self.in_activity:
+                raise RuntimeError("activity_end without activity_start")
+            self.in_activity = False
+        elif kind != "audio_stream_end":
+            raise ValueError(f"unsupported realtime input {kind!r}")
+
+        self.sent.append((kind, value))
+        if kind == "activity_end" or (kind == "audio_stream_end" and not self.manual_activity):
+            await self._answer()
+
+    async def send_client_content(self, turns=None, turn_complete: bool = True):
+        self._check_open()
+        self.sent.append(("client_content", turns))
+        if turn_complete:
+            await self._answer()
+
+    async def send_tool_response(self, function_responses=None):
+        self._check_open()
+        answered = {r["id"] if isinstance(r, dict) else r.id for r in function_responses or []}
+        if not answered or not answered <= self._tool_calls:
+            raise ValueError(f"tool response for unknown call ids {sorted(answered - self._tool_calls)}")
+        self._tool_calls -= answered
+        self.sent.append(("tool_response", function_responses))
+        # The model finishes its turn once every call it made is answered
+        if not self._tool_calls:
+            self._responses.put_nowait(self._content(turn_complete=True))
+
+    @staticmethod
+    def _message(data=None, server_content=None, tool_call=None):
+        return SimpleNamespace(data=data, server_content=server_content, tool_call=tool_call)
+
+    def _content(self, **fields):
+        content = dict(model_turn=None, turn_complete=False, input_transcription=None, output_transcription=None)
+        content.update(fields)
+        return self._message(server_content=SimpleNamespace(**content))
+
+    async def _answer(self):
+        await asyncio.sleep(self.client.latency)
+        if "input_audio_transcription" in self.config:
+            heard = SimpleNamespace(text=f"(trainee turn {len(self.sent)})")
+            self._responses.put_nowait(self._content(input_transcription=heard))
+
+        audio = b"\0\0" * (24000 * self.client.live_reply_ms // 1000)
+        self._responses.put_nowait(self._message(data=audio))
+        if "output_audio_transcription" in self.config:
+            said = SimpleNamespace(text=default_reply(self.model, None, self.config))
+            self._responses.put_nowait(self._content(output_transcription=said))
+
+        if self.client.live_tool_call:
+            # Like the real API: a separate tool_call message, and the turn
+            # only completes after send_tool_response answers it
+            call = SimpleNamespace(id=f"call-{next(self._call_ids)}", name=self.client.live_tool_call, args={})
+            self._tool_calls.add(call.id)
+            self._responses.put_nowait(self._message(tool_call=SimpleNamespace(function_calls=[call])))
+            return
+        self._responses.put_nowait(self._content(turn_complete=True))
+
+    async def receive(self):
+        while not self.closed:
+            resp = await self._responses.get()
+            yield resp
+            if resp.server_content and resp.server_content.turn_complete:
+                return
+
+
+class FakeAsyncLive:
+    def __init__(self, client: "FakeGenaiClient"):
+        self.client = client
+
+    @contextlib.asynccontextmanager
+    async def connect(self, model: str, config: dict = None):
+        # Stands in for the TLS + setup handshake
+        await asyncio.sleep(self.client.connect_latency)
+        if self.client.connect_error:
+            raise self.client.connect_error
+        session = FakeLiveSession(self.client, model, config or {})
+        self.client.live_sessions.append(session)
+        try:
+            yield session
+        finally:
+            session.closed = True
+
+
+class FakeGenaiClient:
+    """
+    `reply_fn(model, contents, config)` decides the reply text; `latency`
+    is added to every generate call (and live reply) to imitate network
+    time, and `connect_latency` to every live connect. With
+    `live_tool_call` set, every live turn also calls that tool; with
+    `connect_error` set, live connects raise it.
+    """
+
+    def __init__(self, reply_fn=None, latency: float = 0.0, chunk_latency: float = 0.0, min_cache_tokens: int = 0,
+                 connect_latency: float = 0.0, live_reply_ms: int = 200, live_tool_call: str = None,
+                 connect_error: Exception = None):
+        self.reply_fn = reply_fn or default_reply
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.min_cache_tokens = min_cache_tokens
+        self.connect_latency = connect_latency
+        self.live_reply_ms = live_reply_ms
+        self.live_tool_call = live_tool_call
+        self.connect_error = connect_error
+
+        self.calls = []
+        self.caches = {}
+        self.live_sessions = []
+
+        self.models = FakeSyncModels(self)
+        self.aio = SimpleNamespace(
+            models=FakeAsyncModels(self),
+            caches=FakeAsyncCaches(self),
+            live=FakeAsyncLive(self),
+        )
+
+    async def _reply(self, model: str, contents, config: dict) -> str:
+        config = config or {}
+        cached = config.get("cached_content")
+        if cached and cached not in self.caches:
+            raise FakeAPIError(403, "PERMISSION_DENIED", "CachedContent not found (or permission denied)")
+
+        self.calls.append((model, contents, config))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.reply_fn(model, contents, config)
+
+
+class FakeProvider:
+    """
+    Local provider for ProviderRouter: answers after `latency` seconds and
+    fails a `failure_rate` share of calls, so fallback, breakers and
+    hedging can be exercised without a network.
+    """
+
+    def __init__(self, name: str = "fake", reply_fn=None, latency: float = 0.0, failure_rate: float = 0.0):
+        self.name = name
+        self.reply_fn = reply_fn or default_reply
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = []
+
+    async def generate(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None) -> str:
+        self.calls.append((model, contents, config))
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            await asyncio.sleep(latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError(f"{self.name} failed")
+        return self.reply_fn(model, contents, config)
+
+    async def stream(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None):
+        text = await self.generate(model, contents, system_instruction, config, timeout)
+        for word in text.split(" "):
+            yield word + " "
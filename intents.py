@@ -0,0 +1,109 @@
+# intents.py
+import re
+
+# Signal phrases per scope (usually a stage), grouped by intent.
+# Phrases match on word boundaries, case-insensitively, with curly
+# apostrophes normalised, so "bm" no longer fires inside "submit".
+SIGNALS = {
+    "SETUP": {
+        "confirm": ["yes", "yeah", "correct", "that's right"],
+        "ready": ["yup", "ok", "okay", "proceed", "sure", "start", "ready", "begin"],
+        "role_bm": ["bm", "business manager"],
+        "role_pl": ["pl", "product leader"],
+        "hq_india": ["india"],
+        "division_nucleus": ["nucleus"],
+        "division_stimulus": ["stimulus"],
+    },
+    "RCPA": {
+        "end": [
+            "thank you",
+            "thanks",
+            "that's all",
+            "that's it",
+            "done",
+            "no more",
+            "no more questions",
+            "all i needed",
+            "that's all i needed",
+            "move to doctor",
+            "pitch to the doctor",
+            "call the doctor",
+        ],
+    },
+    "DOCTOR": {
+        "close": [
+            "thank you doctor",
+            "thanks doctor",
+            "that's all",
+            "appreciate your time",
+            "thank you for your time",
+            "that covers",
+            "that covers everything",
+            "i believe i've addressed",
+            "i think i've covered",
+        ],
+    },
+    # Matched against the doctor's reply rather than the trainee's text
+    "DOCTOR_FEEDBACK": {
+        "feedback": [
+            "you could improve",
+            "you did well",
+            "next time",
+            "overall",
+            "good job",
+        ],
+    },
+}
+
+
+def normalize(text: str) -> str:
+    text = text.lower()
+    if "’" in text or "‘" in text:
+        text = text.replace("’", "'").replace("‘", "'")
+    return text
+
+
+_NO_INTENTS = frozenset()
+
+
+class IntentEngine:
+    """
+    Compiles every signal phrase of a scope into one word-boundary regex,
+    so a single scan of the text returns all matched intents.
+    """
+
+    def __init__(self, signals: dict):
+        self._patterns = {}
+        self._lookup = {}
+
+        for scope, intents in signals.items():
+            lookup = {}
+            for intent, phrases in intents.items():
+                for phrase in phrases:
+                    lookup.setdefault(normalize(phrase), set()).add(intent)
+
+            # Longest first, so "thank you doctor" wins over "thank you"
+            alternatives = sorted(lookup, key=len, reverse=True)
+            body = "|".join(re.escape(p).replace("\\ ", " ") for p in alternatives)
+            self._patterns[scope] = re.compile(rf"\b(?:{body})\b")
+            self._lookup[scope] = {p: frozenset(i) for p, i in lookup.items()}
+
+    def match(self, scope: str, text: str) -> frozenset:
+        pattern = self._patterns.get(scope)
+        if pattern is None:
+            return _NO_INTENTS
+
+        lookup = self._lookup[scope]
+        matches = pattern.findall(normalize(text))
+        if not matches:
+            return _NO_INTENTS
+        if len(matches) == 1:
+            return lookup[matches[0]]
+        return frozenset().union(*map(lookup.__getitem__, matches))
+
+    def has(self, scope: str, text: str, intent: str) -> bool:
+        return intent in self.match(scope, text)
+
+
+# Compiled once at import and shared by the service and the stage agents
+INTENTS = IntentEngine(SIGNALS)
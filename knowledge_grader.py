@@ -0,0 +1,190 @@
+# knowledge_grader.py
+"""
+In-process grading of the KNOWLEDGE stage answers.
+
+Each question has reference key points. A key point counts as covered
+when the answer mentions one of its keywords, or when some sentence of
+the answer is close enough to the key point's reference text. The
+reference vectors are embedded once (text_embedding.HashedEmbedder) into
+one matrix, so grading an answer is a single (sentences x key points)
+matrix product: no network call on the hottest scripted stage.
+
+The question's subject (IL-6) is removed from both sides before the
+similarity pass, so restating the question earns nothing, and a keyword
+or sentence under a negation ("not a cytokine", "nothing to do with
+inflammation") does not count.
+"""
+import os
+import re
+
+from text_embedding import HashedEmbedder, normalize_text
+
+GRADER_SIMILARITY_THRESHOLD = float(os.getenv("GRADER_SIMILARITY_THRESHOLD", "0.6"))
+# Words before a keyword that are searched for a negation
+GRADER_NEGATION_WINDOW = int(os.getenv("GRADER_NEGATION_WINDOW", "4"))
+
+# Names of the subject every question is about; they carry no answer
+SUBJECT = re.compile(r"\b(?:il-6|il6|il 6|interleukin-6|interleukin 6)\b")
+NEGATIONS = {
+    "not", "no", "never", "nothing", "none", "neither", "nor", "without", "unrelated",
+    "isn't", "isnt", "aren't", "arent", "doesn't", "doesnt", "don't", "dont", "cannot", "can't", "cant",
+}
+
+# `required` key points earn full marks for the question
+KNOWLEDGE_REFERENCES = [
+    {
+        "question": "What is IL-6?",
+        "required": 2,
+        "key_points": [
+            {
+                "name": "cytokine",
+                "text": "IL-6 (interleukin 6) is a cytokine, a signalling protein",
+                "keywords": ["cytokine", "signalling protein", "signaling protein"],
+            },
+            {
+                "name": "pro-inflammatory",
+                "text": "IL-6 is a pro-inflammatory mediator that drives inflammation",
+                "keywords": ["pro-inflammatory", "proinflammatory", "inflammatory", "inflammation"],
+            },
+            {
+                "name": "immune origin",
+                "text": "IL-6 is released by immune cells such as macrophages and T cells in response to infection or injury",
+                "keywords": ["immune", "macrophage", "macrophages", "t cells", "t-cells", "infection", "injury"],
+            },
+        ],
+    },
+    {
+        "question": "What is the relationship between IL-6 and pain?",
+        "required": 2,
+        "key_points": [
+            {
+                "name": "nociceptor sensitisation",
+                "text": "IL-6 sensitises nociceptors, the pain receptors, lowering the pain threshold",
+                "keywords": ["sensitise", "sensitises", "sensitize", "sensitizes", "sensitisation",
+                             "sensitization", "nociceptor", "nociceptors", "pain receptors", "pain threshold"],
+            },
+            {
+                "name": "higher IL-6, more pain",
+                "text": "higher or elevated IL-6 levels are associated with more pain",
+                "keywords": ["higher il-6", "elevated il-6", "increased il-6", "more il-6", "more pain", "increases pain"],
+            },
+            {
+                "name": "inflammatory pain",
+                "text": "IL-6 drives the inflammation that causes pain",
+                "keywords": ["inflammation", "inflammatory pain", "swelling"],
+            },
+            {
+                "name": "vitamin D link",
+                "text": "vitamin D lowers IL-6 levels and so can reduce pain",
+                "keywords": ["vitamin d"],
+            },
+        ],
+    },
+    {
+        "question": "Name two other inflammatory mediators besides IL-6.",
+        "required": 2,
+        "key_points": [
+            {
+                "name": "TNF-alpha",
+                "text": "TNF alpha, tumour necrosis factor",
+                "keywords": ["tnf", "tnf-alpha", "tnf-a", "tumour necrosis", "tumor necrosis"],
+            },
+            {
+                "name": "IL-1 beta",
+                "text": "IL-1 beta, interleukin 1",
+                "keywords": ["il-1", "il1", "il-1b", "il-1beta", "il-1-beta", "interleukin 1", "interleukin-1"],
+            },
+            {
+                "name": "prostaglandins",
+                "text": "prostaglandins such as PGE2",
+                "keywords": ["prostaglandin", "prostaglandins", "pge2"],
+            },
+            {
+                "name": "CRP",
+                "text": "C-reactive protein, CRP",
+                "keywords": ["crp", "c-reactive"],
+            },
+            {
+                "name": "other mediators",
+                "text": "IL-8, bradykinin, histamine, leukotrienes",
+                "keywords": ["il-8", "il8", "bradykinin", "histamine", "leukotriene", "leukotrienes"],
+            },
+        ],
+    },
+]
+
+_SENTENCES = re.compile(r"[.;!?\n]+|,\s+(?:and|but|so)\s+")
+
+
+def _strip_subject(normalized: str) -> str:
+    return " ".join(SUBJECT.sub(" ", normalized).split())
+
+
+def _mentions(sentence: str, keyword: str) -> bool:
+    """`keyword` occurs in `sentence` outside a negation window (both normalised)."""
+    words = sentence.split()
+    size = len(keyword.split())
+    for i in range(len(words) - size + 1):
+        if " ".join(words[i:i + size]) == keyword:
+            if not NEGATIONS & set(words[max(0, i - GRADER_NEGATION_WINDOW):i]):
+                return True
+    return False
+
+
+class KnowledgeGrader:
+    def __init__(self, references: list = None, threshold: float = None, embedder: HashedEmbedder = None):
+        self.references = references or KNOWLEDGE_REFERENCES
+        self.threshold = GRADER_SIMILARITY_THRESHOLD if threshold is None else threshold
+        self.embedder = embedder or HashedEmbedder()
+        self._matrix = None
+        self._slices = []
+
+    def _reference_matrix(self):
+        # Embedded on first use: one row per key point across all questions
+        if self._matrix is None:
+            texts, start = [], 0
+            for ref in self.references:
+                texts.extend(kp["text"] for kp in ref["key_points"])
+                self._slices.append(slice(start, start + len(ref["key_points"])))
+                start += len(ref["key_points"])
+            self._matrix = self.embedder.embed_many(texts)
+        return self._matrix
+
+    def grade(self, index: int, answer: str) -> dict:
+        """Score the answer to question `index` (0-based) between 0 and 1."""
+        ref = self.references[index]
+        matrix = self._reference_matrix()[self._slices[index]]
+
+        sentences = [normalize_text(s) for s in _SENTENCES.split(answer or "")]
+        sentences = [s for s in sentences if s]
+        keyword_hits = [
+            any(_mentions(sentence, normalize_text(k)) for sentence in sentences for k in kp["keywords"])
+            for kp in ref["key_points"]
+        ]
+
+        # Negated sentences only ever count against a key point
+        compared = [_strip_subject(s) for s in sentences if not NEGATIONS & set(s.split())]
+        compared = [s for s in compared if s]
+        if compared:
+            # (sentences x key points) cosine similarities in one product
+            similarity = (self.embedder.embed_many(compared) @ matrix.T).max(axis=0)
+        else:
+            similarity = [0.0] * len(ref["key_points"])
+
+        matched, missed = [], []
+        for kp, keyword, sim in zip(ref["key_points"], keyword_hits, similarity):
+            (matched if keyword or sim >= self.threshold else missed).append(kp["name"])
+
+        return {
+            "question": ref["question"],
+            "score": round(min(1.0, len(matched) / ref["required"]), 2),
+            "matched": matched,
+            "missed": missed,
+            "similarity": round(float(max(similarity)), 2),
+        }
+
+    @staticmethod
+    def summary(graded: dict) -> float:
+        """Mean score over the graded questions."""
+        scores = [g["score"] for g in graded.values()]
+        return round(sum(scores) / len(scores), 2) if scores else 0.0
@@ -0,0 +1,274 @@
+# live_pool.py
+"""
+Pool of pre-established Gemini Live sessions for voice mode.
+
+Opening a live session costs a TLS + setup handshake before Monica can
+speak, so a few sessions per stage are connected ahead of time. A voice
+socket claims one on accept; the pool refills in the background and
+retires sessions that have sat idle long enough to be near the server's
+timeout. LiveSessionManager moves a socket onto the next stage's session
+when the stage advances.
+"""
+import os
+import time
+import asyncio
+from collections import defaultdict, deque
+
+from quota import QUOTA
+
+LIVE_POOL_SIZE = int(os.getenv("LIVE_POOL_SIZE", "1"))
+LIVE_POOL_STAGES = os.getenv("LIVE_POOL_STAGES", "SETUP")
+LIVE_POOL_MAX_IDLE_SECONDS = float(os.getenv("LIVE_POOL_MAX_IDLE_SECONDS", "300"))
+LIVE_POOL_REAP_INTERVAL = float(os.getenv("LIVE_POOL_REAP_INTERVAL", "15"))
+
+
+class LiveLease:
+    """An open live session and the context manager that owns it."""
+
+    def __init__(self, stage: str, context, session):
+        self.stage = stage
+        self.session = session
+        self.opened_at = time.monotonic()
+        self._context = context
+        self._closed = False
+
+    def age(self) -> float:
+        return time.monotonic() - self.opened_at
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._context.__aexit__(None, None, None)
+        except Exception as e:
+            print("Live session close failed:", e)
+
+
+class LiveSessionPool:
+    """
+    `config_for(stage)` builds the live config, so each stage key maps to
+    one system prompt; `client_factory()` returns the live client and is
+    only called once a session is actually opened. Sessions are single-use: a claimed session carries
+    the trainee's conversation and is closed, not returned, afterwards.
+    """
+
+    def __init__(self, client_factory, model: str, config_for, size: int = None, stages=None,
+                 max_idle: float = None, reap_interval: float = None):
+        self.client_factory = client_factory
+        self.model = model
+        self.config_for = config_for
+        self.size = LIVE_POOL_SIZE if size is None else size
+        if stages is None:
+            stages = [s.strip() for s in LIVE_POOL_STAGES.split(",") if s.strip()]
+        self.stages = set(stages)
+        self.max_idle = LIVE_POOL_MAX_IDLE_SECONDS if max_idle is None else max_idle
+        self.reap_interval = LIVE_POOL_REAP_INTERVAL if reap_interval is None else reap_interval
+
+        self._ready = defaultdict(deque)
+        self._filling = defaultdict(int)
+        self._waiters = defaultdict(deque)
+        self._reaper = None
+        self._closed = False
+
+        self.stats = defaultdict(lambda: {"hits": 0, "misses": 0, "retired": 0, "failed": 0})
+
+    async def _open(self, stage: str) -> LiveLease:
+        await QUOTA.acquire(self.model, priority="live")
+        context = self.client_factory().aio.live.connect(model=self.model, config=self.config_for(stage))
+        session = await context.__aenter__()
+        return LiveLease(stage, context, session)
+
+    def start(self):
+        """Begin warming the configured stages (otherwise done on first claim)."""
+        if self._reaper is None and self.size > 0:
+            self._reaper = asyncio.create_task(self._reap())
+            for stage in self.stages:
+                self._refill(stage)
+
+    def _refill(self, stage: str):
+        if self._closed or stage not in self.stages:
+            return
+        missing = self.size - len(self._ready[stage]) - self._filling[stage]
+        for _ in range(max(0, missing)):
+            self._filling[stage] += 1
+            asyncio.create_task(self._fill(stage))
+
+    async def _fill(self, stage: str):
+        waiters = self._waiters[stage]
+        try:
+            lease = await self._open(stage)
+        except Exception as e:
+            self.stats[stage]["failed"] += 1
+            print("Live pool warmup failed:", e)
+            # Waiters beyond the fills still in flight connect on their own
+            while len(waiters) > self._filling[stage] - 1:
+                waiter = waiters.pop()
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        finally:
+            self._filling[stage] -= 1
+
+        if self._closed:
+            await lease.close()
+            return
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(lease)
+                return
+        self._ready[stage].append(lease)
+
+    async def _reap(self):
+        while not self._closed:
+            await asyncio.sleep(self.reap_interval)
+            for stage, ready in list(self._ready.items()):
+                while ready and ready[0].age() > self.max_idle:
+                    await ready.popleft().close()
+                    self.stats[stage]["retired"] += 1
+                self._refill(stage)
+
+    def prewarm(self, stage: str):
+        """
+        Open one session for `stage` ahead of a socket reaching it. One-shot:
+        the stage does not join `stages`, so only configured stages are
+        refilled and kept warm.
+        """
+        self.start()
+        if self._closed or self.size <= 0 or self._ready[stage] or self._filling[stage]:
+            return
+        self._filling[stage] += 1
+        asyncio.create_task(self._fill(stage))
+
+    async def acquire(self, stage: str) -> LiveLease:
+        """A ready session for `stage`, or a freshly connected one when none is warm."""
+        self.start()
+        ready = self._ready[stage]
+        while ready:
+            lease = ready.popleft()
+            if lease.age() <= self.max_idle:
+                self.stats[stage]["hits"] += 1
+                self._refill(stage)
+                return lease
+            await lease.close()
+            self.stats[stage]["retired"] += 1
+
+        # A warmup already in flight is closer to ready than a fresh connect
+        if len(self._waiters[stage]) < self._filling[stage]:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[stage].append(waiter)
+            try:
+                lease = await waiter
+            except Exception:
+                pass
+            else:
+                self.stats[stage]["hits"] += 1
+                self._refill(stage)
+                return lease
+
+        self.stats[stage]["misses"] += 1
+        self._refill(stage)
+        return await self._open(stage)
+
+    async def close(self):
+        self._closed = True
+        if self._reaper:
+            self._reaper.cancel()
+        for ready in self._ready.values():
+            while ready:
+                await ready.popleft().close()
+
+    def snapshot(self) -> dict:
+        stages = set(self.stats) | {stage for stage, ready in self._ready.items() if ready}
+        return {
+            stage: {"ready": len(self._ready[stage]), **self.stats[stage]}
+            for stage in sorted(stages)
+        }
+
+
+class LiveSessionManager:
+    """
+    The live session one voice socket is talking to, across stage changes.
+
+    A live session's system instruction is fixed at connect time, so on
+    `advance_stage` the next stage's session is claimed from the pool in the
+    background and swapped in at the next turn boundary, then prompted to
+    pick up the conversation in its new persona.
+    """
+
+    def __init__(self, pool: LiveSessionPool, lease: LiveLease):
+        self.pool = pool
+        self.active = lease
+        self.next_stage = None
+        self._next = None
+        self.cutovers = 0
+        self.failed_cutovers = 0
+
+    @property
+    def session(self):
+        return self.active.session
+
+    @property
+    def stage(self) -> str:
+        return self.active.stage
+
+    def prepare(self, stage: str):
+        """
+        Start claiming `stage`'s session; it goes live at the next cut_over().
+        A later advance before that cut-over re-targets the claim, so the
+        socket always lands on the latest stage.
+        """
+        if stage == (self.next_stage or self.active.stage):
+            return
+        if self._next is not None:
+            asyncio.create_task(self._release(self._next))
+        self._next = self.next_stage = None
+        if stage != self.active.stage:
+            self.next_stage = stage
+            self._next = asyncio.create_task(self.pool.acquire(stage))
+
+    @staticmethod
+    async def _release(task: asyncio.Task):
+        """Close the session a superseded claim yields, or cancel the claim."""
+        if not task.done():
+            task.cancel()
+        try:
+            await (await task).close()
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    async def cut_over(self, handoff: str = None) -> bool:
+        """
+        Swap in the prepared stage's session. If it could not be connected,
+        the current session stays active and the stage is connected again,
+        inline, at the next turn boundary.
+        """
+        if self.next_stage is None:
+            return False
+        task, self._next = self._next, None
+        stage, self.next_stage = self.next_stage, None
+        try:
+            lease = await (task or self.pool.acquire(stage))
+        except Exception as e:
+            self.failed_cutovers += 1
+            print(f"Live cut-over to {stage} failed, staying on {self.active.stage}:", e)
+            self.next_stage = stage
+            return False
+
+        previous, self.active = self.active, lease
+        self.cutovers += 1
+        if handoff:
+            await lease.session.send_client_content(
+                turns={"role": "user", "parts": [{"text": handoff}]},
+                turn_complete=True,
+            )
+        await previous.close()
+        return True
+
+    async def close(self):
+        if self._next is not None:
+            task, self._next = self._next, None
+            self.next_stage = None
+            await self._release(task)
+        await self.active.close()
@@ -0,0 +1,220 @@
+# llm_cassette.py
+"""
+Record/replay wrappers for the genai client used by MonicaAgent and the
+stage agents (through LLMGateway).
+
+RecordingClient forwards every call to a real client and saves request /
+response pairs to a JSON cassette, written once at interpreter exit (or
+on `flush()`) so recording never stalls the event loop on file I/O.
+ReplayClient serves those pairs back
+deterministically, with configurable synthetic latency, so sessions can
+be benchmarked offline without a Gemini key.
+"""
+import os
+import json
+import atexit
+import asyncio
+import hashlib
+import itertools
+import threading
+from types import SimpleNamespace
+
+
+class CassetteMiss(KeyError):
+    """No recorded response for this request."""
+
+
+class CassetteResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _plain(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    return value
+
+
+class Cassette:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flush_registered = False
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(model: str, contents, config: dict) -> str:
+        payload = json.dumps(
+            {"model": model, "contents": _plain(contents), "config": _plain(config) or {}},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict:
+        entry = self.entries.get(key)
+        if entry is None:
+            raise CassetteMiss(key)
+        return entry
+
+    def put(self, key: str, entry: dict):
+        with self._lock:
+            self.entries[key] = entry
+            self._dirty = True
+            if not self._flush_registered:
+                atexit.register(self.flush)
+                self._flush_registered = True
+
+    def flush(self):
+        """Write buffered entries to `path`, atomically."""
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+class _CacheNames:
+    """
+    Cached-content names differ between runs, so requests are keyed on the
+    system prompt a cache name stands for rather than the name itself.
+    """
+
+    def __init__(self):
+        self.prompts = {}
+
+    def normalize(self, config) -> dict:
+        config = dict(_plain(config) or {})
+        name = config.pop("cached_content", None)
+        if name is not None:
+            config["system_instruction"] = self.prompts.get(name, name)
+        return config
+
+
+class _RecordingModels:
+    def __init__(self, client: "RecordingClient"):
+        self.client = client
+
+    async def generate_content(self, model: str, contents, config=None):
+        response = await self.client.inner.aio.models.generate_content(
+            model=model, contents=contents, config=config
+        )
+        self.client._record(model, contents, config, text=response.text or "")
+        return response
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        stream = await self.client.inner.aio.models.generate_content_stream(
+            model=model, contents=contents, config=config
+        )
+
+        async def chunks():
+            recorded = []
+            async for chunk in stream:
+                recorded.append(chunk.text or "")
+                yield chunk
+            self.client._record(model, contents, config, text="".join(recorded), chunks=recorded)
+
+        return chunks()
+
+
+class _RecordingCaches:
+    def __init__(self, client: "RecordingClient"):
+        self.client = client
+
+    async def create(self, model: str, config: dict):
+        cached = await self.client.inner.aio.caches.create(model=model, config=config)
+        self.client.cache_names.prompts[cached.name] = _plain(config).get("system_instruction")
+        return cached
+
+    async def update(self, name: str, config: dict):
+        return await self.client.inner.aio.caches.update(name=name, config=config)
+
+
+class RecordingClient:
+    def __init__(self, inner, path: str):
+        self.inner = inner
+        self.cassette = Cassette(path)
+        self.cache_names = _CacheNames()
+        self.aio = SimpleNamespace(
+            models=_RecordingModels(self),
+            caches=_RecordingCaches(self),
+        )
+
+    def _record(self, model: str, contents, config, text: str, chunks: list = None):
+        config = self.cache_names.normalize(config)
+        self.cassette.put(
+            Cassette.key(model, contents, config),
+            {"model": model, "text": text, "chunks": chunks or [text]},
+        )
+
+
+class _ReplayModels:
+    def __init__(self, client: "ReplayClient"):
+        self.client = client
+
+    async def generate_content(self, model: str, contents, config=None):
+        entry = self.client._lookup(model, contents, config)
+        await asyncio.sleep(self.client.latency)
+        return CassetteResponse(entry["text"])
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        entry = self.client._lookup(model, contents, config)
+        await asyncio.sleep(self.client.latency)
+
+        async def chunks():
+            for chunk in entry["chunks"]:
+                await asyncio.sleep(self.client.chunk_latency)
+                yield CassetteResponse(chunk)
+
+        return chunks()
+
+
+class _ReplayCaches:
+    def __init__(self, client: "ReplayClient"):
+        self.client = client
+        self._ids = itertools.count(1)
+
+    async def create(self, model: str, config: dict):
+        name = f"cachedContents/replay-{next(self._ids)}"
+        self.client.cache_names.prompts[name] = _plain(config).get("system_instruction")
+        return SimpleNamespace(name=name)
+
+    async def update(self, name: str, config: dict):
+        return SimpleNamespace(name=name)
+
+
+class ReplayClient:
+    """
+    `latency` seconds are added before each response and `chunk_latency`
+    between streamed chunks. Unrecorded requests raise CassetteMiss, or
+    get `miss_text` when it is set.
+    """
+
+    def __init__(self, path: str, latency: float = 0.0, chunk_latency: float = 0.0, miss_text: str = None):
+        self.cassette = Cassette(path)
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.miss_text = miss_text
+        self.cache_names = _CacheNames()
+        self.misses = 0
+        self.aio = SimpleNamespace(
+            models=_ReplayModels(self),
+            caches=_ReplayCaches(self),
+        )
+
+    def _lookup(self, model: str, contents, config) -> dict:
+        config = self.cache_names.normalize(config)
+        try:
+            return self.cassette.get(Cassette.key(model, contents, config))
+        except CassetteMiss:
+            self.misses += 1
+            if self.miss_text is None:
+                raise
+            return {"text": self.miss_text, "chunks": [self.miss_text]}
@@ -0,0 +1,249 @@
+# llm_gateway.py
+import os
+import asyncio
+import threading
+from fastapi import Request
+
+from prompt_cache import PromptCacheManager, is_stale_cache_error
+from quota import QUOTA, QuotaExceeded, estimate_tokens
+
+
+class ClientDisconnected(Exception):
+    """Raised when the HTTP client goes away while a reply is being generated."""
+
+
+class LLMGateway:
+    """
+    Shared async generation layer for MonicaAgent and the stage agents.
+
+    Every call goes through `client.aio.models.generate_content`, is admitted
+    by the QUOTA scheduler (per-model RPM/TPM), bounded by a process-wide
+    semaphore and wrapped in a per-call timeout, so one slow Gemini response
+    never blocks the event loop.
+    """
+
+    def __init__(self, client=None, max_concurrency: int = None, timeout: float = None, prompt_cache: PromptCacheManager = None):
+        self._client = client
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+        self._prompt_cache = prompt_cache
+        self._semaphore = None
+
+    @property
+    def client(self):
+        # Resolved on first call so importing the app never builds an SDK client
+        if self._client is None:
+            self._client = CLIENTS.get("text")
+        return self._client
+
+    @property
+    def prompt_cache(self) -> PromptCacheManager:
+        if self._prompt_cache is None:
+            self._prompt_cache = PromptCacheManager(self.client)
+        return self._prompt_cache
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created on first use so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _config(self, model: str, system_instruction: str, config: dict):
+        config = dict(config or {})
+        if system_instruction:
+            config.update(await self.prompt_cache.config_for(model, system_instruction))
+        return config or None
+
+    async def _generate(self, model: str, contents, config: dict, timeout: float, tokens: int) -> str:
+        await QUOTA.acquire(model, tokens)
+        async with self.semaphore:
+            response = await asyncio.wait_for(
+                self.client.aio.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=config,
+                ),
+                timeout=timeout or self.timeout,
+            )
+        return response.text or ""
+
+    async def generate(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None) -> str:
+        request_config = await self._config(model, system_instruction, config)
+        tokens = estimate_tokens(contents, system_instruction, config)
+        try:
+            return await self._generate(model, contents, request_config, timeout, tokens)
+        except Exception as e:
+            # Only a handle that expired or was evicted server-side is worth an
+            # inline retry; 429s, 5xx, timeouts and quota sheds propagate
+            if not self._stale_cache(request_config, e):
+                raise
+            self.prompt_cache.invalidate(model, system_instruction)
+            return await self._generate(model, contents, self._inline(config, system_instruction), timeout, tokens)
+
+    @staticmethod
+    def _stale_cache(request_config: dict, error: Exception) -> bool:
+        return (
+            bool(request_config) and "cached_content" in request_config
+            and not isinstance(error, (asyncio.TimeoutError, QuotaExceeded))
+            and is_stale_cache_error(error)
+        )
+
+    @staticmethod
+    def _inline(config: dict, system_instruction: str) -> dict:
+        return {**(config or {}), "system_instruction": system_instruction}
+
+    async def _open_stream(self, model: str, contents, config: dict, timeout: float):
+        return await asyncio.wait_for(
+            self.client.aio.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config,
+            ),
+            timeout=timeout,
+        )
+
+    async def stream(self, model: str, contents, system_instruction: str = None, config: dict = None, timeout: float = None):
+        """Yield text chunks from `generate_content_stream` as they arrive."""
+        timeout = timeout or self.timeout
+        request_config = await self._config(model, system_instruction, config)
+        await QUOTA.acquire(model, estimate_tokens(contents, system_instruction, config))
+        async with self.semaphore:
+            try:
+                stream = await self._open_stream(model, contents, request_config, timeout)
+            except Exception as e:
+                if not self._stale_cache(request_config, e):
+                    raise
+                # Nothing has been yielded yet, so the inline retry is invisible
+                self.prompt_cache.invalidate(model, system_instruction)
+                stream = await self._open_stream(model, contents, self._inline(config, system_instruction), timeout)
+
+            chunks = stream.__aiter__()
+            while True:
+                # Timeout applies per chunk so long replies are not cut off
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    break
+                if chunk.text:
+                    yield chunk.text
+
+
+def build_text_client():
+    """
+    Text client selected by MONICA_LLM_BACKEND:
+    genai (default), fake, record or replay (cassette at MONICA_LLM_CASSETTE).
+    """
+    backend = os.getenv("MONICA_LLM_BACKEND", "genai")
+    latency = float(os.getenv("MONICA_LLM_LATENCY_MS", "0")) / 1000
+
+    if backend == "fake":
+        from fake_genai import FakeGenaiClient
+        return FakeGenaiClient(latency=latency)
+
+    if backend == "replay":
+        from llm_cassette import ReplayClient
+        return ReplayClient(
+            os.getenv("MONICA_LLM_CASSETTE", "monica_cassette.json"),
+            latency=latency,
+            miss_text=os.getenv("MONICA_LLM_MISS_TEXT"),
+        )
+
+    from google import genai
+    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    if backend == "record":
+        from llm_cassette import RecordingClient
+        return RecordingClient(client, os.getenv("MONICA_LLM_CASSETTE", "monica_cassette.json"))
+    return client
+
+
+def build_live_client():
+    """
+    Live (voice) client selected by MONICA_LIVE_BACKEND: genai (default)
+    or fake, which answers every turn locally after MONICA_LIVE_CONNECT_MS.
+    """
+    if os.getenv("MONICA_LIVE_BACKEND", "genai") == "fake":
+        from fake_genai import FakeGenaiClient
+        return FakeGenaiClient(
+            latency=float(os.getenv("MONICA_LLM_LATENCY_MS", "0")) / 1000,
+            connect_latency=float(os.getenv("MONICA_LIVE_CONNECT_MS", "0")) / 1000,
+        )
+
+    from google import genai
+    return genai.Client(
+        api_key=os.getenv("GEMINI_API_KEY"),
+        http_options={"api_version": "v1alpha"},
+    )
+
+
+class ClientRegistry:
+    """
+    Process-wide SDK clients, built on first use and shared by MonicaAgent,
+    the stage agents and the live pool. Importing the app therefore costs
+    neither the google-genai import nor client construction; `warm()` can
+    pay for both off the request path once the worker is up.
+    """
+
+    def __init__(self, builders: dict):
+        self.builders = builders
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = self.builders[name]()
+        return client
+
+    def set(self, name: str, client):
+        """Install a ready-made client, e.g. a fake in tests and benchmarks."""
+        self._clients[name] = client
+
+    def built(self) -> list:
+        return sorted(self._clients)
+
+    async def warm(self, *names: str):
+        for name in names:
+            try:
+                await asyncio.to_thread(self.get, name)
+            except Exception as e:
+                print(f"Client warmup failed for {name}: {e}")
+
+
+CLIENTS = ClientRegistry({"text": build_text_client, "live": build_live_client})
+
+_gateway = None
+
+
+def get_gateway():
+    """
+    The process-wide ProviderRouter: Gemini through LLMGateway first, then
+    the fallback providers configured in LLM_PROVIDERS.
+    """
+    global _gateway
+    if _gateway is None:
+        from ai_services import build_router
+        _gateway = build_router()
+    return _gateway
+
+
+async def run_until_disconnect(request: Request, coro, poll_interval: float = 0.25):
+    """
+    Await `coro` but cancel it as soon as the HTTP client disconnects,
+    so abandoned turns stop holding a generation slot.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
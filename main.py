@@ -1,25 +1,63 @@
 # main.py
 import os
-from fastapi import FastAPI, Depends, HTTPException, WebSocket
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 
-from database import Base, engine, get_db
-from models import Item, MonicaSession
+from database import async_engine, create_schema, get_async_db, get_db
+from models import Item, MonicaSession, MonicaMessage
 from database_models import (
     ItemCreate,
     ItemResponse,
     MonicaChatRequest,
     MonicaSessionResponse,
+    MonicaMessageSync,
     MonicaReply,
 )
 from monica_service import MonicaAgent
+from llm_gateway import CLIENTS, ClientDisconnected, run_until_disconnect
+from session_state import SessionState
+from turn_guard import IdempotencyConflict
+from quota import QUOTA
+from voice_pipeline import VOICE_PIPES
 
 # -------------------------------------------------
 # App Setup
 # -------------------------------------------------
 
-app = FastAPI(title="Agent Monica 007")
+# Singleton Agent Brain (builds no SDK clients until first use)
+monica_agent = MonicaAgent()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema creation is an explicit step; set DB_CREATE_SCHEMA=0 when
+    # `python migrate.py` runs at deploy time instead
+    if os.getenv("DB_CREATE_SCHEMA", "1") == "1":
+        await create_schema()
+
+    # Import the SDK and build the text client after the worker is serving
+    warmup = None
+    if os.getenv("CLIENT_WARMUP", "1") == "1":
+        warmup = asyncio.create_task(CLIENTS.warm("text"))
+    if os.getenv("LIVE_POOL_WARM_ON_STARTUP", "0") == "1":
+        monica_agent.live_pool.start()
+
+    yield
+
+    if warmup is not None:
+        await warmup
+    await monica_agent.live_pool.close()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Agent Monica 007", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,11 +67,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create tables (safe with Postgres)
-Base.metadata.create_all(bind=engine)
-
-# Singleton Agent Brain
-monica_agent = MonicaAgent()
 
 # -------------------------------------------------
 # Monica Routes
@@ -42,33 +75,88 @@ monica_agent = MonicaAgent()
 
 
 
+def _idempotency_key(request: MonicaChatRequest, http_request: Request):
+    return request.idempotency_key or http_request.headers.get("Idempotency-Key")
+
+
 @app.post("/monica/chat", response_model=MonicaReply)
-async def monica_chat(
-    request: MonicaChatRequest, db: Session = Depends(get_db)
-):
-    session = (
-        db.query(MonicaSession)
-        .filter(MonicaSession.id == request.session_id)
-        .first()
-    )
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
+async def monica_chat(request: MonicaChatRequest, http_request: Request):
+    async def turn():
+        # Read under the session lock so the turn sees the previous turn's state;
+        # only a cold or expired session reads the DB
+        session = await monica_agent.states.get(request.session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return await monica_agent.get_reply(session, request.text)
 
     try:
-        reply = await monica_agent.get_reply(db, session, request.text)
+        # One turn per session at a time; a retried key gets the first result.
+        # Abandoned requests cancel their Gemini call instead of finishing it
+        reply = await run_until_disconnect(
+            http_request,
+            monica_agent.turns.run(
+                request.session_id, _idempotency_key(request, http_request), request.text, turn
+            ),
+        )
         return reply
+    except HTTPException:
+        raise
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client disconnected")
     except Exception as e:
         import traceback
         traceback.print_exc()   # <-- ADD THIS
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/monica/chat/stream")
+async def monica_chat_stream(request: MonicaChatRequest, http_request: Request):
+    """
+    Server-Sent Events variant of /monica/chat.
+    Emits `token` events while Gemini generates, then `stage`, `bridge`
+    and a final `done` event. A retried idempotency key replays the
+    original turn's events.
+    """
+    # Early 404 while a status can still be sent; turn() re-checks under the lock
+    if not await monica_agent.states.get(request.session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    async def turn(committed):
+        session = await monica_agent.states.get(request.session_id)
+        if not session:
+            yield "error", {"detail": "Session not found"}
+            return
+        # The key is remembered at commit, so a client lost before `done` gets a replay
+        async for item in monica_agent.stream_reply(session, request.text, on_commit=committed):
+            yield item
+
+    async def events():
+        try:
+            async for event, data in monica_agent.turns.stream(
+                request.session_id, _idempotency_key(request, http_request), request.text, turn
+            ):
+                yield _sse(event, data)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/monica/session", response_model=MonicaSessionResponse)
-def create_monica_session(db: Session = Depends(get_db)):
+async def create_monica_session(db: AsyncSession = Depends(get_async_db)):
     session = MonicaSession()
-    db.add(session)
-    db.commit()
-    db.refresh(session)
 
     # Seed first Monica message
     greeting = (
@@ -77,50 +165,94 @@ def create_monica_session(db: Session = Depends(get_db)):
         "your headquarter base, and your division."
     )
 
-    from models import MonicaMessage
-
-    msg = MonicaMessage(
-        session_id=session.id,
+    session.messages.append(MonicaMessage(
         role="assistant",
         content=greeting,
         stage="SETUP",
         persona="COACH",
-    )
-    db.add(msg)
-    db.commit()
+    ))
+    db.add(session)
+    # Session row and greeting go out in one commit
+    await db.commit()
+
+    # The first turn starts from cached state instead of reading it back
+    monica_agent.states.put(SessionState.from_row(session, {("SETUP", "assistant"): 1}))
 
     return session
 @app.get("/monica/session/{session_id}", response_model=MonicaSessionResponse)
-def get_monica_session(session_id: int, db: Session = Depends(get_db)):
-    session = db.query(MonicaSession).filter(MonicaSession.id == session_id).first()
+async def get_monica_session(session_id: int, db: AsyncSession = Depends(get_async_db)):
+    session = await db.scalar(
+        select(MonicaSession)
+        .options(selectinload(MonicaSession.messages))
+        .where(MonicaSession.id == session_id)
+    )
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     return session
 
 
+@app.get("/monica/session/{session_id}/messages", response_model=MonicaMessageSync)
+async def sync_monica_messages(
+    session_id: int, after_id: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Incremental transcript sync: only messages with id > `after_id`, plus a
+    lightweight stage/persona header. Pass `next_cursor` back as `after_id`.
+    """
+    header = (await db.execute(
+        select(MonicaSession.id, MonicaSession.current_stage, MonicaSession.current_persona)
+        .where(MonicaSession.id == session_id)
+    )).first()
+    if not header:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    limit = max(1, min(limit, 500))
+    messages = list(await db.scalars(
+        select(MonicaMessage)
+        .where(MonicaMessage.session_id == session_id, MonicaMessage.id > after_id)
+        .order_by(MonicaMessage.id)
+        .limit(limit + 1)
+    ))
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
+    return MonicaMessageSync(
+        session=header,
+        messages=messages,
+        next_cursor=messages[-1].id if messages else after_id,
+        has_more=has_more,
+    )
+
+
+@app.get("/monica/metrics")
+def monica_metrics():
+    return {
+        "fast_path": monica_agent.rules.snapshot(),
+        "voice": VOICE_PIPES.snapshot(),
+        "live_pool": monica_agent.live_pool.snapshot(),
+        "session_cache": monica_agent.states.snapshot(),
+        "turns": monica_agent.turns.snapshot(),
+        "providers": monica_agent.gateway.snapshot(),
+        "quota": QUOTA.snapshot(),
+        "routing": monica_agent.routing.snapshot(),
+        "response_cache": monica_agent.responses.snapshot(),
+    }
+
 
 @app.websocket("/ws/monica/{session_id}")
 async def monica_ws(websocket: WebSocket, session_id: int):
     """
     Dedicated WebSocket for Voice Mode.
-    Each socket gets its own DB session.
+    The socket borrows a DB connection only for each read or write.
     """
-    db_gen = get_db()
-    db = next(db_gen)
-
     try:
-        await monica_agent.connect_live_session(websocket, db, session_id)
+        await monica_agent.connect_live_session(websocket, session_id)
     except Exception as e:
         print("WS Error:", e)
         try:
             await websocket.close()
         except Exception:
             pass
-    finally:
-        try:
-            db.close()
-        except Exception:
-            pass
 
 
 # -------------------------------------------------
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Explicit schema step for deployments that start the app with
+DB_CREATE_SCHEMA=0, so workers do not touch DDL on every respawn:
+
+    python migrate.py && uvicorn main:app
+
+Creates missing tables, plus indexes added to existing tables since
+(models.LATE_INDEXES) with CREATE INDEX IF NOT EXISTS; safe to re-run.
+"""
+import asyncio
+
+from database import async_engine, create_schema
+
+
+async def main():
+    await create_schema()
+    await async_engine.dispose()
+    print("schema up to date")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+# model_routing.py
+"""
+Picks the model tier for each text turn.
+
+Routing is by stage (STAGE_POLICY). Most turns are short and formulaic
+(a chemist answering "10 strips a week", a SETUP confirmation) and are
+served by the fast tier; the stages that carry clinical judgement
+(INTELLIGENCE feedback, DOCTOR, OBJECTION) go to the quality tier, as
+does any turn prompt longer than ROUTING_LONG_PROMPT_CHARS (the system
+instruction is not counted: it is the same every turn and is served from
+the prompt cache). Every route also caps `max_output_tokens` for its
+stage, which bounds both latency and cost.
+
+Shadow evaluation: with ROUTING_SHADOW_RATE > 0 a sample of routed turns
+(prompt, system instruction and the chosen route) is appended to
+ROUTING_SHADOW_LOG. `python shadow_eval.py` later replays that log
+against both tiers offline, so the comparison costs nothing at serve time.
+Log lines are appended on a worker thread, off the event loop.
+"""
+import os
+import json
+import random
+import asyncio
+import datetime
+import threading
+
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "1") == "1"
+MODEL_FAST = os.getenv("MODEL_FAST", "gemini-2.5-flash-lite")
+MODEL_QUALITY = os.getenv("MODEL_QUALITY", "gemini-2.5-flash")
+# Thinking tokens count against max_output_tokens on 2.5 models
+QUALITY_THINKING_BUDGET = int(os.getenv("ROUTING_QUALITY_THINKING_BUDGET", "256"))
+LONG_PROMPT_CHARS = int(os.getenv("ROUTING_LONG_PROMPT_CHARS", "8000"))
+ROUTING_SHADOW_RATE = float(os.getenv("ROUTING_SHADOW_RATE", "0"))
+ROUTING_SHADOW_LOG = os.getenv("ROUTING_SHADOW_LOG", "routing_shadow.jsonl")
+
+# stage -> (tier, max_output_tokens)
+STAGE_POLICY = {
+    "SETUP": ("fast", 200),
+    "RCPA": ("fast", 160),
+    "INTELLIGENCE": ("quality", 400),
+    "DOCTOR": ("quality", 400),
+    "OBJECTION": ("quality", 400),
+    "KNOWLEDGE": ("fast", 200),
+    "END": ("fast", 200),
+}
+DEFAULT_POLICY = ("quality", 400)
+
+
+class ModelRoute:
+    __slots__ = ("tier", "model", "max_output_tokens", "reason")
+
+    def __init__(self, tier: str, model: str, max_output_tokens: int, reason: str):
+        self.tier = tier
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+        self.reason = reason
+
+    @property
+    def config(self) -> dict:
+        if not self.model.startswith("gemini-2.5"):
+            return {"max_output_tokens": self.max_output_tokens}
+        budget = QUALITY_THINKING_BUDGET if self.tier == "quality" else 0
+        return {
+            "max_output_tokens": self.max_output_tokens + budget,
+            "thinking_config": {"thinking_budget": budget},
+        }
+
+    def as_dict(self) -> dict:
+        return {
+            "tier": self.tier,
+            "model": self.model,
+            "max_output_tokens": self.max_output_tokens,
+            "reason": self.reason,
+        }
+
+
+class ModelRoutingPolicy:
+    def __init__(self, fast_model: str = None, quality_model: str = None, enabled: bool = None,
+                 shadow_rate: float = None, shadow_log: str = None):
+        self.models = {
+            "fast": fast_model or MODEL_FAST,
+            "quality": quality_model or MODEL_QUALITY,
+        }
+        self.enabled = ROUTING_ENABLED if enabled is None else enabled
+        self.shadow_rate = ROUTING_SHADOW_RATE if shadow_rate is None else shadow_rate
+        self.shadow_log = shadow_log or ROUTING_SHADOW_LOG
+        self.counts = {"fast": 0, "quality": 0}
+        self._shadow_lock = threading.Lock()
+        self._shadow_writes = set()
+
+    def _tier(self, stage: str, prompt_chars: int):
+        tier, cap = STAGE_POLICY.get(stage, DEFAULT_POLICY)
+        if not self.enabled:
+            return "quality", cap, "routing disabled"
+        if tier == "fast" and prompt_chars > LONG_PROMPT_CHARS:
+            return "quality", cap, "long prompt"
+        return tier, cap, f"{stage} stage"
+
+    def choose(self, stage: str, persona: str = None, prompt: str = "", system_instruction: str = "") -> ModelRoute:
+        """Route for one turn; `persona` and `system_instruction` are only recorded with shadow samples."""
+        tier, cap, reason = self._tier(stage, len(prompt or ""))
+        route = ModelRoute(tier, self.models[tier], cap, reason)
+        self.counts[tier] += 1
+
+        if self.shadow_rate and random.random() < self.shadow_rate:
+            self._record_shadow(stage, persona, prompt, system_instruction, route)
+        return route
+
+    def _record_shadow(self, stage: str, persona: str, prompt: str, system_instruction: str, route: ModelRoute):
+        line = json.dumps({
+            "ts": datetime.datetime.utcnow().isoformat(),
+            "stage": stage,
+            "persona": persona,
+            "prompt": prompt,
+            "system_instruction": system_instruction,
+            "route": route.as_dict(),
+        }) + "\n"
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._append_shadow(line)
+            return
+        # Held until done so the write is not garbage-collected mid-flight
+        task = loop.create_task(asyncio.to_thread(self._append_shadow, line))
+        self._shadow_writes.add(task)
+        task.add_done_callback(self._shadow_writes.discard)
+
+    def _append_shadow(self, line: str):
+        # One writer at a time, so concurrent turns never interleave lines
+        with self._shadow_lock:
+            try:
+                with open(self.shadow_log, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Routing shadow log failed: {e}")
+
+    def snapshot(self) -> dict:
+        return {"models": dict(self.models), "turns": dict(self.counts), "shadow_rate": self.shadow_rate}
+
+
+MODEL_ROUTING = ModelRoutingPolicy()
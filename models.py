@@ -35,7 +35,9 @@ class MonicaSession(Base):
         "MonicaMessage",
         back_populates="session",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        # Loaded only when a full transcript is asked for; the chat hot
+        # path uses aggregate queries instead
+        lazy="select"
     )
 
 
@@ -55,5 +57,14 @@ class MonicaMessage(Base):
     session = relationship("MonicaSession", back_populates="messages")
 
 
-# Optional explicit index (Postgres-friendly)
-Index("ix_monica_messages_session_id", MonicaMessage.session_id)
+# Covers per-stage message counts on the chat hot path
+message_stage_index = Index(
+    "ix_monica_messages_session_stage_role",
+    MonicaMessage.session_id,
+    MonicaMessage.stage,
+    MonicaMessage.role,
+)
+
+# Indexes added after their table first shipped. create_all skips them on
+# tables that already exist, so create_schema issues them explicitly.
+LATE_INDEXES = (message_stage_index,)
@@ -1,5 +1,5 @@
 from agents.setup_agent import SetupAgent
-from agents.rcpa_agent import RCPAgent
+from agents.rcpa_agent import RCPAAgent
 from agents.intelligence_agent import IntelligenceAgent
 from agents.doctor_agent import DoctorAgent
 from agents.objection_agent import ObjectionAgent
@@ -11,7 +11,7 @@ class MonicaOrchestrator:
     def __init__(self):
         self.agents = {
             "SETUP": SetupAgent(),
-            "RCPA": RCPAgent(),
+            "RCPA": RCPAAgent(),
             "INTELLIGENCE": IntelligenceAgent(),
             "DOCTOR": DoctorAgent(),
             "OBJECTION": ObjectionAgent(),
@@ -26,6 +26,10 @@ class MonicaOrchestrator:
         agent = self.agents[session.current_stage]
         result = await agent.handle(session, user_text)
 
+        # Agents are shared across sessions; their progress is kept per session
+        if result.state_delta:
+            session.state_delta = {**(session.state_delta or {}), **result.state_delta}
+
         if result.completed:
             session.current_stage = self.next_stage(session.current_stage)
 
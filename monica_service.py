@@ -1,12 +1,30 @@
 # monica_service.py
-import os
 import asyncio
 from fastapi import WebSocket
-from sqlalchemy.orm import Session
-from google import genai
 
-from models import MonicaSession, MonicaMessage
 from database_models import MonicaReply
+from llm_gateway import CLIENTS, LLMGateway, get_gateway
+from live_pool import LiveSessionManager, LiveSessionPool
+from model_routing import MODEL_ROUTING
+from response_cache import ResponseCache, context_digest
+from session_state import SessionState, SessionStateCache
+from turn_guard import TurnGuard
+from unit_of_work import TurnUnitOfWork
+from conversation_history import HistoryAssembler
+from turn_rules import FastPathRules
+from intents import INTENTS
+from knowledge_grader import KNOWLEDGE_REFERENCES, KnowledgeGrader
+from agents import doctor_agent, intelligence_agent, objection_agent, rcpa_agent, setup_agent
+from voice_pipeline import (
+    AudioPipe,
+    TranscriptBuffer,
+    VoiceActivityDetector,
+    VAD_ENABLED,
+    VOICE_PIPES,
+    VOICE_INPUT_SAMPLE_RATE,
+    VOICE_OUTPUT_SAMPLE_RATE,
+    decode_client_audio,
+)
 
 SYSTEM_PROMPT = """
 You are **Agent Monica 007**, an AI-powered sales coach.
@@ -62,6 +80,11 @@ STAGES:
 - Say goodbye.
 """
 
+FALLBACK_REPLY = "I'm having a bit of trouble connecting to my brain right now. Could you please try again?"
+
+# The model sometimes writes the tool name into its text reply
+ADVANCE_MARKER = "`advance_stage`"
+
 STAGE_ORDER = ["SETUP", "RCPA", "INTELLIGENCE", "DOCTOR", "OBJECTION", "KNOWLEDGE", "END"]
 
 PERSONA_BY_STAGE = {
@@ -74,17 +97,77 @@ PERSONA_BY_STAGE = {
     "END": "COACH",
 }
 
+# Scripted bridges into the later stages; the same for every trainee
+STAGE_OPENINGS = {
+    "INTELLIGENCE": (
+        "You collected the core information well. However, you missed one critical probe: "
+        "you did not ask about dosing frequency—whether the prescription is daily, weekly, "
+        "or monthly. This detail is essential because it shapes how you position Dexel to the doctor.\n\n"
+        "I will now be acting as Dr. Monica. "
+        "Before you begin your pitch, what questions will you ask to understand my treatment goals?"
+    ),
+    "OBJECTION": (
+        "Now let's test your objection handling skills. "
+        "I'm going to raise a common concern that doctors have.\n\n"
+        "Look, I appreciate the information about Dexel, but honestly, "
+        "my current Vitamin D brand is working well for my patients and they're familiar with it. "
+        "Why should I switch to something new?"
+    ),
+    "KNOWLEDGE": (
+        "Good work on handling that objection. Now let's assess your product knowledge. "
+        "I'm going to ask you three questions about the science behind Dexel.\n\n"
+        "First question: What is IL-6?"
+    ),
+}
 
-class MonicaAgent:
-    def __init__(self):
-        self.text_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-        self.live_client = genai.Client(
-            api_key=os.getenv("GEMINI_API_KEY"),
-            http_options={"api_version": "v1alpha"},
-        )
+STAGE_PLAYBOOKS = {
+    "SETUP": setup_agent.PROMPT,
+    "RCPA": rcpa_agent.PROMPT,
+    "INTELLIGENCE": intelligence_agent.PROMPT,
+    "DOCTOR": doctor_agent.PROMPT,
+    "OBJECTION": objection_agent.PROMPT,
+}
 
-        self.model_text = "gemini-2.5-flash"
+
+def _session_brief() -> str:
+    """
+    The system instruction shared by every text turn: the coaching rules,
+    each persona's playbook, the product science the trainee is assessed on
+    and the scripted stage openings. It does not vary by stage or session,
+    so it clears the cached-content minimum and is registered once per
+    model; the turn's stage and persona travel in the contents instead.
+    """
+    parts = [SYSTEM_PROMPT.strip(), "STAGE PLAYBOOKS:"]
+    parts += [f"[{stage}]\n{prompt.strip()}" for stage, prompt in STAGE_PLAYBOOKS.items()]
+    parts.append("PRODUCT SCIENCE (the KNOWLEDGE stage's reference answers):")
+    for ref in KNOWLEDGE_REFERENCES:
+        parts.append(ref["question"] + "\n" + "\n".join(f"- {kp['text']}" for kp in ref["key_points"]))
+    parts.append("SCRIPTED STAGE OPENINGS (already said to the trainee):")
+    parts += [f"[{stage}]\n{text}" for stage, text in STAGE_OPENINGS.items()]
+    parts.append("Each turn starts with its CURRENT STAGE and PERSONA; follow that stage only.")
+    return "\n\n".join(parts)
+
+
+SESSION_BRIEF = _session_brief()
+
+
+class MonicaAgent:
+    def __init__(self, gateway: LLMGateway = None):
+        self.gateway = gateway or get_gateway()
+        self.history = HistoryAssembler()
+        self.states = SessionStateCache()
+        self.turns = TurnGuard()
+        self.rules = FastPathRules()
+        # Text turns pick a fast or quality model per turn
+        self.routing = MODEL_ROUTING
+        self.responses = ResponseCache()
+        self.grader = KnowledgeGrader()
         self.model_live = "models/gemini-2.0-flash-exp"
+        self.live_pool = LiveSessionPool(lambda: self.live_client, self.model_live, self._live_config)
+
+    @property
+    def live_client(self):
+        return CLIENTS.get("live")
 
     # ---------- Helpers ----------
 
@@ -101,212 +184,390 @@ class MonicaAgent:
     def _system_for_stage(self, stage: str) -> str:
         return SYSTEM_PROMPT + f"\n\nCURRENT STAGE: {stage}\nPERSONA: {self._persona(stage)}"
 
-    def _store_message(self, db: Session, session: MonicaSession, role: str, content: str, stage: str = None, persona: str = None):
-        msg = MonicaMessage(
-            session_id=session.id,
-            role=role,
-            content=content,
-            stage=stage or session.current_stage,
-            persona=persona or session.current_persona,
-        )
-        db.add(msg)
-        db.commit()
+    def _stage_message_count(self, uow: TurnUnitOfWork, stage: str, role: str = None) -> int:
+        """Messages stored for `stage`, including ones buffered in this turn."""
+        return uow.session.count(stage, role)
 
     # ---------- SETUP EXTRACTION ----------
 
-    def _extract_setup_fields(self, session: MonicaSession, text: str, db: Session):
+    def _extract_setup_fields(self, uow: TurnUnitOfWork, text: str):
+        session = uow.session
+        fields = {}
         t = text.lower()
+        found = INTENTS.match("SETUP", text)
 
         # Extract name - look for common names or ask user to provide
         if not session.user_name:
             if "pavan" in t:
-                session.user_name = "Pavan"
+                fields["user_name"] = "Pavan"
             # Add more flexible name extraction
             words = text.split()
             for i, word in enumerate(words):
                 if word.lower() in ["name", "i'm", "im", "i am", "this is"] and i + 1 < len(words):
                     potential_name = words[i + 1].strip(",.!?")
                     if potential_name and len(potential_name) > 1:
-                        session.user_name = potential_name.capitalize()
+                        fields["user_name"] = potential_name.capitalize()
                         break
 
         # Extract role
         if not session.user_role:
-            if "bm" in t or "business manager" in t:
-                session.user_role = "BM"
-            elif "pl" in t or "product leader" in t:
-                session.user_role = "PL"
+            if "role_bm" in found:
+                fields["user_role"] = "BM"
+            elif "role_pl" in found:
+                fields["user_role"] = "PL"
 
         # Extract headquarter
         if not session.headquarter:
-            if "india" in t:
-                session.headquarter = "India"
+            if "hq_india" in found:
+                fields["headquarter"] = "India"
             elif "hq" in t or "headquarter" in t or "head office" in t:
                 # Try to extract location after "hq"
                 words = t.split()
                 for i, word in enumerate(words):
                     if word in ["hq", "headquarter"] and i + 1 < len(words):
-                        session.headquarter = words[i + 1].capitalize()
+                        fields["headquarter"] = words[i + 1].capitalize()
                         break
 
         # Extract division - FIXED to include "stimulus"
         if not session.division:
-            if "nucleus" in t:
-                session.division = "Nucleus"
-            elif "stimulus" in t:
-                session.division = "Stimulus"
+            if "division_nucleus" in found:
+                fields["division"] = "Nucleus"
+            elif "division_stimulus" in found:
+                fields["division"] = "Stimulus"
             elif "division" in t:
                 # Try to extract division name
                 words = t.split()
                 for i, word in enumerate(words):
                     if word == "division" and i > 0:
-                        session.division = words[i - 1].capitalize()
+                        fields["division"] = words[i - 1].capitalize()
                         break
 
-        db.commit()
+        if fields:
+            uow.update_session(**fields)
 
     # ---------- TEXT MODE ----------
 
-    async def get_reply(self, db: Session, session: MonicaSession, text: str) -> MonicaReply:
-        if session.current_stage == "SETUP":
-            self._extract_setup_fields(session, text, db)
-
-        # Special handling for KNOWLEDGE stage - ask questions sequentially
-        is_knowledge_stage = session.current_stage == "KNOWLEDGE"
-        if is_knowledge_stage:
-            knowledge_questions = [
-                "What is IL-6?",
-                "What is the relationship between IL-6 and pain?",
-                "Name two other inflammatory mediators besides IL-6."
-            ]
-            
-            # Count how many questions have been asked
-            knowledge_messages = [m for m in session.messages if m.stage == "KNOWLEDGE"]
-            questions_asked = sum(1 for m in knowledge_messages if m.role == "assistant" and any(q in m.content for q in knowledge_questions))
-            
-            # Store user's answer
-            self._store_message(db, session, "user", text)
-            
-            # Decide on reply
-            if questions_asked < len(knowledge_questions):
-                next_question = knowledge_questions[questions_asked]
-                reply_text = f"Thank you for your answer. Next question: {next_question}"
-                self._store_message(db, session, "assistant", reply_text)
-                # Keep current stage
-                return MonicaReply(reply=reply_text, advance_stage=False, state_delta={})
-            else:
-                # All questions answered, set flag to advance
-                reply_text = "Thank you for completing the knowledge assessment."
-                self._store_message(db, session, "assistant", reply_text)
-                # We will advance to END below
-                text = "SYSTEM_FORCE_ADVANCE" # fake text to pass through
-        else:
-            system = self._system_for_stage(session.current_stage)
-            prompt = f"{system}\n\nUser: {text}\n"
+    async def _prompt(self, uow: TurnUnitOfWork, text: str) -> str:
+        # SESSION_BRIEF travels separately so the gateway can cache it; the
+        # stage is the only per-turn part of the instructions
+        stage = uow.session.current_stage
+        header = f"CURRENT STAGE: {stage}\nPERSONA: {self._persona(stage)}"
+        return header + "\n\n" + await self.history.build(uow, text)
+
+    def _clean_reply(self, raw: str) -> str:
+        return raw.replace(ADVANCE_MARKER, "").strip()
+
+    @staticmethod
+    def _hold_marker_prefix(text: str):
+        """Split off the longest tail of `text` that could begin ADVANCE_MARKER: (safe, held)."""
+        for n in range(min(len(text), len(ADVANCE_MARKER) - 1), 0, -1):
+            if ADVANCE_MARKER.startswith(text[-n:]):
+                return text[:-n], text[-n:]
+        return text, ""
+
+    async def _reply_context(self, uow: TurnUnitOfWork) -> str:
+        """
+        The response cache's context key: a digest of the assistant line this
+        turn answers ("" at the stage's opening). Keying on the whole stage
+        exchange would only ever hit on a trainee's first turn per stage.
+        """
+        stage = uow.session.current_stage
+        if not self.responses.caches(stage):
+            return ""
+        history = await self.history.history(uow, uow.session.id)
+        turns = [t for t in history.turns if t.stage == stage]
+        # The stage's opening bridge is scripted; only the trainee's name varies
+        if turns and turns[0].role == "assistant":
+            turns = turns[1:]
+        asked = next((t for t in reversed(turns) if t.role == "assistant"), None)
+        return context_digest([asked.content]) if asked else ""
+
+    def _cached_reply(self, uow: TurnUnitOfWork, text: str, context: str):
+        """Serve a model turn from the response cache; buffers the reply on a hit."""
+        session = uow.session
+        reply_text = self.responses.lookup(session.current_stage, session.current_persona, text, context)
+        if reply_text is not None:
+            uow.add_message("assistant", reply_text)
+        return reply_text
+
+    def _remember_reply(self, session: SessionState, text: str, context: str, reply_text: str):
+        # Replies that address the trainee by name are not reusable
+        if session.user_name and session.user_name.lower() in reply_text.lower():
+            return
+        self.responses.store(session.current_stage, session.current_persona, text, reply_text, context)
 
-            try:
-                response = self.text_client.models.generate_content(
-                    model=self.model_text,
-                    contents=prompt,
-                )
-                reply_text = (response.text or "").replace("`advance_stage`", "").strip()
-            except Exception as e:
-                print(f"Gemini API Error: {e}")
-                reply_text = "I'm having a bit of trouble connecting to my brain right now. Could you please try again?"
+    async def _knowledge_turn(self, uow: TurnUnitOfWork, text: str):
+        """
+        KNOWLEDGE stage asks its questions sequentially without the model
+        and grades each answer in-process. Returns (reply_text, completed).
+        """
+        knowledge_questions = [ref["question"] for ref in KNOWLEDGE_REFERENCES]
+
+        # Every assistant message in this stage so far has asked a question
+        # (the OBJECTION bridge asks the first one)
+        questions_asked = self._stage_message_count(uow, "KNOWLEDGE", "assistant")
+
+        # Store user's answer
+        uow.add_message("user", text)
+        self._grade_answer(uow, questions_asked - 1, text)
+
+        if questions_asked < len(knowledge_questions):
+            next_question = knowledge_questions[questions_asked]
+            reply_text = f"Thank you for your answer. Next question: {next_question}"
+            uow.add_message("assistant", reply_text)
+            return reply_text, False
+
+        # All questions answered, advance to END
+        reply_text = "Thank you for completing the knowledge assessment."
+        uow.add_message("assistant", reply_text)
+        return reply_text, True
+
+    def _grade_answer(self, uow: TurnUnitOfWork, index: int, text: str):
+        """Score the answer to question `index` into metrics["knowledge"], written with this turn."""
+        if not 0 <= index < len(KNOWLEDGE_REFERENCES):
+            return
+        metrics = uow.session.metrics or {}
+        questions = {
+            **metrics.get("knowledge", {}).get("questions", {}),
+            f"q{index + 1}": self.grader.grade(index, text),
+        }
+        uow.update_session(metrics={
+            **metrics,
+            "knowledge": {"questions": questions, "score": self.grader.summary(questions)},
+        })
 
-            self._store_message(db, session, "user", text)
-            
-        r_text = locals().get('raw_reply', '')
-        advance = bool(self._should_advance(session, text)) or ("advance_stage" in r_text)
-        
-        # Manual override for KNOWLEDGE completion
-        if is_knowledge_stage and text == "SYSTEM_FORCE_ADVANCE":
-            advance = True
+    async def _pre_dispatch(self, uow: TurnUnitOfWork, text: str):
+        """
+        Buffer the user's message and settle everything that does not need
+        the model: the stage-exit decision and, for scripted turns, the
+        reply itself. Returns (advance, scripted_reply or None).
+        """
+        stage = uow.session.current_stage
 
-        if not is_knowledge_stage: # Normal text mode
-            self._store_message(db, session, "assistant", reply_text)
+        if stage == "KNOWLEDGE":
+            reply_text, advance = await self._knowledge_turn(uow, text)
+            self.rules.record(stage, fast_path=True)
+            return advance, reply_text
+
+        uow.add_message("user", text)
+        advance = bool(await self._should_advance(uow, text))
+
+        reply_text = self.rules.resolve(stage, advance)
+        if reply_text is not None:
+            uow.add_message("assistant", reply_text)
+        self.rules.record(stage, fast_path=reply_text is not None)
+        return advance, reply_text
+
+    def _bridge_content(self, session: SessionState, old_stage: str, new_stage: str) -> str:
+        # SETUP → RCPA bridge
+        if old_stage == "SETUP":
+            return (
+                f"Thank you, {session.user_name}. Your session is now configured for the "
+                f"{session.division} division and the product Dexel & Dexel ND.\n\n"
+                "You are now entering a Retail Chemist RCPA call. I will act as the chemist. "
+                "Begin by asking me about the doctor's prescribing behaviour."
+            )
 
-        if advance:
-            old_stage = session.current_stage
-            new_stage = self._next_stage(old_stage)
-
-            session.current_stage = new_stage
-            session.current_persona = self._persona(new_stage)
-            db.commit()
-
-            bridge_content = ""
-
-            # SETUP → RCPA bridge
-            if old_stage == "SETUP":
-                bridge_content = (
-                    f"Thank you, {session.user_name}. Your session is now configured for the "
-                    f"{session.division} division and the product Dexel & Dexel ND.\n\n"
-                    "You are now entering a Retail Chemist RCPA call. I will act as the chemist. "
-                    "Begin by asking me about the doctor's prescribing behaviour."
-                )
+        # RCPA → INTELLIGENCE → DOCTOR → OBJECTION → KNOWLEDGE
+        if new_stage in STAGE_OPENINGS:
+            return STAGE_OPENINGS[new_stage]
+
+        # KNOWLEDGE → END
+        if new_stage == "END":
+            knowledge = (session.metrics or {}).get("knowledge")
+            knowledge_score = f" ({knowledge['score']:.0%})" if knowledge else ""
+            return (
+                "Excellent! You've completed all stages of the Agent Monica 007 training session.\n\n"
+                "Your performance summary:\n"
+                "✅ RCPA Intelligence Gathering\n"
+                "✅ Doctor Probing and Pitching\n"
+                "✅ Objection Handling\n"
+                f"✅ Product Knowledge Assessment{knowledge_score}\n\n"
+                "Your trainer will receive a detailed assessment of your session. "
+                "Thank you for practicing with me today."
+            )
 
-            # RCPA → INTELLIGENCE → DOCTOR
-            elif new_stage == "INTELLIGENCE":
-                bridge_content = (
-                    "You collected the core information well. However, you missed one critical probe: "
-                    "you did not ask about dosing frequency—whether the prescription is daily, weekly, "
-                    "or monthly. This detail is essential because it shapes how you position Dexel to the doctor.\n\n"
-                    "I will now be acting as Dr. Monica. "
-                    "Before you begin your pitch, what questions will you ask to understand my treatment goals?"
-                )
-                session.current_stage = "DOCTOR"
-                session.current_persona = "DOCTOR"
-                db.commit()
-
-            # DOCTOR → OBJECTION
-            elif new_stage == "OBJECTION":
-                bridge_content = (
-                    "Now let's test your objection handling skills. "
-                    "I'm going to raise a common concern that doctors have.\n\n"
-                    "Look, I appreciate the information about Dexel, but honestly, "
-                    "my current Vitamin D brand is working well for my patients and they're familiar with it. "
-                    "Why should I switch to something new?"
-                )
+        return ""
 
-            # OBJECTION → KNOWLEDGE
-            elif new_stage == "KNOWLEDGE":
-                bridge_content = (
-                    "Good work on handling that objection. Now let's assess your product knowledge. "
-                    "I'm going to ask you three questions about the science behind Dexel.\n\n"
-                    "First question: What is IL-6?"
-                )
+    def _advance(self, uow: TurnUnitOfWork) -> str:
+        """Move the session to its next stage and return the bridge text, if any."""
+        session = uow.session
+        old_stage = session.current_stage
+        new_stage = self._next_stage(old_stage)
+
+        bridge_content = self._bridge_content(session, old_stage, new_stage)
+
+        # INTELLIGENCE is delivered inside the bridge, go straight to DOCTOR
+        if new_stage == "INTELLIGENCE":
+            new_stage = "DOCTOR"
+
+        uow.update_session(
+            current_stage=new_stage,
+            current_persona=self._persona(new_stage),
+        )
+
+        if bridge_content:
+            uow.add_message("assistant", bridge_content)
+
+        return bridge_content
+
+    async def get_reply(self, session: SessionState, text: str) -> MonicaReply:
+        uow = TurnUnitOfWork(session, cache=self.states)
+        try:
+            return await self._reply(uow, text)
+        except BaseException:
+            # Cancelled or failed before the commit (e.g. the client went away)
+            uow.abort()
+            raise
+
+    async def _reply(self, uow: TurnUnitOfWork, text: str) -> MonicaReply:
+        session = uow.session
+
+        if session.current_stage == "SETUP":
+            self._extract_setup_fields(uow, text)
+
+        advance, reply_text = await self._pre_dispatch(uow, text)
+
+        context = ""
+        if reply_text is None:
+            context = await self._reply_context(uow)
+            reply_text = self._cached_reply(uow, text, context)
 
-            # KNOWLEDGE → END
-            elif new_stage == "END":
-                bridge_content = (
-                    "Excellent! You've completed all stages of the Agent Monica 007 training session.\n\n"
-                    "Your performance summary:\n"
-                    "✅ RCPA Intelligence Gathering\n"
-                    "✅ Doctor Probing and Pitching\n"
-                    "✅ Objection Handling\n"
-                    "✅ Product Knowledge Assessment\n\n"
-                    "Your trainer will receive a detailed assessment of your session. "
-                    "Thank you for practicing with me today."
+        if reply_text is None:
+            try:
+                contents = await self._prompt(uow, text)
+                system = SESSION_BRIEF
+                route = self.routing.choose(session.current_stage, session.current_persona, contents, system)
+                response_text = await self.gateway.generate(
+                    model=route.model,
+                    contents=contents,
+                    system_instruction=system,
+                    config=route.config,
                 )
+                reply_text = self._clean_reply(response_text)
+                self._remember_reply(session, text, context, reply_text)
+            except Exception as e:
+                print(f"Gemini API Error: {e}")
+                reply_text = FALLBACK_REPLY
 
+            uow.add_message("assistant", reply_text)
+
+        if advance:
+            bridge_content = self._advance(uow)
             if bridge_content:
                 reply_text += "\n\n" + bridge_content
-                self._store_message(db, session, "assistant", bridge_content)
+
+        current_stage = session.current_stage
+        current_persona = session.current_persona
+
+        rows = await uow.commit()
+        self.history.record(session.id, rows)
 
         return MonicaReply(
             reply=reply_text,
             advance_stage=advance,
             state_delta={},
+            current_stage=current_stage,
+            current_persona=current_persona,
         )
 
+    async def stream_reply(self, session: SessionState, text: str, on_commit=None):
+        """
+        Streaming variant of get_reply. Yields (event, data) pairs:
+        `token` chunks as they arrive, then `stage` and `bridge` when the
+        stage advances, and a final `done`. The turn is persisted once,
+        after the model stream has finished; `on_commit()` is called right
+        after that commit, before `done`.
+        """
+        uow = TurnUnitOfWork(session, cache=self.states)
+        try:
+            async for event in self._stream(uow, text, on_commit):
+                yield event
+        except BaseException:
+            # Includes GeneratorExit when the SSE client disconnects mid-stream
+            uow.abort()
+            raise
+
+    async def _stream(self, uow: TurnUnitOfWork, text: str, on_commit=None):
+        session = uow.session
+
+        if session.current_stage == "SETUP":
+            self._extract_setup_fields(uow, text)
+
+        advance, reply_text = await self._pre_dispatch(uow, text)
+
+        context = ""
+        if reply_text is None:
+            context = await self._reply_context(uow)
+            reply_text = self._cached_reply(uow, text, context)
+
+        if reply_text is not None:
+            yield "token", {"text": reply_text}
+        else:
+            chunks = []
+            # Unsent text that may be the start of a marker split across chunks
+            held = ""
+            failed = False
+            try:
+                contents = await self._prompt(uow, text)
+                system = SESSION_BRIEF
+                route = self.routing.choose(session.current_stage, session.current_persona, contents, system)
+                async for chunk in self.gateway.stream(
+                    model=route.model,
+                    contents=contents,
+                    system_instruction=system,
+                    config=route.config,
+                ):
+                    chunks.append(chunk)
+                    visible, held = self._hold_marker_prefix((held + chunk).replace(ADVANCE_MARKER, ""))
+                    if visible:
+                        yield "token", {"text": visible}
+            except Exception as e:
+                print(f"Gemini API Error: {e}")
+                failed = True
+                if not chunks:
+                    chunks.append(FALLBACK_REPLY)
+                    yield "token", {"text": FALLBACK_REPLY}
+            if held:
+                yield "token", {"text": held}
+
+            reply_text = self._clean_reply("".join(chunks))
+            if not failed:
+                self._remember_reply(session, text, context, reply_text)
+            uow.add_message("assistant", reply_text)
+
+        if advance:
+            bridge_content = self._advance(uow)
+            yield "stage", {
+                "stage": session.current_stage,
+                "persona": session.current_persona,
+            }
+            if bridge_content:
+                reply_text += "\n\n" + bridge_content
+                yield "bridge", {"text": bridge_content}
+
+        current_stage = session.current_stage
+        current_persona = session.current_persona
+
+        rows = await uow.commit()
+        self.history.record(session.id, rows)
+        if on_commit:
+            on_commit()
+
+        yield "done", {
+            "reply": reply_text,
+            "advance_stage": advance,
+            "current_stage": current_stage,
+            "current_persona": current_persona,
+        }
 
-    def _should_advance(self, session: MonicaSession, text: str) -> bool:
+    async def _should_advance(self, uow: TurnUnitOfWork, text: str) -> bool:
         """
         Determine if the current stage should advance based on session state
         and conversation history.
         """
+        session = uow.session
         stage = session.current_stage
-        t = text.lower()
 
         if stage == "SETUP":
             details_complete = (
@@ -319,47 +580,22 @@ class MonicaAgent:
                 return False
                 
             # If details are complete, check if current text is a confirmation or readiness
-            confirmations = ["yes", "correct", "yeah", "that's right", "yup", "ok", "proceed", "sure", "start", "ready", "begin"]
-            return any(c in t for c in confirmations)
+            return bool(INTENTS.match("SETUP", text) & {"confirm", "ready"})
 
         if stage == "RCPA":
             # Check if user has signaled end of RCPA conversation
-            end_signals = [
-                "thank you",
-                "thanks",
-                "that's all",
-                "that's it",
-                "done",
-                "no more questions",
-                "that's all i needed",
-                "move to doctor",
-                "pitch to the doctor",
-                "call the doctor"
-            ]
-            return any(signal in t for signal in end_signals)
+            return INTENTS.has("RCPA", text, "end")
 
         if stage == "DOCTOR":
-            # Advance when user thanks doctor or signals end of pitch
-            end_signals = [
-                "thank you doctor",
-                "thanks doctor",
-                "that's all",
-                "appreciate your time",
-                "thank you for your time",
-                "that covers everything"
-            ]
-            # Check if we have some interaction in messages
-            doctor_stage_messages = [m for m in session.messages if m.stage == "DOCTOR"]
-            has_enough_interaction = len(doctor_stage_messages) >= 3 # at least 1-2 exchanges
-            
-            return (any(signal in t for signal in end_signals) and 
-                    has_enough_interaction)
+            # Advance when user thanks doctor or signals end of pitch,
+            # after at least 1-2 exchanges
+            return (INTENTS.has("DOCTOR", text, "close") and
+                    self._stage_message_count(uow, "DOCTOR") >= 3)
 
         if stage == "OBJECTION":
             # Advance after user has responded to objection
-            objection_messages = [m for m in session.messages if m.stage == "OBJECTION"]
             # Need at least 2 messages: Monica's objection + user's response
-            if len(objection_messages) >= 2: 
+            if self._stage_message_count(uow, "OBJECTION") >= 2:
                 return True
             return False
 
@@ -378,6 +614,10 @@ class MonicaAgent:
                 "voice_config": {"prebuilt_voice_config": {"voice_name": "Puck"}}
             },
             "system_instruction": self._system_for_stage(stage),
+            "input_audio_transcription": {},
+            "output_audio_transcription": {},
+            # Our VAD marks the turns, so the server's own detection is off
+            **({"realtime_input_config": {"automatic_activity_detection": {"disabled": True}}} if VAD_ENABLED else {}),
             "tools": [
                 {
                     "function_declarations": [
@@ -391,49 +631,168 @@ class MonicaAgent:
             ],
         }
 
-    async def connect_live_session(self, ws: WebSocket, db: Session, session_id: int):
+    async def _flush_transcript(self, uow: TurnUnitOfWork, transcript: TranscriptBuffer):
+        for role, stage, text in transcript.take():
+            uow.add_message(role, text, stage=stage, persona=self._persona(stage))
+        rows = list(uow.messages)
+        await uow.commit_async()
+        self.history.record(uow.session_id, rows)
+
+    def _prewarm_after(self, stage: str):
+        next_stage = self._next_stage(stage)
+        if next_stage != stage:
+            self.live_pool.prewarm(next_stage)
+
+    def _live_handoff(self, stage: str) -> str:
+        return (
+            f"The trainee has just moved on to the {stage} stage. "
+            f"Continue the session as the {self._persona(stage)}: "
+            "briefly open this stage in character, then wait for the trainee."
+        )
+
+    async def connect_live_session(self, ws: WebSocket, session_id: int):
         await ws.accept()
 
-        monica = db.query(MonicaSession).filter(MonicaSession.id == session_id).first()
+        # The socket holds no DB connection; reads and writes borrow one briefly
+        monica = await self.states.get(session_id)
         if not monica:
             await ws.close(code=4004)
             return
 
-        config = self._live_config(monica.current_stage)
+        # Stage changes are written behind so the audio path never waits on the DB
+        uow = TurnUnitOfWork(monica, write_behind=True, cache=self.states)
 
-        async with self.live_client.aio.live.connect(
-            model=self.model_live, config=config
-        ) as live:
+        # A pre-warmed session skips the live handshake on the critical path
+        live = LiveSessionManager(self.live_pool, await self.live_pool.acquire(monica.current_stage))
+        self._prewarm_after(monica.current_stage)
+
+        # Both directions go through bounded, framed pipes so a slow peer
+        # costs dropped audio rather than unbounded memory; silence is gated
+        # server-side so only speech reaches the live API
+        upstream = AudioPipe(
+            "upstream",
+            VOICE_INPUT_SAMPLE_RATE,
+            vad=VoiceActivityDetector() if VAD_ENABLED else None,
+        )
+        downstream = AudioPipe("downstream", VOICE_OUTPUT_SAMPLE_RATE)
+        pipe_key = f"{session_id}:{id(ws)}"
+        VOICE_PIPES.register(pipe_key, upstream, downstream)
+        # Transcripts are persisted per turn through the write-behind uow
+        transcript = TranscriptBuffer()
+
+        try:
 
             async def recv_client():
                 try:
                     while True:
                         msg = await ws.receive()
-                        if "bytes" in msg:
-                            await live.send(
-                                input={"data": msg["bytes"], "mime_type": "audio/pcm"},
-                                end_of_turn=False,
-                            )
+                        if msg["type"] == "websocket.disconnect":
+                            return
+                        audio = decode_client_audio(msg)
+                        if audio:
+                            upstream.push(audio)
                 except Exception:
                     return
+                finally:
+                    upstream.flush()
+                    upstream.close()
+
+            async def send_live():
+                # The live session the current spoken turn was opened on
+                speaking = None
+                while (item := await upstream.next_batch()) is not None:
+                    batch, end_of_turn = item
+                    session = live.session
+                    if VAD_ENABLED and speaking is not session:
+                        await session.send_realtime_input(activity_start={})
+                        speaking = session
+                    await session.send_realtime_input(
+                        audio={"data": batch, "mime_type": f"audio/pcm;rate={VOICE_INPUT_SAMPLE_RATE}"},
+                    )
+                    if end_of_turn:
+                        # Without server-side detection the turn only ends when we say so
+                        if VAD_ENABLED:
+                            await session.send_realtime_input(activity_end={})
+                            speaking = None
+                        else:
+                            await session.send_realtime_input(audio_stream_end=True)
+
+            async def handle_tool_call(tool_call):
+                # The model waits for these responses, so they go to the session
+                # that asked, before any cut-over at the end of its turn
+                responses = []
+                for call in tool_call.function_calls or []:
+                    if call.name == "advance_stage":
+                        new_stage = self._next_stage(monica.current_stage)
+                        uow.update_session(
+                            current_stage=new_stage,
+                            current_persona=self._persona(new_stage),
+                        )
+                        await uow.commit_async()
+
+                        live.prepare(new_stage)
+                        self._prewarm_after(new_stage)
+                        await ws.send_json({"type": "stage_update", "stage": new_stage})
+                        result = {"stage": new_stage}
+                    else:
+                        result = {"error": f"unknown tool {call.name}"}
+                    responses.append({"id": call.id, "name": call.name, "response": result})
+                if responses:
+                    await live.session.send_tool_response(function_responses=responses)
+
+            async def recv_live():
+                try:
+                    # receive() ends after every model turn, so keep re-entering it
+                    while True:
+                        received = False
+                        async for resp in live.session.receive():
+                            received = True
+                            if resp.data:
+                                downstream.push(resp.data)
+
+                            if resp.tool_call:
+                                await handle_tool_call(resp.tool_call)
+
+                            content = resp.server_content
+                            if not content:
+                                continue
+                            # Tagged with the stage of the persona actually speaking
+                            if content.input_transcription:
+                                transcript.add("user", content.input_transcription.text, live.stage)
+                            if content.output_transcription:
+                                transcript.add("assistant", content.output_transcription.text, live.stage)
+
+                            if content.turn_complete:
+                                downstream.flush()
+                                await self._flush_transcript(uow, transcript)
+                                # Swap personas between turns so no audio is cut off
+                                if live.next_stage and await live.cut_over(self._live_handoff(live.next_stage)):
+                                    break
+                        if not received:
+                            return
+                finally:
+                    downstream.flush()
+                    downstream.close()
 
             async def send_client():
-                async for resp in live.receive():
-                    if resp.data:
-                        await ws.send_bytes(resp.data)
-
-                    if resp.server_content:
-                        turn = resp.server_content.model_turn
-                        if not turn:
-                            continue
-
-                        for part in turn.parts:
-                            if part.function_call and part.function_call.name == "advance_stage":
-                                new_stage = self._next_stage(monica.current_stage)
-                                monica.current_stage = new_stage
-                                monica.current_persona = self._persona(new_stage)
-                                db.commit()
-
-                                await ws.send_json({"type": "stage_update", "stage": new_stage})
-
-            await asyncio.gather(recv_client(), send_client())
+                while (item := await downstream.next_batch()) is not None:
+                    await ws.send_bytes(item[0])
+
+            tasks = [
+                asyncio.create_task(recv_client()),
+                asyncio.create_task(send_live()),
+                asyncio.create_task(recv_live()),
+                asyncio.create_task(send_client()),
+            ]
+            try:
+                # Either peer going away ends the session
+                await asyncio.wait(tasks[::2], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                VOICE_PIPES.unregister(pipe_key)
+                await self._flush_transcript(uow, transcript)
+                await uow.drain()
+        finally:
+            await live.close()
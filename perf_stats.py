@@ -0,0 +1,36 @@
+# perf_stats.py
+"""Small helpers shared by the benchmark and load-generator scripts."""
+import math
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    if low == high:
+        return ordered[low]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values) -> dict:
+    values = list(values)
+    return {
+        "n": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def print_table(title: str, rows: dict, unit: str = "ms", scale: float = 1000.0):
+    """Print one summary row per series; values are scaled for display."""
+    print(f"\n{title}")
+    print(f"  {'':<22}{'n':>6}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  ({unit})")
+    for name, values in rows.items():
+        s = summarize(values)
+        cells = "".join(f"{s[k] * scale:>10.2f}" for k in ("mean", "p50", "p95", "p99", "max"))
+        print(f"  {name:<22}{s['n']:>6}{cells}")
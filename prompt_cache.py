@@ -0,0 +1,126 @@
+# prompt_cache.py
+import os
+import time
+import asyncio
+import hashlib
+
+# Smallest prompt the cached-content API accepts, per model family; below it
+# caches.create is refused, so the request is not worth a round trip
+DEFAULT_MIN_CACHE_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+MIN_CACHE_TOKENS = {
+    "gemini-2.5-pro": 4096,
+}
+
+
+def min_cache_tokens(model: str) -> int:
+    for prefix, tokens in MIN_CACHE_TOKENS.items():
+        if model.startswith(prefix):
+            return tokens
+    return DEFAULT_MIN_CACHE_TOKENS
+
+
+def is_stale_cache_error(error: BaseException) -> bool:
+    """
+    True when a call failed because its `cached_content` handle is gone
+    (expired, deleted or evicted server-side), the one failure that an
+    inline retry fixes. Rate limits, 5xx and timeouts are not.
+    """
+    code = getattr(error, "code", None)
+    message = str(getattr(error, "message", None) or error).lower()
+    return code in (400, 403, 404) and "cached" in message
+
+
+class CachedPrompt:
+    __slots__ = ("name", "expires_at")
+
+    def __init__(self, name: str, expires_at: float):
+        self.name = name
+        self.expires_at = expires_at
+
+
+class PromptCacheManager:
+    """
+    Registers static system prompts with Gemini's cached-content API once
+    per (model, prompt) and hands out the cache name for every later call,
+    across all sessions.
+
+    Handles are extended before their TTL runs out. If caching is disabled
+    or the API refuses (e.g. the prompt is under the model's minimum
+    cacheable size), callers get the prompt inline and creation is not
+    retried until `retry_after` has passed. Prompts that are clearly under
+    that size (~4 characters per token) are never sent to `caches.create`.
+    """
+
+    def __init__(self, client, ttl_seconds: int = None, refresh_margin: int = None, retry_after: int = None, enabled: bool = None):
+        self.client = client
+        self.ttl_seconds = ttl_seconds or int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+        self.refresh_margin = refresh_margin or int(os.getenv("PROMPT_CACHE_REFRESH_MARGIN", "300"))
+        self.retry_after = retry_after or int(os.getenv("PROMPT_CACHE_RETRY_AFTER", "600"))
+        if enabled is None:
+            enabled = os.getenv("PROMPT_CACHE_ENABLED", "1") == "1"
+        self.enabled = enabled
+
+        self._entries = {}
+        self._failed_until = {}
+        self._locks = {}
+
+    def _key(self, model: str, system_instruction: str):
+        return model, hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()
+
+    def _fresh(self, entry: CachedPrompt, now: float) -> bool:
+        return entry is not None and now < entry.expires_at - self.refresh_margin
+
+    async def config_for(self, model: str, system_instruction: str) -> dict:
+        """Generation config carrying the system prompt, cached when possible."""
+        if self.enabled:
+            name = await self._handle(model, system_instruction)
+            if name:
+                return {"cached_content": name}
+        return {"system_instruction": system_instruction}
+
+    def invalidate(self, model: str, system_instruction: str):
+        self._entries.pop(self._key(model, system_instruction), None)
+
+    def cacheable(self, model: str, system_instruction: str) -> bool:
+        return len(system_instruction) // 4 >= min_cache_tokens(model)
+
+    async def _handle(self, model: str, system_instruction: str):
+        if not self.cacheable(model, system_instruction):
+            return None
+        key = self._key(model, system_instruction)
+        entry = self._entries.get(key)
+        if self._fresh(entry, time.monotonic()):
+            return entry.name
+        if self._failed_until.get(key, 0) > time.monotonic():
+            return None
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another caller may have refreshed it while we waited
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if self._fresh(entry, now):
+                return entry.name
+
+            ttl = f"{self.ttl_seconds}s"
+            try:
+                if entry is not None and now < entry.expires_at:
+                    await self.client.aio.caches.update(name=entry.name, config={"ttl": ttl})
+                else:
+                    cached = await self.client.aio.caches.create(
+                        model=model,
+                        config={
+                            "system_instruction": system_instruction,
+                            "ttl": ttl,
+                            "display_name": f"monica-{key[1][:12]}",
+                        },
+                    )
+                    entry = CachedPrompt(cached.name, 0)
+                    self._entries[key] = entry
+                entry.expires_at = time.monotonic() + self.ttl_seconds
+                return entry.name
+            except Exception as e:
+                print(f"Prompt cache unavailable for {model}: {e}")
+                self._entries.pop(key, None)
+                self._failed_until[key] = time.monotonic() + self.retry_after
+                return None
@@ -0,0 +1,263 @@
+# quota.py
+"""
+Process-wide admission control for Gemini calls.
+
+Every `generate_content(_stream)` in LLMGateway and every `live.connect`
+in the live pool first draws from two token buckets for its model:
+requests per minute and (estimated) tokens per minute. A call that does
+not fit waits in a per-model queue instead of drawing a 429. The queue is
+ordered by priority class, live voice ahead of interactive text ahead of
+batch work, and FIFO within a class.
+
+Load is shed predictably: a call whose expected wait already exceeds its
+class's budget is refused on arrival, and one that has waited past the
+budget is dropped from the queue. Both raise QuotaExceeded.
+
+Limits come from QUOTA_LIMITS, a JSON object such as
+`{"gemini-2.5-flash": {"rpm": 1000, "tpm": 1000000}}`; other models use
+QUOTA_DEFAULT_RPM / QUOTA_DEFAULT_TPM.
+"""
+import os
+import json
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from perf_stats import percentile
+
+QUOTA_ENABLED = os.getenv("QUOTA_ENABLED", "1") == "1"
+QUOTA_DEFAULT_RPM = float(os.getenv("QUOTA_DEFAULT_RPM", "1000"))
+QUOTA_DEFAULT_TPM = float(os.getenv("QUOTA_DEFAULT_TPM", "1000000"))
+QUOTA_DEFAULT_OUTPUT_TOKENS = int(os.getenv("QUOTA_DEFAULT_OUTPUT_TOKENS", "512"))
+
+PRIORITIES = ("live", "interactive", "batch")
+# Longest a call of each class may queue before it is shed
+MAX_WAIT_SECONDS = {
+    "live": float(os.getenv("QUOTA_MAX_WAIT_LIVE", "2")),
+    "interactive": float(os.getenv("QUOTA_MAX_WAIT_INTERACTIVE", "10")),
+    "batch": float(os.getenv("QUOTA_MAX_WAIT_BATCH", "120")),
+}
+
+_priority = contextvars.ContextVar("quota_priority", default="interactive")
+
+
+class QuotaExceeded(Exception):
+    """A call was shed instead of queued past its priority's wait budget."""
+
+
+@contextmanager
+def priority(name: str):
+    """Run the calls made inside the block (and tasks they spawn) at `name` priority."""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority {name!r}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(contents, system_instruction: str = None, config: dict = None) -> int:
+    """Rough prompt + completion size: ~4 characters per token plus the output cap."""
+    prompt = len(str(contents or "")) + len(system_instruction or "")
+    output = (config or {}).get("max_output_tokens") or QUOTA_DEFAULT_OUTPUT_TOKENS
+    return prompt // 4 + output
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute / 60` per second, up to one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + min(amount, self.capacity))
+
+
+class _Waiter:
+    def __init__(self, tokens: int, priority: str):
+        self.tokens = tokens
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class _ModelLane:
+    """Buckets and the priority queue for one model."""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.queue = []  # (priority rank, sequence, waiter)
+        self.wakeup = asyncio.Event()
+        self.pump = None
+
+    def wait_for(self, tokens: int) -> float:
+        return max(self.requests.wait_for(1), self.tokens.wait_for(tokens))
+
+    def take(self, tokens: int):
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+    def refund(self, tokens: int):
+        self.requests.give_back(1)
+        self.tokens.give_back(tokens)
+        self.wakeup.set()
+
+    def backlog(self, rank: int) -> tuple:
+        """Requests and tokens queued at `rank` or ahead of it."""
+        ahead = [w for r, _, w in self.queue if r <= rank and not w.future.done()]
+        return len(ahead), sum(w.tokens for w in ahead)
+
+
+class QuotaScheduler:
+    def __init__(self, limits: dict = None, enabled: bool = None):
+        if limits is None:
+            limits = json.loads(os.getenv("QUOTA_LIMITS") or "{}")
+        self.limits = limits
+        self.enabled = QUOTA_ENABLED if enabled is None else enabled
+        self._lanes = {}
+        self._sequence = itertools.count()
+
+        self.admitted = defaultdict(int)
+        self.shed = defaultdict(int)
+        self.queue_times = defaultdict(lambda: deque(maxlen=1000))
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            limit = self.limits.get(model, {})
+            lane = self._lanes[model] = _ModelLane(
+                float(limit.get("rpm", QUOTA_DEFAULT_RPM)),
+                float(limit.get("tpm", QUOTA_DEFAULT_TPM)),
+            )
+        return lane
+
+    def _admit(self, priority: str, queued: float):
+        self.admitted[priority] += 1
+        self.queue_times[priority].append(queued)
+
+    def _shed(self, priority: str, model: str, reason: str):
+        self.shed[priority] += 1
+        raise QuotaExceeded(f"{priority} call to {model} shed: {reason}")
+
+    async def acquire(self, model: str, tokens: int = 0, priority: str = None) -> float:
+        """
+        Wait until `model` has room for one request of `tokens` tokens and
+        return the seconds spent queued. Raises QuotaExceeded when shed.
+        """
+        priority = priority or _priority.get()
+        if not self.enabled:
+            return 0.0
+
+        lane = self._lane(model)
+        rank = PRIORITIES.index(priority)
+        max_wait = MAX_WAIT_SECONDS[priority]
+
+        if not lane.queue and lane.wait_for(tokens) == 0:
+            lane.take(tokens)
+            self._admit(priority, 0.0)
+            return 0.0
+
+        # Shed on arrival when the work already queued ahead cannot clear in time
+        count, queued_tokens = lane.backlog(rank)
+        expected = max(
+            lane.requests.wait_for(count + 1),
+            lane.tokens.wait_for(queued_tokens + tokens),
+        )
+        if expected > max_wait:
+            self._shed(priority, model, f"expected wait {expected:.1f}s exceeds {max_wait:.1f}s")
+
+        waiter = _Waiter(tokens, priority)
+        heapq.heappush(lane.queue, (rank, next(self._sequence), waiter))
+        lane.wakeup.set()
+        if lane.pump is None or lane.pump.done():
+            lane.pump = asyncio.create_task(self._pump(lane))
+
+        # asyncio.wait rather than wait_for: it neither cancels the waiter on
+        # timeout nor swallows the caller's cancellation once it is admitted
+        try:
+            await asyncio.wait((waiter.future,), timeout=max_wait)
+        except asyncio.CancelledError:
+            # Caller gave up: leave no admitted-but-unused slot behind. The
+            # pump may already have admitted it (and drawn from the buckets)
+            # in the same tick the cancellation arrived; hand that back.
+            if waiter.future.done() and not waiter.future.cancelled():
+                lane.refund(tokens)
+            else:
+                waiter.future.cancel()
+            raise
+        if not waiter.future.done():
+            waiter.future.cancel()
+            self._shed(priority, model, f"queued longer than {max_wait:.1f}s")
+
+        queued = time.monotonic() - waiter.enqueued
+        self._admit(priority, queued)
+        return queued
+
+    async def _pump(self, lane: _ModelLane):
+        """Admit queued calls in priority order as the buckets refill."""
+        while lane.queue:
+            _, _, waiter = lane.queue[0]
+            if waiter.future.done():
+                heapq.heappop(lane.queue)
+                continue
+            wait = lane.wait_for(waiter.tokens)
+            if wait == 0:
+                heapq.heappop(lane.queue)
+                lane.take(waiter.tokens)
+                waiter.future.set_result(None)
+                continue
+            # Sleep until the head fits, or a new (maybe higher-priority) call arrives
+            lane.wakeup.clear()
+            try:
+                await asyncio.wait_for(lane.wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def snapshot(self) -> dict:
+        return {
+            "models": {
+                model: {
+                    "queued": sum(1 for _, _, w in lane.queue if not w.future.done()),
+                    "rpm": lane.requests.capacity,
+                    "tpm": lane.tokens.capacity,
+                }
+                for model, lane in self._lanes.items()
+            },
+            "priorities": {
+                name: {
+                    "admitted": self.admitted[name],
+                    "shed": self.shed[name],
+                    "queue_p50_ms": round(percentile(self.queue_times[name], 50) * 1000, 1),
+                    "queue_p95_ms": round(percentile(self.queue_times[name], 95) * 1000, 1),
+                }
+                for name in PRIORITIES
+            },
+        }
+
+
+QUOTA = QuotaScheduler()
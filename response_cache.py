@@ -0,0 +1,214 @@
+# response_cache.py
+"""
+Semantic cache of model replies for scripted, trainee-independent turns.
+
+Many RCPA and DOCTOR turns are near-identical across trainees ("what
+brands does Dr. Sharma prescribe?"). Replies are cached per (stage,
+persona) keyed on the normalised user text plus a digest of the
+assistant line it answers (`context_digest`), so a reply is only reused
+after the same question: "and per week?" means different things after
+different questions. An exact match is a dict lookup; anything else is
+one cosine-similarity pass over that partition's float32 embedding
+matrix, accepted above RESPONSE_CACHE_THRESHOLD and only when both texts
+carry the same numbers, units and product names ("per day" is not "per
+week", "Dexel ND" is not "Dexel").
+
+Only stages in RESPONSE_CACHE_STAGES are cached; SETUP, OBJECTION and
+the scripted stages depend on the trainee or never call the model.
+Entries expire after RESPONSE_CACHE_TTL_SECONDS and each partition keeps
+at most RESPONSE_CACHE_SIZE replies, evicting the least recently used.
+"""
+import os
+import time
+import zlib
+import hashlib
+from collections import deque
+
+from perf_stats import percentile
+from text_embedding import HashedEmbedder, normalize_text
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_STAGES = os.getenv("RESPONSE_CACHE_STAGES", "RCPA,DOCTOR")
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+
+# Tokens a fuzzy hit must agree on exactly, folded to one spelling
+_UNITS = {
+    "day": "day", "days": "day", "daily": "day",
+    "week": "week", "weeks": "week", "weekly": "week",
+    "month": "month", "months": "month", "monthly": "month",
+    "year": "year", "years": "year", "yearly": "year",
+    "strip": "strip", "strips": "strip", "tablet": "tablet", "tablets": "tablet",
+    "capsule": "capsule", "capsules": "capsule", "sachet": "sachet", "sachets": "sachet",
+    "dose": "dose", "doses": "dose", "box": "box", "boxes": "box",
+    "mg": "mg", "mcg": "mcg", "iu": "iu", "ml": "ml",
+}
+_NUMBER_WORDS = {
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "fifteen", "twenty", "thirty", "hundred", "thousand",
+    "once", "twice", "half", "single", "double",
+}
+RESPONSE_CACHE_PRODUCTS = {
+    t.strip().lower() for t in os.getenv("RESPONSE_CACHE_PRODUCTS", "dexel,nd").split(",") if t.strip()
+}
+
+
+def guard_tokens(normalized: str) -> tuple:
+    """Numbers, units and product names in `normalized`, which fuzzy hits must share."""
+    tokens = []
+    for word in normalized.split():
+        if any(c.isdigit() for c in word) or word in _NUMBER_WORDS or word in RESPONSE_CACHE_PRODUCTS:
+            tokens.append(word)
+        elif word in _UNITS:
+            tokens.append(_UNITS[word])
+    return tuple(sorted(tokens))
+
+
+def context_digest(lines) -> str:
+    """Stable digest of the conversation a reply answers ("" for none)."""
+    normalized = "\n".join(normalize_text(line) for line in lines)
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16] if normalized else ""
+
+
+def _crc(context: str) -> int:
+    return zlib.crc32(context.encode())
+
+
+class _Partition:
+    """Fixed-size embedding matrix plus the reply stored in each row."""
+
+    def __init__(self, size: int, dim: int):
+        import numpy as np
+
+        self.vectors = np.zeros((size, dim), dtype=np.float32)
+        self.last_used = np.zeros(size, dtype=np.float64)
+        # CRC32 of each row's context, so other conversations are masked in one pass
+        self.contexts = np.zeros(size, dtype=np.uint32)
+        self.keys = [None] * size
+        self.guards = [None] * size
+        self.replies = [None] * size
+        self.expires = [0.0] * size
+        self.rows = {}  # (context, normalised text) -> row
+        self.used = 0
+
+    def _drop(self, row: int):
+        self.rows.pop(self.keys[row], None)
+        self.keys[row] = self.guards[row] = self.replies[row] = None
+        self.vectors[row] = 0.0
+        self.last_used[row] = 0.0
+
+    def lookup(self, key: tuple, vector, threshold: float, now: float):
+        """(reply, similarity) of the best live match for (context, text) `key`, or None."""
+        row = self.rows.get(key)
+        similarity = 1.0
+        if row is None:
+            if not self.used:
+                return None
+            scores = self.vectors[:self.used] @ vector
+            scores[self.contexts[:self.used] != _crc(key[0])] = -1.0
+            row = int(scores.argmax())
+            similarity = float(scores[row])
+            if (similarity < threshold or self.keys[row] is None or self.keys[row][0] != key[0]
+                    or self.guards[row] != guard_tokens(key[1])):
+                return None
+        if self.expires[row] < now:
+            self._drop(row)
+            return None
+        self.last_used[row] = now
+        return self.replies[row], similarity
+
+    def store(self, key: tuple, vector, reply: str, expires: float, now: float) -> bool:
+        """Store a reply; returns True when an older entry had to be evicted."""
+        evicted = False
+        row = self.rows.get(key)
+        if row is None:
+            if self.used < len(self.keys):
+                row = self.used
+                self.used += 1
+            else:
+                row = int(self.last_used.argmin())
+                evicted = self.keys[row] is not None
+                self._drop(row)
+        self.vectors[row] = vector
+        self.contexts[row] = _crc(key[0])
+        self.keys[row] = key
+        self.guards[row] = guard_tokens(key[1])
+        self.replies[row] = reply
+        self.expires[row] = expires
+        self.last_used[row] = now
+        self.rows[key] = row
+        return evicted
+
+
+class ResponseCache:
+    def __init__(self, stages=None, threshold: float = None, size: int = None, ttl_seconds: float = None,
+                 enabled: bool = None, embedder: HashedEmbedder = None):
+        if stages is None:
+            stages = [s.strip() for s in RESPONSE_CACHE_STAGES.split(",") if s.strip()]
+        self.stages = set(stages)
+        self.threshold = RESPONSE_CACHE_THRESHOLD if threshold is None else threshold
+        self.size = size or RESPONSE_CACHE_SIZE
+        self.ttl_seconds = RESPONSE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.enabled = RESPONSE_CACHE_ENABLED if enabled is None else enabled
+        self.embedder = embedder or HashedEmbedder()
+        self._partitions = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.lookup_times = deque(maxlen=1000)
+
+    def caches(self, stage: str) -> bool:
+        return self.enabled and stage in self.stages
+
+    def _partition(self, stage: str, persona: str) -> _Partition:
+        partition = self._partitions.get((stage, persona))
+        if partition is None:
+            partition = self._partitions[(stage, persona)] = _Partition(self.size, self.embedder.dim)
+        return partition
+
+    def lookup(self, stage: str, persona: str, text: str, context: str = ""):
+        """A cached reply for this turn after the `context_digest` conversation, or None."""
+        if not self.caches(stage):
+            return None
+        start = time.perf_counter()
+        key = normalize_text(text)
+        hit = None
+        if key:
+            hit = self._partition(stage, persona).lookup(
+                (context, key), self.embedder.embed(key), self.threshold, time.monotonic()
+            )
+        self.lookup_times.append(time.perf_counter() - start)
+        if hit is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return hit[0]
+
+    def store(self, stage: str, persona: str, text: str, reply: str, context: str = ""):
+        if not self.caches(stage) or not reply:
+            return
+        key = normalize_text(text)
+        if not key:
+            return
+        now = time.monotonic()
+        partition = self._partition(stage, persona)
+        if partition.store((context, key), self.embedder.embed(key), reply, now + self.ttl_seconds, now):
+            self.evictions += 1
+        self.stores += 1
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "stages": sorted(self.stages) if self.enabled else [],
+            "entries": sum(len(p.rows) for p in self._partitions.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "lookup_p50_ms": round(percentile(self.lookup_times, 50) * 1000, 3),
+            "lookup_p95_ms": round(percentile(self.lookup_times, 95) * 1000, 3),
+        }
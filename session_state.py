@@ -0,0 +1,153 @@
+# session_state.py
+"""
+Per-session state kept in memory between turns.
+
+A chat turn needs the session's stage, persona, setup fields and how many
+messages each stage has seen. SessionStateCache keeps that in an LRU with
+an idle TTL, so repeat turns read nothing from the database; every change
+still goes out through TurnUnitOfWork's UPDATE (write-through), so the
+monica_sessions row stays authoritative and a cold worker rebuilds the
+state with two queries.
+
+The cache is per process: deployments running several workers should
+route a session to one worker (sticky sessions) or keep the TTL short.
+"""
+import os
+import time
+from collections import OrderedDict
+
+from sqlalchemy import func, select
+
+from database import AsyncSessionLocal
+from models import MonicaSession, MonicaMessage
+
+SESSION_FIELDS = (
+    "user_name",
+    "user_role",
+    "headquarter",
+    "division",
+    "current_stage",
+    "current_persona",
+    "state_delta",
+    "metrics",
+)
+
+
+class SessionState:
+    """Typed snapshot of one monica_sessions row plus per-stage message counters."""
+
+    __slots__ = ("id", *SESSION_FIELDS, "counters", "last_used")
+
+    id: int
+    user_name: str
+    user_role: str
+    headquarter: str
+    division: str
+    current_stage: str
+    current_persona: str
+    state_delta: dict
+    metrics: dict
+    counters: dict
+    last_used: float
+
+    def __init__(self, id: int, counters: dict = None, **fields):
+        self.id = id
+        for name in SESSION_FIELDS:
+            setattr(self, name, fields.get(name))
+        self.current_stage = self.current_stage or "SETUP"
+        self.current_persona = self.current_persona or "COACH"
+        self.state_delta = dict(self.state_delta or {})
+        self.metrics = dict(self.metrics or {})
+        # (stage, role) -> messages stored for that stage
+        self.counters = dict(counters or {})
+        self.last_used = time.monotonic()
+
+    @classmethod
+    def from_row(cls, row: MonicaSession, counters: dict = None) -> "SessionState":
+        return cls(row.id, counters, **{name: getattr(row, name) for name in SESSION_FIELDS})
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            if name not in SESSION_FIELDS:
+                raise AttributeError(f"SessionState has no field {name!r}")
+            setattr(self, name, value)
+
+    def count(self, stage: str, role: str = None) -> int:
+        if role is not None:
+            return self.counters.get((stage, role), 0)
+        return sum(n for (s, _), n in self.counters.items() if s == stage)
+
+    def bump(self, stage: str, role: str):
+        key = (stage, role)
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+
+class SessionStateCache:
+    """
+    LRU of SessionState by session id. Entries idle for longer than
+    `ttl_seconds` are reloaded from the database on their next use.
+    """
+
+    def __init__(self, max_sessions: int = None, ttl_seconds: float = None, session_factory=AsyncSessionLocal):
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_CACHE_MAX", "5000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SESSION_CACHE_TTL_SECONDS", "1800"))
+        self.session_factory = session_factory
+        self._states = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def _load(self, session_id: int):
+        async with self.session_factory() as db:
+            row = await db.get(MonicaSession, session_id)
+            if row is None:
+                return None
+            counts = await db.execute(
+                select(MonicaMessage.stage, MonicaMessage.role, func.count(MonicaMessage.id))
+                .where(MonicaMessage.session_id == session_id)
+                .group_by(MonicaMessage.stage, MonicaMessage.role)
+            )
+            return SessionState.from_row(row, {(stage, role): n for stage, role, n in counts})
+
+    async def get(self, session_id: int):
+        """The session's state, or None when no such session exists."""
+        now = time.monotonic()
+        state = self._states.get(session_id)
+        if state is not None and now - state.last_used <= self.ttl_seconds:
+            state.last_used = now
+            self._states.move_to_end(session_id)
+            self.hits += 1
+            return state
+
+        if state is not None:
+            # Idle too long: another worker may have moved the session on
+            del self._states[session_id]
+        self.misses += 1
+        state = await self._load(session_id)
+        if state is not None:
+            # A concurrent turn may have loaded it first; keep that one
+            state = self.put(self._states.get(session_id) or state)
+        return state
+
+    def put(self, state: SessionState) -> SessionState:
+        state.last_used = time.monotonic()
+        self._states[state.id] = state
+        self._states.move_to_end(state.id)
+        while len(self._states) > self.max_sessions:
+            self._states.popitem(last=False)
+            self.evictions += 1
+        return state
+
+    def evict(self, session_id: int):
+        """Forget a session, e.g. after a failed write left the state ahead of the DB."""
+        if self._states.pop(session_id, None) is not None:
+            self.evictions += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "resident": len(self._states),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Offline shadow evaluation of the model routing tiers.
+
+Replays turns sampled into ROUTING_SHADOW_LOG (set ROUTING_SHADOW_RATE on
+a serving worker) against both the fast and the quality tier, and reports
+per-stage latency, reply length, empty/truncated replies and how closely
+the fast reply matches the quality one:
+
+    ROUTING_SHADOW_RATE=0.1 uvicorn main:app ...
+    python shadow_eval.py --log routing_shadow.jsonl --limit 200
+
+Each tier is called straight through LLMGateway with its own model: the
+serving router's hedging and provider fallback would otherwise mix other
+models into the comparison. Calls run at batch priority, so they queue
+behind live traffic when this is pointed at a shared key.
+"""
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+
+from perf_stats import print_table
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=None, help="shadow log (default: ROUTING_SHADOW_LOG)")
+    parser.add_argument("--limit", type=int, default=0, help="evaluate at most N turns")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="print the raw summary as JSON")
+    return parser.parse_args()
+
+
+def load(path: str, limit: int) -> list:
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return records[:limit] if limit else records
+
+
+def overlap(a: str, b: str) -> float:
+    """Word-set Jaccard similarity of two replies."""
+    wa, wb = set(re.findall(r"\w+", a.lower())), set(re.findall(r"\w+", b.lower()))
+    if not wa and not wb:
+        return 1.0
+    return len(wa & wb) / len(wa | wb)
+
+
+async def run_tier(gateway, routing, record: dict, tier: str) -> dict:
+    from model_routing import ModelRoute
+
+    cap = record["route"]["max_output_tokens"]
+    route = ModelRoute(tier, routing.models[tier], cap, "shadow")
+    start = time.perf_counter()
+    try:
+        text = await gateway.generate(
+            model=route.model,
+            contents=record["prompt"],
+            system_instruction=record["system_instruction"],
+            config=route.config,
+        )
+        error = None
+    except Exception as e:
+        text, error = "", repr(e)
+    return {"text": text, "seconds": time.perf_counter() - start, "error": error}
+
+
+async def evaluate(records: list, concurrency: int) -> dict:
+    from llm_gateway import LLMGateway
+    from model_routing import MODEL_ROUTING
+    from quota import priority
+
+    gateway = LLMGateway()
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one(record):
+        async with semaphore:
+            with priority("batch"):
+                fast, quality = await asyncio.gather(
+                    run_tier(gateway, MODEL_ROUTING, record, "fast"),
+                    run_tier(gateway, MODEL_ROUTING, record, "quality"),
+                )
+        results.append((record, fast, quality))
+
+    await asyncio.gather(*(one(r) for r in records))
+    return results
+
+
+def report(results: list, as_json: bool):
+    latency = defaultdict(list)
+    length = defaultdict(list)
+    similarity = defaultdict(list)
+    empty = defaultdict(int)
+    errors = defaultdict(int)
+
+    for record, fast, quality in results:
+        stage = record["stage"]
+        for tier, out in (("fast", fast), ("quality", quality)):
+            latency[f"{stage} {tier}"].append(out["seconds"])
+            length[f"{stage} {tier}"].append(len(out["text"]))
+            if out["error"]:
+                errors[f"{stage} {tier}"] += 1
+            elif not out["text"].strip():
+                empty[f"{stage} {tier}"] += 1
+        if not fast["error"] and not quality["error"]:
+            similarity[stage].append(overlap(fast["text"], quality["text"]))
+
+    if as_json:
+        from perf_stats import summarize
+        print(json.dumps({
+            "latency": {k: summarize(v) for k, v in latency.items()},
+            "reply_chars": {k: summarize(v) for k, v in length.items()},
+            "similarity": {k: summarize(v) for k, v in similarity.items()},
+            "empty": dict(empty),
+            "errors": dict(errors),
+        }, indent=2))
+        return
+
+    print(f"turns: {len(results)}")
+    print_table("Latency by stage and tier", dict(sorted(latency.items())))
+    print_table("Reply length", dict(sorted(length.items())), unit="chars", scale=1.0)
+    print_table("Fast vs quality word overlap", dict(sorted(similarity.items())), unit="0-1", scale=1.0)
+    for name in sorted(set(empty) | set(errors)):
+        print(f"  {name:<22} empty: {empty[name]}  errors: {errors[name]}")
+
+
+def main():
+    args = parse_args()
+    from model_routing import ROUTING_SHADOW_LOG
+
+    records = load(args.log or ROUTING_SHADOW_LOG, args.limit)
+    if not records:
+        print("No shadow records to evaluate.")
+        return 1
+    report(asyncio.run(evaluate(records, args.concurrency)), args.json)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The app modules live at the repository root and read their settings at import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ.setdefault("GEMINI_API_KEY", "test")
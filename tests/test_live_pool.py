@@ -0,0 +1,105 @@
+import asyncio
+
+from fake_genai import FakeAPIError, FakeGenaiClient
+from live_pool import LiveSessionManager, LiveSessionPool
+
+
+def _pool(client: FakeGenaiClient, **kwargs) -> LiveSessionPool:
+    kwargs.setdefault("size", 0)
+    kwargs.setdefault("stages", [])
+    return LiveSessionPool(lambda: client, "live", lambda stage: {"system_instruction": stage}, **kwargs)
+
+
+def test_failed_cut_over_keeps_the_active_session():
+    client = FakeGenaiClient()
+    pool = _pool(client)
+
+    async def main():
+        live = LiveSessionManager(pool, await pool.acquire("SETUP"))
+        first = live.active
+
+        client.connect_error = FakeAPIError(503, "UNAVAILABLE", "live connect refused")
+        live.prepare("RCPA")
+        assert not await live.cut_over("handoff")
+        assert live.active is first and not first.session.closed
+        # Still owed: the next turn boundary connects it inline
+        assert live.next_stage == "RCPA"
+
+        client.connect_error = None
+        assert await live.cut_over("handoff")
+        assert first.session.closed and not live.session.closed
+        await live.close()
+        return live
+
+    live = asyncio.run(main())
+    assert live.stage == "RCPA" and live.next_stage is None
+    assert live.cutovers == 1 and live.failed_cutovers == 1
+    assert live.session.sent[0] == ("client_content", {"role": "user", "parts": [{"text": "handoff"}]})
+
+
+async def _until(condition, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_acquire_counts_hits_and_misses_and_refills():
+    client = FakeGenaiClient(connect_latency=0.02)
+    pool = _pool(client, size=1, stages=["SETUP"])
+
+    async def main():
+        pool.start()
+        await _until(lambda: pool.snapshot().get("SETUP", {}).get("ready") == 1)
+        warm = await pool.acquire("SETUP")
+        # The refill it triggered is still connecting: wait for it, not a fresh connect
+        joined = await pool.acquire("SETUP")
+        cold = await pool.acquire("KNOWLEDGE")
+        await _until(lambda: pool.snapshot()["SETUP"]["ready"] == 1)
+        await pool.close()
+        # close() shuts the session still waiting in the pool, not the claimed ones
+        assert [s.closed for s in client.live_sessions].count(True) == 1
+        assert not any(lease.session.closed for lease in (warm, joined, cold))
+        return warm, joined, cold
+
+    warm, joined, cold = asyncio.run(main())
+    stats = pool.snapshot()
+    assert stats["SETUP"] == {"ready": 0, "hits": 2, "misses": 0, "retired": 0, "failed": 0}
+    # Unconfigured stages connect on demand and are not kept warm
+    assert stats["KNOWLEDGE"]["misses"] == 1 and stats["KNOWLEDGE"]["ready"] == 0
+    assert cold.stage == "KNOWLEDGE" and warm.session is not joined.session
+
+
+def test_reaper_retires_idle_sessions_and_refills():
+    client = FakeGenaiClient()
+    pool = _pool(client, size=1, stages=["SETUP"], max_idle=0.05, reap_interval=0.02)
+
+    async def main():
+        pool.start()
+        await _until(lambda: pool.stats["SETUP"]["retired"] >= 1 and pool.snapshot()["SETUP"]["ready"] == 1)
+        first, *refills = client.live_sessions
+        assert first.closed and not refills[-1].closed
+        await pool.close()
+
+    asyncio.run(main())
+
+
+def test_prewarm_is_one_shot():
+    client = FakeGenaiClient(connect_latency=0.02)
+    pool = _pool(client, size=1, stages=["SETUP"])
+
+    async def main():
+        pool.prewarm("RCPA")
+        pool.prewarm("RCPA")  # already filling: no second connect
+        await _until(lambda: pool.snapshot().get("RCPA", {}).get("ready") == 1)
+        lease = await pool.acquire("RCPA")
+        await asyncio.sleep(0.05)
+        await pool.close()
+        return lease
+
+    lease = asyncio.run(main())
+    assert lease.stage == "RCPA"
+    assert "RCPA" not in pool.stages
+    assert pool.snapshot()["RCPA"] == {"ready": 0, "hits": 1, "misses": 0, "retired": 0, "failed": 0}
+    rcpa = [s for s in client.live_sessions if s.config["system_instruction"] == "RCPA"]
+    assert len(rcpa) == 1
@@ -0,0 +1,125 @@
+import asyncio
+
+import numpy as np
+
+from database import AsyncSessionLocal, async_engine, create_schema
+from fake_genai import FakeGenaiClient, FakeProvider
+from live_pool import LiveSessionPool
+from models import MonicaSession
+from monica_service import MonicaAgent
+from voice_pipeline import VOICE_INPUT_SAMPLE_RATE
+
+
+class FakeWebSocket:
+    """The slice of starlette's WebSocket that connect_live_session uses."""
+
+    def __init__(self, on_json=None):
+        self.incoming = asyncio.Queue()
+        self.on_json = on_json
+        self.json = []
+        self.audio = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send_json(self, data):
+        self.json.append(data)
+        if self.on_json:
+            self.on_json(data)
+
+    async def send_bytes(self, data):
+        self.audio.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed = code
+
+    def speak(self, seconds: float = 0.4, pause: float = 0.8):
+        """A tone loud enough for the VAD, then the silence that ends the turn."""
+        t = np.arange(int(seconds * VOICE_INPUT_SAMPLE_RATE)) / VOICE_INPUT_SAMPLE_RATE
+        tone = (4000 * np.sin(2 * np.pi * 200 * t)).astype("<i2").tobytes()
+        silence = b"\0\0" * int(pause * VOICE_INPUT_SAMPLE_RATE)
+        for chunk in (tone, silence):
+            self.incoming.put_nowait({"type": "websocket.receive", "bytes": chunk})
+
+    def hang_up(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect"})
+
+
+async def _new_session(stage: str) -> int:
+    await create_schema()
+    async with AsyncSessionLocal() as db:
+        row = MonicaSession(current_stage=stage, current_persona="COACH", user_name="Asha")
+        db.add(row)
+        await db.commit()
+        return row.id
+
+
+async def _until(condition, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_voice_turn_advances_onto_a_prewarmed_session():
+    client = FakeGenaiClient(connect_latency=0.02, live_reply_ms=40, live_tool_call="advance_stage")
+    agent = MonicaAgent(gateway=FakeProvider())
+    pool = agent.live_pool = LiveSessionPool(lambda: client, agent.model_live, agent._live_config,
+                                             size=1, stages=["SETUP"])
+
+    def on_json(data):
+        # The trainee advances once; the next persona just talks
+        if data["type"] == "stage_update":
+            client.live_tool_call = None
+
+    async def main():
+        session_id = await _new_session("SETUP")
+        pool.start()
+        await _until(lambda: pool.snapshot().get("SETUP", {}).get("ready") == 1)
+
+        ws = FakeWebSocket(on_json)
+        voice = asyncio.create_task(agent.connect_live_session(ws, session_id))
+        # Accepting the socket pre-warms the stage after SETUP
+        await _until(lambda: pool.snapshot().get("RCPA", {}).get("ready") == 1)
+
+        ws.speak()
+        await _until(lambda: pool.stats["RCPA"]["hits"] == 1)
+        setup, rcpa = [s for s in client.live_sessions if s.sent]
+        await _until(lambda: setup.closed and len(rcpa.sent) == 1)
+        assert not rcpa.closed
+
+        ws.hang_up()
+        await voice
+        assert rcpa.closed
+        state = await agent.states.get(session_id)
+        await pool.close()
+        await async_engine.dispose()
+        return ws, setup, rcpa, state
+
+    ws, setup, rcpa, state = asyncio.run(main())
+
+    stats = pool.snapshot()
+    assert stats["SETUP"]["hits"] == 1 and stats["SETUP"]["misses"] == 0
+    assert stats["RCPA"]["hits"] == 1 and stats["RCPA"]["misses"] == 0
+
+    # One spoken turn, framed by activity markers since our VAD owns turn-taking
+    kinds = [kind for kind, _ in setup.sent]
+    assert kinds[0] == "activity_start"
+    assert kinds[-2:] == ["activity_end", "tool_response"]
+    assert set(kinds[1:-2]) == {"audio"}
+    (response,) = setup.sent[-1][1]
+    assert response["name"] == "advance_stage" and response["response"] == {"stage": "RCPA"}
+
+    # The new persona is prompted to pick up the conversation
+    kind, handoff = rcpa.sent[0]
+    assert kind == "client_content" and "RCPA" in handoff["parts"][0]["text"]
+    assert "CURRENT STAGE: RCPA" in rcpa.config["system_instruction"]
+
+    assert ws.json == [{"type": "stage_update", "stage": "RCPA"}]
+    assert ws.audio
+    assert state.current_stage == "RCPA"
+    assert state.count("SETUP", "user") == 1
@@ -0,0 +1,124 @@
+import time
+import asyncio
+
+from fake_genai import FakeGenaiClient
+from llm_gateway import LLMGateway
+from monica_service import SESSION_BRIEF, SYSTEM_PROMPT
+from prompt_cache import PromptCacheManager
+
+MODEL = "gemini-2.5-flash"
+
+
+def _manager(client: FakeGenaiClient, **kwargs) -> PromptCacheManager:
+    kwargs.setdefault("ttl_seconds", 60)
+    kwargs.setdefault("refresh_margin", 10)
+    kwargs.setdefault("retry_after", 30)
+    return PromptCacheManager(client, enabled=True, **kwargs)
+
+
+def test_session_brief_clears_the_cache_minimum():
+    client = FakeGenaiClient(min_cache_tokens=1024)
+    manager = _manager(client)
+
+    async def main():
+        return [await manager.config_for(MODEL, SESSION_BRIEF) for _ in range(3)]
+
+    configs = asyncio.run(main())
+    assert manager.cacheable(MODEL, SESSION_BRIEF)
+    # One handle, shared by every later call
+    assert len(client.caches) == 1
+    assert configs == [{"cached_content": name} for name in client.caches] * 3
+    # The coaching rules alone would not have been worth a round trip
+    assert not manager.cacheable(MODEL, SYSTEM_PROMPT)
+
+
+def test_handle_is_extended_before_its_ttl_runs_out():
+    client = FakeGenaiClient()
+    manager = _manager(client)
+    updates = []
+    update = client.aio.caches.update
+
+    async def spy(name, config):
+        updates.append(name)
+        return await update(name=name, config=config)
+
+    client.aio.caches.update = spy
+
+    async def main():
+        first = await manager.config_for(MODEL, SESSION_BRIEF)
+        entry, = manager._entries.values()
+        # Inside the refresh margin, but not yet expired
+        entry.expires_at = time.monotonic() + 5
+        second = await manager.config_for(MODEL, SESSION_BRIEF)
+        return first, second, entry
+
+    first, second, entry = asyncio.run(main())
+    assert first == second
+    assert updates == [first["cached_content"]]
+    assert entry.expires_at > time.monotonic() + 50
+    assert len(client.caches) == 1
+
+
+def test_refused_prompt_is_sent_inline_and_backs_off():
+    # The server's minimum is above our estimate, so create is refused
+    client = FakeGenaiClient(min_cache_tokens=100_000)
+    manager = _manager(client)
+    creates = []
+    create = client.aio.caches.create
+
+    async def spy(model, config):
+        creates.append(model)
+        return await create(model=model, config=config)
+
+    client.aio.caches.create = spy
+
+    async def main():
+        configs = [await manager.config_for(MODEL, SESSION_BRIEF) for _ in range(3)]
+        assert len(creates) == 1
+        # Once the back-off has passed, creation is tried again
+        key, = manager._failed_until
+        manager._failed_until[key] = time.monotonic() - 1
+        configs.append(await manager.config_for(MODEL, SESSION_BRIEF))
+        return configs
+
+    configs = asyncio.run(main())
+    assert configs == [{"system_instruction": SESSION_BRIEF}] * 4
+    assert len(creates) == 2
+
+
+def test_generate_retries_inline_when_the_handle_is_gone():
+    client = FakeGenaiClient()
+    gateway = LLMGateway(client, prompt_cache=_manager(client))
+
+    async def main():
+        await gateway.generate(MODEL, "hi", SESSION_BRIEF)
+        # Evicted server-side while we still hold the name
+        client.caches.clear()
+        text = await gateway.generate(MODEL, "hi", SESSION_BRIEF)
+        await gateway.generate(MODEL, "hi", SESSION_BRIEF)
+        return text
+
+    assert asyncio.run(main())
+    configs = [config for _, _, config in client.calls]
+    assert "cached_content" in configs[0]
+    assert configs[1].get("system_instruction") == SESSION_BRIEF and "cached_content" not in configs[1]
+    # The stale entry was dropped, so the next call registers a fresh handle
+    assert configs[2]["cached_content"] in client.caches
+
+
+def test_stream_retries_inline_when_the_handle_is_gone():
+    client = FakeGenaiClient()
+    gateway = LLMGateway(client, prompt_cache=_manager(client))
+
+    async def collect():
+        return "".join([chunk async for chunk in gateway.stream(MODEL, "hi", SESSION_BRIEF)])
+
+    async def main():
+        await collect()
+        client.caches.clear()
+        return await collect()
+
+    assert asyncio.run(main()).strip() == "Noted. What else would you like to know?"
+    configs = [config for _, _, config in client.calls]
+    assert "cached_content" in configs[0]
+    assert configs[1].get("system_instruction") == SESSION_BRIEF and "cached_content" not in configs[1]
@@ -0,0 +1,95 @@
+import time
+import asyncio
+
+import pytest
+
+from ai_services import LLM_HEDGE_MIN_SAMPLES, CircuitBreaker, ProviderRouter, ProviderUnavailable
+from fake_genai import FakeProvider
+
+
+def test_breaker_opens_then_probes_half_open():
+    breaker = CircuitBreaker(failures=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.ready()
+
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.ready()
+
+    time.sleep(0.06)
+    assert breaker.ready()
+    breaker.begin()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.ready()
+
+    # A failed probe re-opens it for another full reset period
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.ready()
+    assert breaker.trips == 2
+
+    time.sleep(0.06)
+    breaker.begin()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_breaker_release_lets_the_next_call_probe():
+    breaker = CircuitBreaker(failures=1, reset_seconds=0)
+    breaker.record_failure()
+    breaker.begin()
+    assert not breaker.ready()
+
+    breaker.release()
+    assert breaker.state == "open" and breaker.ready()
+
+
+def test_fallback_follows_provider_order():
+    order = []
+
+    def provider(name, failure_rate):
+        return FakeProvider(name, reply_fn=lambda *_: name, latency=lambda: order.append(name) or 0,
+                            failure_rate=failure_rate)
+
+    router = ProviderRouter([provider("a", 1.0), provider("b", 1.0), provider("c", 0.0)], hedge=False,
+                            breaker_factory=lambda: CircuitBreaker(failures=1, reset_seconds=60))
+
+    assert asyncio.run(router.generate("m", "hi")) == "c"
+    assert order == ["a", "b", "c"]
+    assert router.fallbacks == 2
+
+    # Both failed providers are now open and skipped outright
+    order.clear()
+    assert asyncio.run(router.generate("m", "hi")) == "c"
+    assert order == ["c"]
+    assert router.snapshot()["providers"]["a"]["state"] == "open"
+
+
+def test_all_providers_failing_raises_unavailable():
+    router = ProviderRouter([FakeProvider("a", failure_rate=1.0), FakeProvider("b", failure_rate=1.0)], hedge=False)
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(router.generate("m", "hi"))
+
+
+def test_hedge_cancels_the_slow_lead():
+    slow = FakeProvider("slow", reply_fn=lambda *_: "slow", latency=1.0)
+    fast = FakeProvider("fast", reply_fn=lambda *_: "fast", latency=0.0)
+    router = ProviderRouter([slow, fast], hedge=True)
+    lead = router.routes[0]
+    lead.latencies.extend([0.01] * LLM_HEDGE_MIN_SAMPLES)
+
+    async def main():
+        start = time.perf_counter()
+        text = await router.generate("m", "hi")
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0)
+        others = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        return text, elapsed, others
+
+    text, elapsed, others = asyncio.run(main())
+    assert text == "fast"
+    assert elapsed < 0.5
+    assert others == []
+    assert router.hedges == 1 and router.hedge_wins == 1
+    # The cancelled lead's time is kept, and its breaker is not charged
+    assert len(lead.latencies) == LLM_HEDGE_MIN_SAMPLES + 1
+    assert lead.breaker.state == "closed" and lead.errors == 0
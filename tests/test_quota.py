@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import quota
+from quota import QuotaExceeded, QuotaScheduler
+
+
+def test_call_that_cannot_clear_in_time_is_shed(monkeypatch):
+    monkeypatch.setitem(quota.MAX_WAIT_SECONDS, "live", 0.05)
+    scheduler = QuotaScheduler({"m": {"rpm": 60, "tpm": 1e9}}, enabled=True)
+
+    async def main():
+        # Drain the minute's requests; the next one is ~1s away
+        for _ in range(60):
+            assert await scheduler.acquire("m", priority="live") == 0.0
+        with pytest.raises(QuotaExceeded):
+            await scheduler.acquire("m", priority="live")
+
+    asyncio.run(main())
+    live = scheduler.snapshot()["priorities"]["live"]
+    assert live["admitted"] == 60 and live["shed"] == 1
+
+
+def test_queued_calls_are_admitted_by_priority():
+    # 600 rpm refills one request every 0.1s
+    scheduler = QuotaScheduler({"m": {"rpm": 600, "tpm": 1e9}}, enabled=True)
+    order = []
+
+    async def call(name):
+        await scheduler.acquire("m", priority=name)
+        order.append(name)
+
+    async def main():
+        for _ in range(600):
+            await scheduler.acquire("m", priority="batch")
+        batch = asyncio.create_task(call("batch"))
+        await asyncio.sleep(0)
+        live = asyncio.create_task(call("live"))
+        await asyncio.gather(batch, live)
+
+    asyncio.run(main())
+    assert order == ["live", "batch"]
+
+
+def test_disabled_scheduler_admits_everything():
+    scheduler = QuotaScheduler({"m": {"rpm": 1, "tpm": 1}}, enabled=False)
+
+    async def main():
+        return [await scheduler.acquire("m", 10_000) for _ in range(5)]
+
+    assert asyncio.run(main()) == [0.0] * 5
+
+
+def test_cancel_after_admission_refunds_the_slot():
+    # 60 rpm: one request per second once the minute is drained
+    scheduler = QuotaScheduler({"m": {"rpm": 60, "tpm": 1e9}}, enabled=True)
+
+    async def main():
+        for _ in range(60):
+            await scheduler.acquire("m", priority="live")
+        lane = scheduler._lanes["m"]
+        task = asyncio.create_task(scheduler.acquire("m", priority="live"))
+        await asyncio.sleep(0)
+        (_, _, waiter), = lane.queue
+        # The pump admits the waiter in the same tick its caller is cancelled
+        lane.requests.level += 1
+        lane.take(waiter.tokens)
+        waiter.future.set_result(None)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return lane.requests.level
+
+    assert asyncio.run(main()) >= 1
+    assert scheduler.snapshot()["priorities"]["live"]["admitted"] == 60
@@ -0,0 +1,70 @@
+import asyncio
+
+from database import AsyncSessionLocal, async_engine, create_schema
+from fake_genai import FakeProvider
+from models import MonicaSession
+from monica_service import MonicaAgent
+
+
+async def _new_session() -> int:
+    await create_schema()
+    async with AsyncSessionLocal() as db:
+        row = MonicaSession(current_stage="RCPA", current_persona="CHEMIST", user_name="Asha")
+        db.add(row)
+        await db.commit()
+        return row.id
+
+
+async def _until_called(provider: FakeProvider):
+    while not provider.calls:
+        await asyncio.sleep(0.01)
+
+
+def test_cancelled_reply_does_not_leave_cached_state_ahead():
+    provider = FakeProvider("slow", latency=5.0)
+    agent = MonicaAgent(gateway=provider)
+
+    async def main():
+        session_id = await _new_session()
+        session = await agent.states.get(session_id)
+
+        # e.g. run_until_disconnect cancelling the turn mid-generation
+        task = asyncio.create_task(agent.get_reply(session, "what does the doctor prescribe?"))
+        await _until_called(provider)
+        assert session.count("RCPA", "user") == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        reloaded = await agent.states.get(session_id)
+        await async_engine.dispose()
+        return session, reloaded
+
+    stale, reloaded = asyncio.run(main())
+    assert reloaded is not stale
+    assert reloaded.count("RCPA", "user") == 0
+    assert reloaded.current_stage == "RCPA"
+
+
+def test_abandoned_stream_does_not_leave_cached_state_ahead():
+    provider = FakeProvider("slow", latency=5.0)
+    agent = MonicaAgent(gateway=provider)
+
+    async def main():
+        session_id = await _new_session()
+        session = await agent.states.get(session_id)
+
+        # An SSE client going away closes the generator mid-turn
+        stream = agent.stream_reply(session, "what does the doctor prescribe?")
+        task = asyncio.create_task(stream.__anext__())
+        await _until_called(provider)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await stream.aclose()
+
+        reloaded = await agent.states.get(session_id)
+        await async_engine.dispose()
+        return session, reloaded
+
+    stale, reloaded = asyncio.run(main())
+    assert reloaded is not stale
+    assert reloaded.count("RCPA", "user") == 0
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from turn_guard import IdempotencyConflict, TurnGuard
+
+
+def test_duplicate_requests_share_one_turn():
+    guard = TurnGuard()
+    calls = []
+
+    async def turn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"reply": "hello"}
+
+    async def main():
+        results = await asyncio.gather(*(guard.run(1, "key", "hi", turn) for _ in range(5)))
+        # A retry after the turn finished is replayed, not re-run
+        results.append(await guard.run(1, "key", "hi", turn))
+        return results
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert guard.joined == 4 and guard.replayed == 1
+
+
+def test_stream_duplicates_replay_the_leaders_events():
+    guard = TurnGuard()
+    calls = []
+
+    async def turn(committed):
+        calls.append(1)
+        for text in ("a", "b"):
+            await asyncio.sleep(0.01)
+            yield "token", {"text": text}
+        committed()
+
+    async def collect():
+        return [item async for item in guard.stream(1, "key", "hi", turn)]
+
+    async def main():
+        return await asyncio.gather(collect(), collect())
+
+    leader, duplicate = asyncio.run(main())
+    assert len(calls) == 1
+    assert leader == duplicate == [("token", {"text": "a"}), ("token", {"text": "b"})]
+
+
+def test_stream_abandoned_after_commit_is_replayed_not_rerun():
+    guard = TurnGuard()
+    calls = []
+
+    async def turn(committed):
+        calls.append(1)
+        yield "token", {"text": "a"}
+        committed()
+        yield "done", {"reply": "a"}
+
+    async def main():
+        stream = guard.stream(1, "key", "hi", turn)
+        async for event, _ in stream:
+            if event == "done":
+                break
+        # The client went away before `done` reached it
+        await stream.aclose()
+        return [item async for item in guard.stream(1, "key", "hi", turn)]
+
+    replay = asyncio.run(main())
+    assert len(calls) == 1
+    assert replay == [("token", {"text": "a"}), ("done", {"reply": "a"})]
+    assert guard.replayed == 1
+
+
+def test_stream_abandoned_before_commit_runs_again():
+    guard = TurnGuard()
+    calls = []
+
+    async def turn(committed):
+        calls.append(1)
+        yield "token", {"text": "a"}
+        committed()
+        yield "done", {"reply": "a"}
+
+    async def main():
+        stream = guard.stream(1, "key", "hi", turn)
+        await stream.__anext__()
+        await stream.aclose()
+        return [item async for item in guard.stream(1, "key", "hi", turn)]
+
+    assert asyncio.run(main())[-1] == ("done", {"reply": "a"})
+    assert len(calls) == 2 and guard.replayed == 0
+
+
+def test_reused_key_with_a_different_request_conflicts():
+    guard = TurnGuard()
+
+    async def turn():
+        return "ok"
+
+    async def main():
+        await guard.run(1, "key", "hi", turn)
+        await guard.run(1, "key", "something else", turn)
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(main())
+
+
+def test_failed_turn_is_not_remembered():
+    guard = TurnGuard()
+    calls = []
+
+    async def turn():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("model down")
+        return "ok"
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await guard.run(1, "key", "hi", turn)
+        return await guard.run(1, "key", "hi", turn)
+
+    assert asyncio.run(main()) == "ok"
+    assert len(calls) == 2
@@ -0,0 +1,56 @@
+# text_embedding.py
+"""
+Local text embeddings for near-duplicate matching, with no model or network.
+
+Words, word bigrams and character trigrams are hashed (signed feature
+hashing, CRC32 so vectors are stable across processes) into a small
+float32 vector and L2-normalised, so a dot product is a cosine similarity.
+Good enough to tell "what brands does Dr. Sharma prescribe?" from "how
+many strips a week?"; not a semantic model.
+"""
+import os
+import re
+import zlib
+
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+
+_WORDS = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase words only, so punctuation and spacing never split a key."""
+    return " ".join(_WORDS.findall((text or "").lower()))
+
+
+def _features(normalized: str):
+    words = normalized.split()
+    for word in words:
+        yield "w:" + word, 1.0
+        padded = f"^{word}$"
+        for i in range(len(padded) - 2):
+            yield "c:" + padded[i:i + 3], 0.5
+    for a, b in zip(words, words[1:]):
+        yield f"b:{a} {b}", 1.0
+
+
+class HashedEmbedder:
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, text: str):
+        """Unit-length float32 vector for `text` (all zeros when it has no words)."""
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: list):
+        """One row per text, as a (len(texts), dim) float32 matrix."""
+        # Imported on first use so workers that never embed never load NumPy
+        import numpy as np
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in _features(normalize_text(text)):
+                h = zlib.crc32(feature.encode())
+                matrix[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
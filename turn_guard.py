@@ -0,0 +1,200 @@
+# turn_guard.py
+"""
+Serialises chat turns per session and deduplicates retried requests.
+
+Two turns for the same session must not interleave: both would read the
+same stage, both could advance it, and both would pay for a model call.
+TurnGuard runs one turn per session at a time, and a request carrying an
+idempotency key that is already in flight or recently answered gets that
+result back (singleflight) instead of starting another turn.
+
+Like SessionStateCache this is per process, so it relies on a session
+being routed to one worker.
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+
+
+class IdempotencyConflict(Exception):
+    """The idempotency key was already used for a different request."""
+
+
+class _Flight:
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.future = asyncio.get_running_loop().create_future()
+        self.expires_at = None
+
+
+class TurnGuard:
+    def __init__(self, ttl_seconds: float = None, max_keys: int = None):
+        self.ttl_seconds = IDEMPOTENCY_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_keys = max_keys or IDEMPOTENCY_MAX_KEYS
+        # session_id -> [lock, holders + waiters]
+        self._locks = {}
+        # (session_id, key) -> _Flight, oldest first
+        self._flights = OrderedDict()
+
+        self.turns = 0
+        self.lock_waits = 0
+        self.joined = 0
+        self.replayed = 0
+        self.conflicts = 0
+
+    # ---------- Per-session lock ----------
+
+    @asynccontextmanager
+    async def lock(self, session_id: int):
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        if entry[0].locked():
+            self.lock_waits += 1
+        try:
+            async with entry[0]:
+                self.turns += 1
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+
+    # ---------- Idempotency ----------
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._flights:
+            flight = next(iter(self._flights.values()))
+            if flight.expires_at is None or flight.expires_at > now:
+                break
+            self._flights.popitem(last=False)
+
+    def _claim(self, session_id: int, key: str, fingerprint: str):
+        """Returns (flight, leader): the leader runs the turn, others await it."""
+        self._expire()
+        flight = self._flights.get((session_id, key))
+        if flight is not None:
+            if flight.fingerprint != fingerprint:
+                self.conflicts += 1
+                raise IdempotencyConflict(f"Idempotency key {key!r} was used for a different request")
+            if flight.future.done():
+                self.replayed += 1
+            else:
+                self.joined += 1
+            return flight, False
+
+        flight = _Flight(fingerprint)
+        self._flights[(session_id, key)] = flight
+        while len(self._flights) > self.max_keys:
+            self._flights.popitem(last=False)
+        return flight, True
+
+    def _settle(self, session_id: int, key: str, flight: _Flight, result=None, error: BaseException = None):
+        if error is None:
+            flight.future.set_result(result)
+            flight.expires_at = time.monotonic() + self.ttl_seconds
+            return
+
+        # Failed or abandoned turns are not remembered; a retry runs again
+        if self._flights.get((session_id, key)) is flight:
+            del self._flights[(session_id, key)]
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            flight.future.cancel()
+        else:
+            flight.future.set_exception(error)
+            flight.future.exception()  # waiters re-raise it; don't warn when there are none
+
+    async def _join(self, flight: _Flight):
+        """The leader's result, or None if the leader was abandoned."""
+        try:
+            return await asyncio.shield(flight.future)
+        except asyncio.CancelledError:
+            if flight.future.cancelled():
+                return None
+            raise
+
+    async def run(self, session_id: int, key: str, fingerprint: str, turn):
+        """
+        Await `turn()` under the session lock. With a `key`, concurrent and
+        repeated calls share one result.
+        """
+        if not key:
+            async with self.lock(session_id):
+                return await turn()
+
+        while True:
+            flight, leader = self._claim(session_id, key, fingerprint)
+            if not leader:
+                result = await self._join(flight)
+                if result is not None:
+                    return result
+                continue  # the leader's client went away; take over
+
+            try:
+                async with self.lock(session_id):
+                    result = await turn()
+            except BaseException as e:
+                self._settle(session_id, key, flight, error=e)
+                raise
+            self._settle(session_id, key, flight, result)
+            return result
+
+    async def stream(self, session_id: int, key: str, fingerprint: str, turn):
+        """
+        Streaming form of `run`: `turn(committed)` is an async generator that
+        calls `committed()` once its writes are durable. The leader streams
+        live; duplicates get the leader's events replayed once it has
+        committed. A leader abandoned after that point is still remembered,
+        so a retry replays the committed turn instead of running it again.
+        """
+        if not key:
+            async with self.lock(session_id):
+                async for item in turn(lambda: None):
+                    yield item
+            return
+
+        while True:
+            flight, leader = self._claim(session_id, key, fingerprint)
+            if not leader:
+                events = await self._join(flight)
+                if events is None:
+                    continue
+                for item in events:
+                    yield item
+                return
+
+            events = []
+
+            def committed():
+                # Settled with the live list: the events still to come (e.g.
+                # `done`) are produced without awaiting, before any joiner runs
+                self._settle(session_id, key, flight, events)
+
+            try:
+                async with self.lock(session_id):
+                    async for item in turn(committed):
+                        events.append(item)
+                        yield item
+            except BaseException as e:
+                if not flight.future.done():
+                    self._settle(session_id, key, flight, error=e)
+                raise
+            if not flight.future.done():
+                self._settle(session_id, key, flight, events)
+            return
+
+    def snapshot(self) -> dict:
+        return {
+            "turns": self.turns,
+            "lock_waits": self.lock_waits,
+            "joined": self.joined,
+            "replayed": self.replayed,
+            "conflicts": self.conflicts,
+            "keys": len(self._flights),
+            "active_sessions": len(self._locks),
+        }
@@ -0,0 +1,42 @@
+# turn_rules.py
+from collections import defaultdict
+
+
+class FastPathRules:
+    """
+    Pre-dispatch rules that settle scripted turns before any model call.
+
+    A turn is scripted when its reply does not depend on the model: the
+    KNOWLEDGE quiz, the END goodbye, and any turn whose stage exit has
+    already been decided by keywords (`_should_advance`), where the reply
+    is a fixed closing line followed by the stage bridge.
+    """
+
+    # Closing line for keyword-decided stage exits, before the bridge text
+    CLOSING_LINES = {
+        "SETUP": "Great, that's all confirmed.",
+        "RCPA": "You're welcome. Have a good day.",
+        "DOCTOR": "Thank you for your time. Let's continue.",
+    }
+
+    # Stages whose every reply is scripted
+    ALWAYS_SCRIPTED = {
+        "END": "This training session is complete. Thank you for practicing with me today.",
+    }
+
+    def __init__(self):
+        self.stats = defaultdict(lambda: {"fast_path": 0, "model": 0})
+
+    def resolve(self, stage: str, advance: bool):
+        """Scripted reply for this turn, or None if it needs the model."""
+        if stage in self.ALWAYS_SCRIPTED:
+            return self.ALWAYS_SCRIPTED[stage]
+        if advance:
+            return self.CLOSING_LINES.get(stage)
+        return None
+
+    def record(self, stage: str, fast_path: bool):
+        self.stats[stage]["fast_path" if fast_path else "model"] += 1
+
+    def snapshot(self) -> dict:
+        return {stage: dict(counts) for stage, counts in self.stats.items()}
@@ -0,0 +1,138 @@
+# unit_of_work.py
+import asyncio
+import datetime
+from sqlalchemy import insert, update
+
+from database import AsyncSessionLocal
+from models import MonicaSession, MonicaMessage
+from session_state import SessionState
+
+
+class TurnUnitOfWork:
+    """
+    Buffers the MonicaMessage rows and MonicaSession changes produced by one
+    turn and writes them with one bulk insert, one UPDATE and one commit.
+
+    Session changes and message counters are applied to the cached
+    SessionState straight away, so the rest of the turn reads the new state
+    without touching the database; the commit writes them through. If a
+    write fails or the turn is abandoned before its commit (`abort`), the
+    state is evicted from `cache` so the next turn reloads it from the
+    database.
+
+    Every read and write borrows a pooled connection only for as long as
+    that statement takes, so no connection is held while the model runs
+    or for the lifetime of a voice socket.
+
+    With `write_behind=True` (voice sessions) `commit_async` schedules the
+    write and returns immediately; flushes are chained so they land in order.
+    """
+
+    def __init__(self, session: SessionState, write_behind: bool = False, session_factory=AsyncSessionLocal, cache=None):
+        self.session = session
+        self.session_id = session.id
+        self.write_behind = write_behind
+        self.session_factory = session_factory
+        self.cache = cache
+
+        self.messages = []
+        self.session_changes = {}
+        self._pending = None
+
+    # ---------- Reads ----------
+
+    async def scalar(self, stmt):
+        async with self.session_factory() as db:
+            return await db.scalar(stmt)
+
+    async def scalars(self, stmt) -> list:
+        async with self.session_factory() as db:
+            return list(await db.scalars(stmt))
+
+    # ---------- Buffering ----------
+
+    def add_message(self, role: str, content: str, stage: str = None, persona: str = None):
+        stage = stage or self.session.current_stage
+        self.messages.append({
+            "session_id": self.session_id,
+            "role": role,
+            "content": content,
+            "stage": stage,
+            "persona": persona or self.session.current_persona,
+            "timestamp": datetime.datetime.utcnow(),
+        })
+        self.session.bump(stage, role)
+
+    def update_session(self, **fields):
+        self.session.update(**fields)
+        self.session_changes.update(fields)
+
+    # ---------- Flushing ----------
+
+    def _take(self):
+        rows, self.messages = self.messages, []
+        changes, self.session_changes = self.session_changes, {}
+        return rows, changes
+
+    async def _write(self, rows: list, changes: dict):
+        if not rows and not changes:
+            return
+        try:
+            async with self.session_factory() as db:
+                if rows:
+                    await db.execute(insert(MonicaMessage), rows)
+                if changes:
+                    await db.execute(
+                        update(MonicaSession)
+                        .where(MonicaSession.id == self.session_id)
+                        .values(**changes)
+                    )
+                await db.commit()
+        except BaseException:
+            # Failed or cancelled mid-write: the cached state may be ahead of the DB
+            self._evict()
+            raise
+
+    def _evict(self):
+        if self.cache is not None:
+            self.cache.evict(self.session_id)
+
+    def abort(self):
+        """The turn ended without committing; drop the state it changed in place."""
+        if self.messages or self.session_changes:
+            self.messages, self.session_changes = [], {}
+            self._evict()
+
+    async def commit(self) -> list:
+        """Write the buffered turn and return the message rows it inserted."""
+        rows, changes = self._take()
+        await self._write(rows, changes)
+        return rows
+
+    async def commit_async(self):
+        if not self.write_behind:
+            await self.commit()
+            return
+
+        rows, changes = self._take()
+        if not rows and not changes:
+            return
+
+        previous = self._pending
+
+        async def flush():
+            if previous is not None:
+                await previous
+            try:
+                await self._write(rows, changes)
+            except Exception as e:
+                print(f"Write-behind flush failed: {e}")
+
+        self._pending = asyncio.ensure_future(flush())
+
+    async def drain(self):
+        """Wait for outstanding write-behind flushes."""
+        if self._pending is not None:
+            # Shielded: a cancelled socket handler must not drop queued writes
+            await asyncio.shield(self._pending)
+            self._pending = None
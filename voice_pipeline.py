@@ -0,0 +1,294 @@
+# voice_pipeline.py
+"""
+Audio plumbing for the /monica/voice WebSocket: fixed-size PCM framing,
+voice activity detection, bounded per-direction queues, per-socket
+queue metrics and transcript buffering.
+"""
+import os
+import json
+import base64
+import asyncio
+from collections import deque
+
+# useVoice.js records through its 24 kHz AudioContext; the live API is told
+# this rate in the mime type, so it must match what the browser sends
+VOICE_INPUT_SAMPLE_RATE = int(os.getenv("VOICE_INPUT_SAMPLE_RATE", "24000"))
+VOICE_OUTPUT_SAMPLE_RATE = 24000  # Gemini Live returns 24 kHz PCM
+VOICE_FRAME_MS = int(os.getenv("VOICE_FRAME_MS", "40"))
+VOICE_MAX_QUEUE_MS = int(os.getenv("VOICE_MAX_QUEUE_MS", "2000"))
+VOICE_MAX_BATCH_MS = int(os.getenv("VOICE_MAX_BATCH_MS", "200"))
+
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") == "1"
+VAD_ENERGY_THRESHOLD = float(os.getenv("VAD_ENERGY_THRESHOLD", "300"))  # RMS, int16 units
+VAD_MAX_ZCR = float(os.getenv("VAD_MAX_ZCR", "0.25"))
+VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", "200"))
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "600"))
+
+
+def decode_client_audio(msg: dict):
+    """
+    PCM bytes from a browser WebSocket message: either a binary frame or
+    the JSON `{"bytes": "<base64>"}` text frame useVoice.js sends.
+    """
+    if msg.get("bytes"):
+        return msg["bytes"]
+    text = msg.get("text")
+    if text:
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            return None
+        if isinstance(payload, dict) and payload.get("bytes"):
+            return base64.b64decode(payload["bytes"])
+    return None
+
+
+class AudioFramer:
+    """Coalesces arbitrarily sized 16-bit PCM chunks into fixed-duration frames."""
+
+    def __init__(self, sample_rate: int, frame_ms: int, sample_width: int = 2):
+        self.frame_bytes = sample_rate * frame_ms // 1000 * sample_width
+        self._buffer = bytearray()
+
+    def push(self, data: bytes) -> list:
+        self._buffer.extend(data)
+        count = len(self._buffer) // self.frame_bytes
+        if not count:
+            return []
+        cut = count * self.frame_bytes
+        chunk = bytes(self._buffer[:cut])
+        del self._buffer[:cut]
+        return [chunk[i:i + self.frame_bytes] for i in range(0, cut, self.frame_bytes)]
+
+    def flush(self) -> bytes:
+        """Whatever is left over, as a short final frame."""
+        rest = bytes(self._buffer)
+        self._buffer.clear()
+        return rest
+
+
+class VoiceActivityDetector:
+    """
+    Energy / zero-crossing gate over 16-bit PCM frames.
+
+    A frame is speech when it is loud enough and not hiss-like (low
+    zero-crossing rate), or simply very loud. Silence is held back in a
+    short pre-roll so the start of an utterance is not clipped, and
+    `hangover_ms` of continued silence closes the turn.
+    """
+
+    def __init__(self, frame_ms: int = VOICE_FRAME_MS, energy_threshold: float = VAD_ENERGY_THRESHOLD,
+                 max_zcr: float = VAD_MAX_ZCR, preroll_ms: int = VAD_PREROLL_MS,
+                 hangover_ms: int = VAD_HANGOVER_MS):
+        self.energy_threshold = energy_threshold
+        self.max_zcr = max_zcr
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.preroll = deque(maxlen=max(0, preroll_ms // frame_ms))
+
+        self.speaking = False
+        self._silent_run = 0
+
+        self.speech_frames = 0
+        self.gated_frames = 0
+        self.turns = 0
+
+    def classify(self, frames: list):
+        """Speech flag per frame (a NumPy bool array); all frames must be the same length."""
+        # Imported on first use so text-only workers never load NumPy
+        import numpy as np
+
+        pcm = b"".join(frames)
+        pcm = pcm[:len(pcm) - len(pcm) % (2 * len(frames))]
+        samples = np.frombuffer(pcm, dtype="<i2").reshape(len(frames), -1).astype(np.float32)
+        if samples.shape[1] < 2:
+            return np.zeros(len(frames), dtype=bool)
+
+        rms = np.sqrt(np.mean(samples * samples, axis=1))
+        zcr = np.count_nonzero(np.diff(np.signbit(samples), axis=1), axis=1) / (samples.shape[1] - 1)
+        loud = rms >= self.energy_threshold
+        return (loud & (zcr <= self.max_zcr)) | (rms >= 2 * self.energy_threshold)
+
+    def process(self, frames: list) -> list:
+        """(frame, end_of_turn) pairs to send upstream; silent frames are held or dropped."""
+        if not frames:
+            return []
+
+        out = []
+        for frame, speech in zip(frames, self.classify(frames)):
+            if speech:
+                if not self.speaking:
+                    self.speaking = True
+                    out.extend((held, False) for held in self.preroll)
+                    self.preroll.clear()
+                self._silent_run = 0
+                self.speech_frames += 1
+                out.append((frame, False))
+            elif self.speaking:
+                self._silent_run += 1
+                if self._silent_run >= self.hangover_frames:
+                    self.speaking = False
+                    self.turns += 1
+                    out.append((frame, True))
+                else:
+                    out.append((frame, False))
+            else:
+                if len(self.preroll) == self.preroll.maxlen:
+                    self.gated_frames += 1
+                self.preroll.append(frame)
+        return out
+
+    def snapshot(self) -> dict:
+        return {
+            "speaking": self.speaking,
+            "speech_frames": self.speech_frames,
+            "gated_frames": self.gated_frames,
+            "turns": self.turns,
+        }
+
+
+class AudioPipe:
+    """
+    One direction of a voice socket: PCM is framed, queued with a hard cap
+    and handed to the consumer in merged batches.
+
+    When the consumer lags, queued frames are merged into one send of up to
+    `max_batch_ms`; when the queue is full the oldest frame is dropped, so
+    memory per socket stays bounded. With a `vad`, silent frames never enter
+    the queue and batches report where a spoken turn ended.
+    """
+
+    def __init__(self, name: str, sample_rate: int, frame_ms: int = VOICE_FRAME_MS,
+                 max_queue_ms: int = VOICE_MAX_QUEUE_MS, max_batch_ms: int = VOICE_MAX_BATCH_MS,
+                 vad: VoiceActivityDetector = None):
+        self.name = name
+        self.framer = AudioFramer(sample_rate, frame_ms)
+        self.vad = vad
+        self.max_frames = max(1, max_queue_ms // frame_ms)
+        self.max_batch = max(1, max_batch_ms // frame_ms)
+
+        self._frames = deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+
+        self.frames_in = 0
+        self.frames_dropped = 0
+        self.batches_out = 0
+        self.bytes_out = 0
+        self.max_depth = 0
+
+    def _enqueue(self, frame: bytes, end_of_turn: bool = False):
+        if len(self._frames) >= self.max_frames:
+            _, dropped_end = self._frames.popleft()
+            self.frames_dropped += 1
+            if dropped_end and self._frames:
+                # Keep the turn boundary even when its audio is lost
+                self._frames[0] = (self._frames[0][0], True)
+        self._frames.append((frame, end_of_turn))
+        self.frames_in += 1
+        self.max_depth = max(self.max_depth, len(self._frames))
+        self._ready.set()
+
+    def _offer(self, frames: list):
+        if self.vad is None:
+            for frame in frames:
+                self._enqueue(frame)
+            return
+        for frame, end_of_turn in self.vad.process(frames):
+            self._enqueue(frame, end_of_turn)
+
+    def push(self, data: bytes):
+        self._offer(self.framer.push(data))
+
+    def flush(self):
+        """Release a partial frame, e.g. at the end of a turn."""
+        rest = self.framer.flush()
+        if rest:
+            self._offer([rest])
+
+    def close(self):
+        self._closed = True
+        self._ready.set()
+
+    async def next_batch(self):
+        """
+        (merged bytes, end_of_turn) for up to `max_batch` queued frames,
+        stopping at a turn boundary; None once closed and drained.
+        """
+        while not self._frames:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+
+        parts = []
+        end_of_turn = False
+        while self._frames and len(parts) < self.max_batch and not end_of_turn:
+            frame, end_of_turn = self._frames.popleft()
+            parts.append(frame)
+
+        batch = b"".join(parts)
+        self.batches_out += 1
+        self.bytes_out += len(batch)
+        return batch, end_of_turn
+
+    def snapshot(self) -> dict:
+        return {
+            "depth": len(self._frames),
+            "max_depth": self.max_depth,
+            "capacity": self.max_frames,
+            "frames_in": self.frames_in,
+            "frames_dropped": self.frames_dropped,
+            "batches_out": self.batches_out,
+            "bytes_out": self.bytes_out,
+            **({"vad": self.vad.snapshot()} if self.vad else {}),
+        }
+
+
+class TranscriptBuffer:
+    """
+    Live API transcription arrives in small fragments; they are joined per
+    speaker and stage in memory and handed out at turn boundaries, so voice
+    transcripts cost one batched insert per turn rather than a write per
+    fragment.
+    """
+
+    def __init__(self):
+        self._segments = []
+
+    def add(self, role: str, text: str, stage: str):
+        if not text:
+            return
+        if self._segments and self._segments[-1][:2] == [role, stage]:
+            self._segments[-1][2] += text
+        else:
+            self._segments.append([role, stage, text])
+
+    def take(self) -> list:
+        """(role, stage, text) for every buffered segment, oldest first."""
+        segments, self._segments = self._segments, []
+        return [(role, stage, text.strip()) for role, stage, text in segments if text.strip()]
+
+    def __len__(self):
+        return len(self._segments)
+
+
+class VoicePipeRegistry:
+    """Live AudioPipes per socket, for queue-depth metrics."""
+
+    def __init__(self):
+        self._sockets = {}
+
+    def register(self, key: str, *pipes: AudioPipe):
+        self._sockets[key] = pipes
+
+    def unregister(self, key: str):
+        self._sockets.pop(key, None)
+
+    def snapshot(self) -> dict:
+        return {
+            key: {pipe.name: pipe.snapshot() for pipe in pipes}
+            for key, pipes in self._sockets.items()
+        }
+
+
+VOICE_PIPES = VoicePipeRegistry()